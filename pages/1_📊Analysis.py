@@ -1,26 +1,21 @@
-import pandas as pd
-import plotly.express as px
 import streamlit as st
 
-from src.questions import get_high_value_claims, \
-    get_injury_claims, \
-    get_claim_type_dist, \
-    get_claim_status_dist, \
-    get_infectious_disease_claims, \
-    get_relation_distribution, \
-    get_si_exhausted_claims, \
-    get_maternity_claims, \
-    get_claim_type_dist_by_loc, \
-    get_parental_claims, \
-    get_prolonged_hospitalisations
+from src.instrument import stage
+from src.report import cached_report, report_formats
+from src.settings import anomaly_min_group_claims, anomaly_score_threshold
 from src.utilities import show_basic_stats, \
     formatINR, \
+    load_analysis, \
     show_parental_claims, \
-    show_maternity_claims
+    show_maternity_claims, \
+    show_table, \
+    start_diagnostics, \
+    show_diagnostics
 
 st.set_page_config(page_title="Visualisations",
                    page_icon="📊",
                    layout="wide")
+start_diagnostics()
 st.sidebar.header("Visualisations")
 
 if "stage" not in st.session_state:
@@ -30,29 +25,51 @@ if st.session_state.stage >= 2:
     if not st.session_state['data_uploaded'] or not st.session_state['mapping_submitted']:
         st.warning('Either data has not been uploaded or column mapping has not been submitted.')
     else:
-        if st.session_state['file_location']:
-            claims_df = pd.read_excel(st.session_state['file_location'])
-            total_claims = len(claims_df)
-            with st.expander('#### Browse Standardised Data'):
+        if st.session_state.get('dataset_ref'):
+            # plotly takes a while to import and is only needed once there is data to plot
+            import plotly.express as px
+            fingerprint = st.session_state['dataset_ref']
+            analysis = load_analysis(fingerprint)
+            claims_df = analysis['claims_df']
+            total_claims = analysis['total_claims']
+            with stage('analysis.browse'), st.expander('#### Browse Standardised Data'):
                 st.markdown(f'- Number of claims '
-                            f'(after discarding claims with data missing in necessary fields): **{len(claims_df)}**')
+                            f'(after discarding claims with data missing in necessary fields): **{total_claims}**')
                 st.markdown(f'- Total value of claims: '
-                            f':green[**{formatINR(claims_df["IncurredAmount"].sum())}**]')
-                st.write(claims_df)
-            high_val_claims = get_high_value_claims(claims_df)
-            injury_claims = get_injury_claims(claims_df)
-            infectious_disease_claims = get_infectious_disease_claims(claims_df)
-            si_exhausted_claims = get_si_exhausted_claims(claims_df)
-            maternity_claims = get_maternity_claims(claims_df)
-            parental_claims = get_parental_claims(claims_df)
-            prolonged_hosp_claims = get_prolonged_hospitalisations(claims_df)
-
-            claim_relation_dist = get_relation_distribution(claims_df)
-            with st.expander('##### Claim Distribution by Type'):
+                            f':green[**{formatINR(analysis["total_incurred_amount"])}**]')
+                show_table(claims_df, 'browse', fingerprint)
+            with stage('analysis.report'), st.expander('#### Export Report'):
+                st.markdown('The standardised data, every segment, the distributions and the concentration tables, '
+                            'one sheet or file each')
+                report_format = st.selectbox('Format', list(report_formats),
+                                             format_func={'xlsx': 'Excel workbook',
+                                                          'csv': 'CSV files (zip)',
+                                                          'parquet': 'Parquet files (zip)'}.get)
+                if st.button('Prepare report'):
+                    with st.spinner('Writing the report...'):
+                        report_path = cached_report(fingerprint, analysis, report_format,
+                                                    st.session_state['file_name'])
+                    # The report is handed to the browser on this run only, later reruns do not load it again. It
+                    # stays on disk, preparing it again is quick.
+                    with open(report_path, 'rb') as fp:
+                        st.download_button('Download report', data=fp,
+                                           file_name=f"{st.session_state['file_name']}_Report"
+                                                     f"{report_formats[report_format]}")
+            segment_stats = analysis['segment_stats']
+            high_val_claims = analysis['high_value_claims']
+            injury_claims = analysis['injury_claims']
+            infectious_disease_claims = analysis['infectious_disease_claims']
+            si_exhausted_claims = analysis['si_exhausted_claims']
+            maternity_claims = analysis['maternity_claims']
+            parental_claims = analysis['parental_claims']
+            prolonged_hosp_claims = analysis['prolonged_hosp_claims']
+
+            claim_relation_dist = analysis['claim_relation_dist']
+            with stage('analysis.claim_type'), st.expander('##### Claim Distribution by Type'):
                 sub_col1, sub_col2 = st.columns(2)
                 with sub_col1:
                     #  Fig 1
-                    claim_type_dist = get_claim_type_dist(claims_df)
+                    claim_type_dist = analysis['claim_type_dist']
                     claim_type_pie_fig = px.pie(claim_type_dist,
                                                 values=claim_type_dist.values,
                                                 names=claim_type_dist.index,
@@ -62,10 +79,7 @@ if st.session_state.stage >= 2:
                     st.plotly_chart(claim_type_pie_fig, use_container_width=True)
                 with sub_col2:
                     # Fig 2
-                    claim_type_by_location = get_claim_type_dist_by_loc(claims_df)
-                    total_claims_by_location = claims_df.groupby('Location')['ClaimType'].count()
-                    claim_type_percentage_by_location = claim_type_by_location.div(total_claims_by_location,
-                                                                                   axis=0) * 100
+                    claim_type_percentage_by_location = analysis['claim_type_pct_by_location']
 
                     # Plot the bar chart using Plotly
                     claim_type_percentage_by_location_fig = px.bar(claim_type_percentage_by_location,
@@ -79,7 +93,7 @@ if st.session_state.stage >= 2:
 
             col1, col2 = st.columns(2)
             with col1:
-                with st.expander('##### Claim Distribution by Relation'):
+                with stage('analysis.claim_relation'), st.expander('##### Claim Distribution by Relation'):
                     claim_relation_dist_fig = px.pie(claim_relation_dist,
                                                      values=claim_relation_dist.values,
                                                      names=claim_relation_dist.index,
@@ -89,8 +103,8 @@ if st.session_state.stage >= 2:
                     st.plotly_chart(claim_relation_dist_fig, use_container_width=True)
 
             with col2:
-                with st.expander('##### Claim Distribution by Status'):
-                    claim_status_dist = get_claim_status_dist(claims_df)
+                with stage('analysis.claim_status'), st.expander('##### Claim Distribution by Status'):
+                    claim_status_dist = analysis['claim_status_dist']
                     claim_status_pie_fig = px.pie(claim_status_dist,
                                                   values=claim_status_dist.values,
                                                   names=claim_status_dist.index,
@@ -98,70 +112,86 @@ if st.session_state.stage >= 2:
                     claim_status_pie_fig.update_traces(textposition='inside', textinfo='percent+label')
                     st.plotly_chart(claim_status_pie_fig, use_container_width=True)
 
-            with st.expander('##### Concentration'):
+            with stage('analysis.concentration'), st.expander('##### Concentration'):
                 sub_col1, sub_col2 = st.columns(2)
                 with sub_col1:
                     # Top 10 locations in decreasing order of count of claims
-                    top_10_locations_by_count = claims_df['Location'].value_counts().nlargest(10)
+                    top_10_locations_by_count = analysis['top_locations_by_count']
                     st.write("Top 10 locations by count of claims:")
                     st.write(top_10_locations_by_count)
 
                     # Top 10 highest valued claims by location
-                    top_10_highest_valued_claims_by_location = claims_df.groupby('Location')[
-                        'IncurredAmount'].max().nlargest(10)
+                    top_10_highest_valued_claims_by_location = analysis['top_locations_by_max_value']
                     st.write("Top 10 highest valued claims by location:")
                     st.write(top_10_highest_valued_claims_by_location)
 
                 with sub_col2:
                     # Top 5 hospitals by number of claims filed at that hospital
-                    top_5_hospitals_by_claim_count = claims_df['Hospital'].value_counts().nlargest(5)
+                    top_5_hospitals_by_claim_count = analysis['top_hospitals_by_count']
                     st.write("Top 5 hospitals by number of claims filed:")
                     st.write(top_5_hospitals_by_claim_count)
 
                     # Top 15 highest valued claims by hospital
-                    top_15_highest_valued_claims_by_hospital = claims_df.groupby('Hospital')[
-                        'IncurredAmount'].max().nlargest(15)
+                    top_15_highest_valued_claims_by_hospital = analysis['top_hospitals_by_max_value']
                     st.write("Top 15 highest valued claims by hospital:")
                     st.write(top_15_highest_valued_claims_by_hospital)
 
             if not high_val_claims.empty:
-                with st.expander('##### High Value Claims'):
+                with stage('analysis.high_value_claims'), st.expander('##### High Value Claims'):
                     st.write('The claims where 70% or more of the sum insured has already been claimed.')
-                    show_basic_stats(high_val_claims, claims_df)
-                    st.dataframe(high_val_claims.sort_values(by='ClaimedAmount', ascending=False))
+                    show_basic_stats(high_val_claims, claims_df, segment_stats.loc['high_value_claims'])
+                    show_table(high_val_claims, 'high_value_claims', fingerprint, sort_by='ClaimedAmount')
 
             if not prolonged_hosp_claims.empty:
-                with st.expander('##### Prolonged Hospitalisation'):
+                with stage('analysis.prolonged_hosp_claims'), st.expander('##### Prolonged Hospitalisation'):
                     st.write('The claims that had more than 10 days of hospitalisation.')
-                    show_basic_stats(prolonged_hosp_claims, claims_df)
-                    st.dataframe(prolonged_hosp_claims)
+                    show_basic_stats(prolonged_hosp_claims, claims_df, segment_stats.loc['prolonged_hosp_claims'])
+                    show_table(prolonged_hosp_claims, 'prolonged_hosp_claims', fingerprint)
 
             if not injury_claims.empty:
-                with st.expander('##### Injury Claims'):
+                with stage('analysis.injury_claims'), st.expander('##### Injury Claims'):
                     st.write('Claims with the ailment corresponding to an injury.')
-                    show_basic_stats(injury_claims, claims_df)
-                    st.dataframeOh(injury_claims.sort_values(by='IncurredAmount', ascending=False))
+                    show_basic_stats(injury_claims, claims_df, segment_stats.loc['injury_claims'])
+                    show_table(injury_claims, 'injury_claims', fingerprint, sort_by='IncurredAmount')
 
             if not infectious_disease_claims.empty:
-                with st.expander('##### Infectious Disease Claims'):
+                with stage('analysis.infectious_disease_claims'), \
+                        st.expander('##### Infectious Disease Claims'):
                     st.write('Claims with the ailment corresponding to an infectious disease.')
-                    show_basic_stats(infectious_disease_claims, claims_df)
-                    st.dataframe(infectious_disease_claims.sort_values(by='IncurredAmount', ascending=False))
+                    show_basic_stats(infectious_disease_claims, claims_df,
+                                     segment_stats.loc['infectious_disease_claims'])
+                    show_table(infectious_disease_claims, 'infectious_disease_claims', fingerprint,
+                               sort_by='IncurredAmount')
 
             if not si_exhausted_claims.empty:
-                with st.expander('##### Sum Insured Exhausted'):
+                with stage('analysis.si_exhausted_claims'), st.expander('##### Sum Insured Exhausted'):
                     st.write('Claims with sum insured exhausted.')
-                    show_basic_stats(si_exhausted_claims, claims_df)
-                    st.dataframe(si_exhausted_claims.sort_values(by='ClaimedAmount', ascending=False))
+                    show_basic_stats(si_exhausted_claims, claims_df, segment_stats.loc['si_exhausted_claims'])
+                    show_table(si_exhausted_claims, 'si_exhausted_claims', fingerprint, sort_by='ClaimedAmount')
 
             if not maternity_claims.empty:
-                with st.expander('##### Maternity Claims'):
+                with stage('analysis.maternity_claims'), st.expander('##### Maternity Claims'):
                     st.write('Claims pertaining to maternity and childbirth related ailments.')
-                    show_maternity_claims(maternity_claims, claims_df)
+                    show_maternity_claims(maternity_claims, claims_df, segment_stats.loc['maternity_claims'],
+                                          fingerprint)
 
             if not parental_claims.empty:
-                with st.expander('##### Parental Claims'):
+                with stage('analysis.parental_claims'), st.expander('##### Parental Claims'):
                     st.write("Claims filed for the employee's parents")
-                    show_parental_claims(parental_claims, claims_df)
+                    show_parental_claims(parental_claims, claims_df, segment_stats.loc['parental_claims'],
+                                         fingerprint)
+
+            outlier_claims = analysis['outlier_claims']
+            with stage('analysis.outlier_claims'), st.expander('##### Outlier Claims'):
+                st.write(f'Claims costing far more than the claims for the same ailment group at the same hospital and '
+                         f'location: a robust z-score (distance from the group median in median absolute deviations) '
+                         f'above {anomaly_score_threshold}. Groups of fewer than {anomaly_min_group_claims} claims are '
+                         f'not scored.')
+                if outlier_claims.empty:
+                    st.markdown('- No outlier claims found.')
+                else:
+                    st.markdown(f'- Number of outlier claims shown: **{len(outlier_claims)}**')
+                    show_table(outlier_claims, 'outlier_claims', fingerprint, sort_by='AnomalyScore')
 else:
     st.warning('Upload file and submit mapping to see visualisations here.')
+show_diagnostics()
@@ -0,0 +1,83 @@
+import math
+
+import streamlit as st
+
+from src.instrument import stage
+from src.query import aggregation_functions, \
+    build_query, \
+    cached_query, \
+    get_page, \
+    hidden_columns, \
+    query_operators
+from src.settings import segment_definitions, query_page_rows
+from src.utilities import load_analysis, start_diagnostics, show_diagnostics
+
+st.set_page_config(page_title="Query Data",
+                   page_icon="❔",
+                   layout="wide")
+start_diagnostics()
+st.sidebar.header("Query Data")
+
+# Number of filter rows offered in the query form
+num_filters = 3
+
+if "stage" not in st.session_state:
+    st.session_state.stage = 0
+
+if st.session_state.stage >= 2 and st.session_state.get('dataset_ref'):
+    fingerprint = st.session_state['dataset_ref']
+    claims_df = load_analysis(fingerprint)['claims_df']
+    columns = [col for col in claims_df.columns if col not in hidden_columns]
+
+    with st.form("Query"):
+        st.subheader('Filters')
+        filters = []
+        for i in range(num_filters):
+            col1, col2, col3 = st.columns([2, 1, 2])
+            with col1:
+                column = st.selectbox('Column', options=['', *columns], key=f'filter_column_{i}')
+            with col2:
+                op = st.selectbox('Operator', options=query_operators, key=f'filter_op_{i}')
+            with col3:
+                value = st.text_input('Value', key=f'filter_value_{i}',
+                                      help='Comma separated values for "in" and "not in"')
+            if column and value:
+                if op in ('in', 'not in'):
+                    value = [val.strip() for val in value.split(',') if val.strip()]
+                filters.append((column, op, value))
+        segments = st.multiselect('Only claims in these segments', options=list(segment_definitions))
+
+        st.subheader('Group and Rank')
+        col1, col2 = st.columns(2)
+        with col1:
+            group_by = st.multiselect('Group by', options=columns)
+            measure = st.selectbox('Measure', options=columns, index=columns.index('IncurredAmount'))
+            aggregations = st.multiselect('Aggregations', options=aggregation_functions, default=['count', 'sum'])
+        with col2:
+            sort_by = st.selectbox('Sort by', options=['', *aggregation_functions, *columns])
+            ascending = st.checkbox('Ascending')
+            top_n = st.number_input('Top N (0 for all rows)', min_value=0, value=0, step=1)
+        st.form_submit_button("Run Query")
+
+    query = build_query(filters=filters,
+                        segments=segments,
+                        group_by=group_by,
+                        measure=measure,
+                        aggregations=aggregations,
+                        sort_by=sort_by or None,
+                        ascending=ascending,
+                        top_n=int(top_n) or None)
+    try:
+        with stage('query.run') as record:
+            result = cached_query(fingerprint, claims_df, query)
+            record['rows'] = len(result)
+    except Exception as e:
+        st.error(f'Could not run the query: {e}')
+    else:
+        num_pages = max(1, math.ceil(len(result) / query_page_rows))
+        st.markdown(f'- Number of rows: **{len(result)}**')
+        page = st.number_input(f'Page (of {num_pages})', min_value=1, max_value=num_pages, value=1, step=1)
+        st.dataframe(get_page(result, page, query_page_rows))
+else:
+    st.warning('Upload file and submit mapping to query the data here.')
+show_diagnostics()
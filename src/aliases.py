@@ -0,0 +1,135 @@
+import hashlib
+import json
+import re
+import threading
+import traceback as tb
+from pathlib import Path
+
+import appdirs
+
+from src.settings import compulsory_cols_to_be_mapped
+from src.store import file_lock, replacing
+
+"""Header Alias Index"""
+
+alias_index_path = Path(appdirs.user_data_dir()) / 'claimsAnalysis' / 'header_aliases.json'
+
+_index_lock = threading.Lock()
+
+
+def normalise_header(header):
+    """
+    Returns:
+        header lower-cased with everything but letters and digits removed, e.g. 'Date_of_Admission' -> 'dateofadmission'
+    """
+    return re.sub(r'[^a-z0-9]', '', str(header).lower())
+
+
+def header_signature(headers):
+    """
+    Returns:
+        hex digest identifying a header layout regardless of column order, case and punctuation
+    """
+    normalised = sorted(normalise_header(header) for header in headers)
+    return hashlib.sha256('\0'.join(normalised).encode()).hexdigest()
+
+
+def load_alias_index():
+    """
+    Returns:
+        dict with 'layouts' (signature -> {required column: normalised header}) and
+        'aliases' (normalised header -> required column)
+    """
+    try:
+        with open(alias_index_path, 'r') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        pass
+    except Exception:
+        print(tb.format_exc())
+    return {'layouts': {}, 'aliases': {}}
+
+
+def remember_layout(headers, col_mapping):
+    """
+    Record a confirmed mapping for the layout and each of its headers
+    Args:
+        headers: all headers of the uploaded sheet
+        col_mapping: confirmed file column -> standard column mapping
+    """
+    required_by_std_name = {std_name: required for required, std_name in compulsory_cols_to_be_mapped.items()}
+    confirmed = {required_by_std_name[std_name]: normalise_header(header)
+                 for header, std_name in col_mapping.items() if std_name in required_by_std_name}
+    # The thread lock serialises the sessions of this process, the file lock those of the other worker processes
+    with _index_lock, file_lock(alias_index_path):
+        index = load_alias_index()
+        index['layouts'][header_signature(headers)] = confirmed
+        for required, header in confirmed.items():
+            index['aliases'][header] = required
+        try:
+            with replacing(alias_index_path) as temp, open(temp, 'w') as fp:
+                json.dump(index, fp)
+        except Exception:
+            print(tb.format_exc())
+
+
+def is_known_layout(headers):
+    """
+    Returns:
+        True if a mapping has been confirmed for this header layout before
+    """
+    return header_signature(headers) in load_alias_index()['layouts']
+
+
+def fuzzy_assignment(required_cols, headers):
+    """
+    Score every required column against every header in one batch and pick the one-to-one assignment with the best
+    total score
+    Args:
+        required_cols: required column names still to be matched
+        headers: headers still available
+
+    Returns:
+        dict of required column -> header
+    """
+    if not required_cols or not headers:
+        return {}
+    # Only needed for layouts the index cannot answer, so imported on first use
+    from rapidfuzz import fuzz, process, utils
+    from scipy.optimize import linear_sum_assignment
+    scores = process.cdist(required_cols,
+                           [str(header) for header in headers],
+                           scorer=fuzz.WRatio,
+                           processor=utils.default_process)
+    rows, cols = linear_sum_assignment(scores, maximize=True)
+    return {required_cols[row]: headers[col] for row, col in zip(rows, cols)}
+
+
+def suggest_mapping(headers):
+    """
+    Suggest a header for every required column. Known layouts are answered from the index, headers seen before in
+    other layouts are matched through their aliases and only the rest is matched fuzzily.
+    Args:
+        headers: headers of the uploaded sheet
+
+    Returns:
+        dict of required column -> header
+    """
+    headers = list(headers)
+    by_normalised = {normalise_header(header): header for header in headers}
+    index = load_alias_index()
+
+    layout = index['layouts'].get(header_signature(headers))
+    if layout is not None and all(header in by_normalised for header in layout.values()):
+        return {required: by_normalised[header] for required, header in layout.items()}
+
+    mappings = {}
+    for normalised, header in by_normalised.items():
+        required = index['aliases'].get(normalised)
+        if required in compulsory_cols_to_be_mapped and required not in mappings:
+            mappings[required] = header
+
+    remaining_required = [col for col in compulsory_cols_to_be_mapped if col not in mappings]
+    remaining_headers = [header for header in headers if header not in mappings.values()]
+    mappings.update(fuzzy_assignment(remaining_required, remaining_headers))
+    return {required: mappings[required] for required in compulsory_cols_to_be_mapped if required in mappings}
@@ -0,0 +1,48 @@
+from src.anomalies import ANOMALY_SCORE_COL, outlier_claims
+from src.cube import build_cube, \
+    cube_claim_type_pct_by_loc, \
+    cube_distribution, \
+    cube_top_by_count, \
+    cube_top_by_max_value
+from src.segments import get_segment, segment_stats, with_segment_mask
+from src.settings import segment_definitions
+
+"""Analytics Layer"""
+
+
+def run_analysis(claims_df, cube=None):
+    """
+    Run every analysis shown on the Analysis page once. Distributions and concentration tables are answered from the
+    claims cube, segments from the claims.
+    Args:
+        claims_df: standardised claims data, SegmentMask (unless stored with it) and AnomalyScore columns are added
+            to it
+        cube: claims cube of claims_df, built here when not given
+
+    Returns:
+        dict of the segments, segment stats, distributions, concentration tables and outlier claims, keyed by name
+    """
+    if cube is None:
+        cube = build_cube(claims_df)
+    with_segment_mask(claims_df)
+    anomaly_scores, outliers = outlier_claims(claims_df)
+    claims_df[ANOMALY_SCORE_COL] = anomaly_scores
+    analysis = {
+        'claims_df': claims_df,
+        'cube': cube,
+        'total_claims': len(claims_df),
+        'total_incurred_amount': claims_df['IncurredAmount'].sum(),
+        'segment_stats': segment_stats(claims_df),
+        'claim_type_dist': cube_distribution(cube, 'ClaimType'),
+        'claim_type_pct_by_location': cube_claim_type_pct_by_loc(cube),
+        'claim_relation_dist': cube_distribution(cube, 'Relation'),
+        'claim_status_dist': cube_distribution(cube, 'ClaimStatus'),
+        'top_locations_by_count': cube_top_by_count(cube, 'Location', 10),
+        'top_locations_by_max_value': cube_top_by_max_value(cube, 'Location', 10),
+        'top_hospitals_by_count': cube_top_by_count(cube, 'Hospital', 5),
+        'top_hospitals_by_max_value': cube_top_by_max_value(cube, 'Hospital', 15),
+        'outlier_claims': outliers,
+    }
+    for name in segment_definitions:
+        analysis[name] = get_segment(claims_df, name)
+    return analysis
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from src.settings import anomaly_group_columns, \
+    anomaly_measure, \
+    anomaly_min_group_claims, \
+    anomaly_percentiles, \
+    anomaly_score_threshold, \
+    anomaly_top_n
+
+"""Claim Anomaly Scoring"""
+
+ANOMALY_SCORE_COL = 'AnomalyScore'
+
+# Scales the median absolute deviation, and the mean absolute deviation when the MAD is 0, to the standard deviation
+# of normally distributed data, so scores read like z-scores
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+
+def group_stats(df, groups=anomaly_group_columns, measure=anomaly_measure, percentiles=anomaly_percentiles):
+    """
+    Robust statistics of measure for every group of claims. The claims are grouped once, every statistic is then
+    computed with vectorised grouped reductions over the group codes.
+    Args:
+        df: standardised claims data
+        groups: columns whose combinations form the peer groups
+        measure: numeric column
+        percentiles: percentiles to report, between 0 and 100
+
+    Returns:
+        (group code of every claim, -1 where a group column is missing, DataFrame indexed by the group codes 0..n-1
+        with the group columns, claims, median, mad, mean_ad (mean absolute deviation) and the percentiles as
+        P<percentile>)
+    """
+    # ngroup gives categorical keys -1 where a group column is missing, and other keys NaN
+    codes = df.groupby(groups, observed=True, sort=False).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    in_group = codes >= 0
+    group_codes = codes[in_group]
+    values = pd.Series(df[measure].to_numpy(dtype=np.float64, na_value=np.nan)[in_group])
+    by_group = values.groupby(group_codes)
+
+    # Group columns taken from the first claim of each group
+    first_claims = pd.Series(np.flatnonzero(in_group)).groupby(group_codes).first()
+    stats = df[groups].iloc[first_claims.to_numpy()].set_axis(first_claims.index)
+    stats['claims'] = by_group.size()
+    stats['median'] = by_group.median()
+    deviation = (values - stats['median'].to_numpy()[group_codes]).abs()
+    by_deviation = deviation.groupby(group_codes)
+    stats['mad'] = by_deviation.median()
+    stats['mean_ad'] = by_deviation.mean()
+    quantiles = by_group.quantile([p / 100 for p in percentiles]).unstack()
+    for p, q in zip(percentiles, quantiles.columns):
+        stats[f'P{p:g}'] = quantiles[q]
+    return codes, stats
+
+
+def score_claims(df, groups=anomaly_group_columns, measure=anomaly_measure, min_group_claims=anomaly_min_group_claims):
+    """
+    Robust z-score of every claim against its peer group: (value - group median) / (1.4826 x group MAD). Groups whose
+    MAD is 0 fall back to the mean absolute deviation.
+    Args:
+        df: standardised claims data
+        groups: see group_stats
+        measure: see group_stats
+        min_group_claims: claims of smaller groups, and of claims missing a group column, are not scored
+
+    Returns:
+        (float32 Series of scores aligned with df, NaN where not scored, group stats from group_stats, group code of
+        every claim)
+    """
+    codes, stats = group_stats(df, groups, measure)
+    spread = np.where(stats['mad'] > 0, MAD_SCALE * stats['mad'], MEAN_AD_SCALE * stats['mean_ad'])
+    spread = np.where((stats['claims'] >= min_group_claims) & (spread > 0), spread, np.nan)
+
+    scores = np.full(len(df), np.nan)
+    in_group = codes >= 0
+    group_codes = codes[in_group]
+    values = df[measure].to_numpy(dtype=np.float64, na_value=np.nan)[in_group]
+    scores[in_group] = (values - stats['median'].to_numpy()[group_codes]) / spread[group_codes]
+    return pd.Series(scores.astype(np.float32), index=df.index, name=ANOMALY_SCORE_COL), stats, codes
+
+
+def outlier_claims(df, top_n=anomaly_top_n, threshold=anomaly_score_threshold, groups=anomaly_group_columns,
+                   measure=anomaly_measure):
+    """
+    Claims scoring above threshold against their peer group, highest scores first
+    Args:
+        df: standardised claims data
+        top_n: number of claims to keep
+        threshold: minimum score of an outlier, 3.5 is the usual cut-off for robust z-scores
+        groups: see group_stats
+        measure: see group_stats
+
+    Returns:
+        (scores from score_claims, DataFrame of the top_n outliers with their score, the claims, median, MAD and
+        percentiles of their group and their percentile rank within it)
+    """
+    scores, stats, codes = score_claims(df, groups, measure)
+    candidates = np.flatnonzero(scores.to_numpy() > threshold)
+    top = candidates[np.argsort(-scores.to_numpy()[candidates], kind='stable')][:top_n]
+
+    outliers = df.iloc[top].copy()
+    outliers.insert(0, ANOMALY_SCORE_COL, scores.to_numpy()[top].astype(np.float64).round(2))
+    group_cols = {'claims': 'GroupClaims', 'median': 'GroupMedian', 'mad': 'GroupMAD',
+                  **{f'P{p:g}': f'GroupP{p:g}' for p in anomaly_percentiles}}
+    for col, name in group_cols.items():
+        outliers[name] = stats[col].to_numpy()[codes[top]]
+    # Percentile rank of the claim among the claims of its group, ranking the groups of the outliers only
+    in_outlier_groups = np.flatnonzero(np.isin(codes, codes[top]))
+    ranks = pd.Series(df[measure].to_numpy(dtype=np.float64, na_value=np.nan)[in_outlier_groups],
+                      index=in_outlier_groups).groupby(codes[in_outlier_groups]).rank(pct=True)
+    outliers['PercentileInGroup'] = (ranks.loc[top].to_numpy() * 100).round(1)
+    return scores, outliers
@@ -0,0 +1,136 @@
+import io
+import multiprocessing
+import os
+import traceback as tb
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from src.aliases import is_known_layout, normalise_header, suggest_mapping
+from src.ingest import read_mapped_columns
+from src.instrument import stage
+from src.normalise import category_labels, concat_categorical
+from src.settings import compulsory_cols_to_be_mapped, policy_number_headers
+from src.standardise import apply_dtype_plan, standardise_data, text_values
+
+"""Parallel Batch Ingestion"""
+
+SOURCE_FILE_COL = 'SourceFile'
+POLICY_COL = 'Policy'
+
+
+def batch_jobs(files, all_sheets=False):
+    """
+    Args:
+        files: (file name, workbook bytes) pairs
+        all_sheets: ingest every sheet of each workbook instead of only the first
+
+    Returns:
+        list of (file name, workbook bytes, sheet name) jobs
+    """
+    jobs = []
+    for file_name, file_bytes in files:
+        sheet_names = pd.ExcelFile(io.BytesIO(file_bytes)).sheet_names
+        for sheet_name in (sheet_names if all_sheets else sheet_names[:1]):
+            jobs.append((file_name, file_bytes, sheet_name))
+    return jobs
+
+
+def _policy_header(headers):
+    policy_headers = {normalise_header(header) for header in policy_number_headers}
+    return next((header for header in headers if normalise_header(header) in policy_headers), None)
+
+
+def standardise_sheet(file_name, file_bytes, sheet_name):
+    """
+    Read, map and standardise one sheet. Runs in a worker process, so it only takes and returns picklable values.
+    Args:
+        file_name: name of the uploaded workbook
+        file_bytes: workbook contents
+        sheet_name:
+
+    Returns:
+        (standardised frame tagged with SourceFile and Policy or None, report dict)
+    """
+    report = {'file': file_name, 'sheet': sheet_name, 'known_layout': False, 'rows_read': 0,
+              'rows_standardised': 0, 'error': None}
+    try:
+        workbook = pd.ExcelFile(io.BytesIO(file_bytes))
+        headers = workbook.parse(sheet_name, header=0, nrows=0).columns.to_list()
+        report['known_layout'] = is_known_layout(headers)
+        col_mapping = {header: compulsory_cols_to_be_mapped[required]
+                       for required, header in suggest_mapping(headers).items()}
+        if len(col_mapping) < len(compulsory_cols_to_be_mapped):
+            raise ValueError("Not every required column could be matched to a header")
+        policy_header = _policy_header(headers)
+        if policy_header in col_mapping:
+            policy_header = None
+        df = read_mapped_columns(workbook, sheet_name, col_mapping,
+                                 extra_cols=[] if policy_header is None else [policy_header])
+
+        if policy_header is not None:
+            # Missing policy numbers stay missing rather than becoming the text 'nan'
+            df[POLICY_COL] = text_values(df.pop(policy_header)).astype('string')
+        else:
+            df[POLICY_COL] = Path(file_name).stem
+        df[SOURCE_FILE_COL] = f'{file_name}:{sheet_name}'
+        report['rows_read'] = len(df)
+
+        df = standardise_data(df)
+        if df is None:
+            raise ValueError("Standardisation failed")
+        report['rows_standardised'] = len(df)
+        return df, report
+    except Exception as e:
+        print(tb.format_exc())
+        report['error'] = str(e)
+    return None, report
+
+
+def merge_standardised(frames):
+    """
+    Concatenate standardised frames, restoring the categorical columns pd.concat turns into objects when the frames
+    have different categories
+    """
+    df = concat_categorical(frames)
+    for col in [*category_labels, SOURCE_FILE_COL, POLICY_COL]:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return apply_dtype_plan(df)
+
+
+def ingest_batch(jobs, max_workers=None, progress=None):
+    """
+    Standardise many sheets in a process pool and merge them into one dataset
+    Args:
+        jobs: list from batch_jobs
+        max_workers: pool size, the number of cores by default
+        progress: optional callback(jobs_done, total_jobs, report) called as each sheet finishes
+
+    Returns:
+        (merged standardised frame or None if no sheet succeeded, list of per sheet reports)
+    """
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(jobs)))
+    frames, reports = [], []
+    # Spawned workers do not inherit the threads of the Streamlit server
+    with stage('batch_ingest') as record, \
+            ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(standardise_sheet, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                df, report = future.result()
+            except Exception as e:
+                # The worker itself died, e.g. ran out of memory
+                file_name, _, sheet_name = futures[future]
+                df, report = None, {'file': file_name, 'sheet': sheet_name, 'known_layout': False, 'rows_read': 0,
+                                    'rows_standardised': 0, 'error': repr(e)}
+            if df is not None and not df.empty:
+                frames.append(df)
+            reports.append(report)
+            if progress is not None:
+                progress(len(reports), len(jobs), report)
+        record['rows'] = sum(report['rows_read'] for report in reports)
+    if not frames:
+        return None, reports
+    return merge_standardised(frames), reports
@@ -0,0 +1,220 @@
+import argparse
+import inspect
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import appdirs
+import pandas as pd
+
+from src import questions
+from src.aliases import suggest_mapping
+from src.analytics import run_analysis
+from src.cube import load_or_build_cube
+from src.ingest import read_mapped_columns, stream_standardise
+from src.settings import benchmark_rows, \
+    benchmark_regression_tolerance, \
+    benchmark_min_seconds, \
+    benchmark_min_mb, \
+    compulsory_cols_to_be_mapped
+from src.standardise import apply_dtype_plan, save_standardised, standardise_data, std_dates
+from src.store import dataset_path, read_dataset
+from src.synthetic import column_mapping_path, synthetic_workbook
+
+"""Stage by Stage Benchmarks"""
+
+benchmark_dir = Path(appdirs.user_data_dir()) / 'claimsAnalysis' / 'benchmarks'
+results_path = benchmark_dir / 'results.jsonl'
+
+
+def measure(stage, func, *args, trace_memory=True):
+    """
+    Run func once, timing it and, with trace_memory, recording the peak of memory allocated while it ran. Arrow
+    buffers are allocated outside of Python and are not counted.
+    Args:
+        stage: name of the stage
+        func:
+        *args: passed to func
+        trace_memory: tracemalloc slows down code that allocates many small Python objects several times over, so
+            the time of a traced run is not representative
+
+    Returns:
+        (result of func, dict with the stage, seconds and peak_mb)
+    """
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = func(*args)
+        seconds = time.perf_counter() - started
+        peak_mb = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1) if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, {'stage': stage, 'seconds': round(seconds, 4), 'peak_mb': peak_mb}
+
+
+def question_functions():
+    """
+    Returns:
+        (name, function) of every analysis in src.questions, all of which take the standardised claims only
+    """
+    return [(name, func) for name, func in inspect.getmembers(questions, inspect.isfunction)
+            if func.__module__ == questions.__name__]
+
+
+def benchmark_workbook(path, col_mapping, trace_memory=True):
+    """
+    Run every stage an upload goes through, in the order the app runs them
+    Args:
+        path: xlsx workbook
+        col_mapping: true file column -> standard column mapping of the workbook
+        trace_memory: see measure
+
+    Returns:
+        list of stage results, each with the number of rows it produced
+    """
+    path = Path(path)
+    results = []
+
+    def run(stage, func, *args):
+        result, record = measure(stage, func, *args, trace_memory=trace_memory)
+        record['rows'] = len(result) if hasattr(result, '__len__') else None
+        results.append(record)
+        return result
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_dir = Path(output_dir)
+        raw_df = run('excel_read', pd.read_excel, path)
+        suggested = run('automated_mapping', suggest_mapping, raw_df.columns)
+        results[-1]['correct_mappings'] = sum(suggested.get(required) == header
+                                              for required, header in _required_headers(col_mapping).items())
+        del raw_df
+
+        with pd.ExcelFile(path) as workbook:
+            sheet_name = workbook.sheet_names[0]
+            mapped_df = run('excel_read_mapped', read_mapped_columns, workbook, sheet_name, col_mapping)
+        run('std_dates', std_dates, mapped_df.copy())
+        claims_df = run('standardise_data', standardise_data, mapped_df)
+        del mapped_df
+        location = run('save_file', save_standardised, claims_df, output_dir, path.name)
+        del claims_df
+
+        def reload():
+            claims_df = apply_dtype_plan(read_dataset(location))
+            return run_analysis(claims_df, load_or_build_cube(location, claims_df))['claims_df']
+
+        claims_df = run('analysis_reload', reload)
+        for name, func in question_functions():
+            run(f'questions.{name}', func, claims_df)
+
+        run('stream_standardise', lambda: stream_standardise(path, sheet_name, col_mapping,
+                                                              dataset_path(output_dir, 'streamed.xlsx')))
+    return results
+
+
+def _required_headers(col_mapping):
+    required_by_std_name = {std_name: required for required, std_name in compulsory_cols_to_be_mapped.items()}
+    return {required_by_std_name[std_name]: header for header, std_name in col_mapping.items()}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(rows=benchmark_rows, memory=True, seed=0):
+    """
+    Benchmark synthetic workbooks of each size and append the results to results_path. Stages are timed in one pass
+    and, with memory, profiled under tracemalloc in a second pass.
+    Returns:
+        run id
+    """
+    run_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+    context = {'run_id': run_id, 'commit': _git_commit(), 'python': platform.python_version(),
+               'machine': platform.node()}
+    benchmark_dir.mkdir(parents=True, exist_ok=True)
+    for num_rows in rows:
+        path = synthetic_workbook(num_rows, benchmark_dir / 'workbooks', seed)
+        with open(column_mapping_path(path), 'r') as fp:
+            col_mapping = json.load(fp)
+        records = benchmark_workbook(path, col_mapping, trace_memory=False)
+        if memory:
+            peaks = {record['stage']: record['peak_mb'] for record in benchmark_workbook(path, col_mapping)}
+            for record in records:
+                record['peak_mb'] = peaks[record['stage']]
+        for record in records:
+            record = {**context, 'workbook_rows': num_rows, **record}
+            with open(results_path, 'a') as fp:
+                fp.write(json.dumps(record) + '\n')
+            print(f"{num_rows:>9} {record['stage']:<45}{record['seconds']:>10.3f} s"
+                  f"{'' if record['peak_mb'] is None else format(record['peak_mb'], '>10.1f') + ' MB'}")
+    return run_id
+
+
+def load_results():
+    if not results_path.is_file():
+        return pd.DataFrame()
+    return pd.read_json(results_path, lines=True, dtype={'run_id': str})
+
+
+def compare_runs(results, run_id, baseline_run_id=None, tolerance=benchmark_regression_tolerance):
+    """
+    Args:
+        results: DataFrame from load_results
+        run_id: run to check
+        baseline_run_id: run to compare with, the latest earlier run by default
+        tolerance: allowed growth of the time and peak memory of a stage, as a fraction of the baseline
+
+    Returns:
+        DataFrame of the stages of run_id with their baseline figures, flagged where they regressed
+    """
+    current = results.loc[results['run_id'] == run_id]
+    if baseline_run_id is None:
+        earlier = results.loc[results['run_id'] < run_id, 'run_id']
+        if earlier.empty:
+            return pd.DataFrame()
+        baseline_run_id = earlier.max()
+    baseline = results.loc[results['run_id'] == baseline_run_id]
+    comparison = current.merge(baseline, on=['workbook_rows', 'stage'], suffixes=('', '_baseline'))
+    comparison['change'] = (comparison['seconds'] / comparison['seconds_baseline'] - 1).round(3)
+    comparison['memory_change'] = (comparison['peak_mb'] / comparison['peak_mb_baseline'] - 1).round(3)
+    comparison['regressed'] = ((comparison['change'] > tolerance) & (comparison['seconds'] > benchmark_min_seconds)) | \
+                              ((comparison['memory_change'] > tolerance) & (comparison['peak_mb'] > benchmark_min_mb))
+    return comparison[['workbook_rows', 'stage', 'seconds_baseline', 'seconds', 'change',
+                       'peak_mb_baseline', 'peak_mb', 'memory_change', 'regressed']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage on synthetic claims dumps")
+    parser.add_argument('--rows', nargs='+', type=int, default=benchmark_rows, help="workbook sizes to run")
+    parser.add_argument('--no-memory', action='store_true', help="skip the memory profiling pass")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help="run id to compare with, the previous run by default")
+    parser.add_argument('--compare-only', help="compare an existing run id instead of running the benchmarks")
+    args = parser.parse_args(argv)
+
+    run_id = args.compare_only or run_benchmarks(args.rows, not args.no_memory, args.seed)
+    comparison = compare_runs(load_results(), run_id, args.baseline)
+    if comparison.empty:
+        print(f"Run {run_id} saved to {results_path}, no earlier run to compare with")
+        return 0
+    print(comparison.to_string(index=False))
+    regressions = comparison.loc[comparison['regressed']]
+    if not regressions.empty:
+        print(f"{len(regressions)} stages grew slower or larger by more than {benchmark_regression_tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
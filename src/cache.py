@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import traceback as tb
+from pathlib import Path
+
+import appdirs
+
+from src.settings import mapping_version, dataset_cache_max_bytes
+from src.store import DATASET_SUFFIX, replacing, write_dataset
+
+"""Content-Addressed Cache of Standardised Datasets"""
+
+cache_dir = Path(appdirs.user_cache_dir()) / 'claimsAnalysis' / 'datasets'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def upload_key(file_bytes, sheet_name):
+    """
+    Key identifying an uploaded sheet, independent of the column mapping
+    Args:
+        file_bytes: raw bytes of the uploaded workbook
+        sheet_name: sheet selected by the user
+
+    Returns:
+        hex digest
+    """
+    digest = hashlib.sha256(file_bytes)
+    digest.update(f'\0{sheet_name}\0{mapping_version}'.encode())
+    return digest.hexdigest()
+
+
+def dataset_key(sheet_key, column_mapping):
+    """
+    Args:
+        sheet_key: key returned by upload_key
+        column_mapping: file column -> standard column mapping used for standardisation
+
+    Returns:
+        hex digest identifying the standardised dataset
+    """
+    payload = json.dumps(sorted(column_mapping.items()))
+    return hashlib.sha256(f'{sheet_key}\0{payload}'.encode()).hexdigest()
+
+
+def _entry_path(key):
+    return cache_dir / f'{key}{DATASET_SUFFIX}'
+
+
+def _mapping_path(sheet_key):
+    return cache_dir / f'{sheet_key}.mapping.json'
+
+
+def _entry_files():
+    """Cached datasets, without the hidden temporary files of writers still at work, see src.store.temp_path"""
+    if not cache_dir.is_dir():
+        return []
+    return [path for path in cache_dir.glob(f'*{DATASET_SUFFIX}') if not path.name.startswith('.')]
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def cache_stats():
+    """
+    Returns:
+        dict with the hits, misses and evictions counted by this process and the current size of the cache in bytes
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['size_bytes'] = 0
+    for path in _entry_files():
+        try:
+            stats['size_bytes'] += path.stat().st_size
+        except FileNotFoundError:
+            pass
+    return stats
+
+
+def remember_mapping(sheet_key, column_mapping):
+    """
+    Store the column mapping last used for an uploaded sheet, so a re-upload can find its cached dataset
+    """
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with replacing(_mapping_path(sheet_key)) as temp, open(temp, 'w') as fp:
+            json.dump(column_mapping, fp)
+    except Exception:
+        print(tb.format_exc())
+
+
+def recall_mapping(sheet_key):
+    """
+    Returns:
+        the column mapping stored by remember_mapping, or None
+    """
+    try:
+        with open(_mapping_path(sheet_key), 'r') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+def get_cached_dataset(key):
+    """
+    Look up a standardised dataset and mark it as recently used
+    Args:
+        key: key returned by dataset_key
+
+    Returns:
+        Path of the cached dataset, or None on a miss
+    """
+    path = _entry_path(key)
+    if path.is_file():
+        os.utime(path)
+        _count('hits')
+        return path
+    _count('misses')
+    return None
+
+
+def restore_cached_dataset(path, destination):
+    """
+    Copy a cached dataset to destination
+    Args:
+        path: cache entry returned by get_cached_dataset
+        destination:
+
+    Returns:
+        destination, or None if the entry has been evicted since it was looked up
+    """
+    try:
+        with replacing(destination) as temp:
+            shutil.copyfile(path, temp)
+        return destination
+    except FileNotFoundError:
+        # Evicted by another session between the lookup and the copy
+        return None
+
+
+def put_cached_dataset(key, df=None, source=None):
+    """
+    Add a standardised dataset to the cache and evict least recently used entries above the size budget
+    Args:
+        key: key returned by dataset_key
+        df: standardised frame to write
+        source: already written dataset file to copy instead of df
+
+    Returns:
+        Path of the cache entry, or None if it could not be written
+    """
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        path = _entry_path(key)
+        if source is not None:
+            # Other processes may be reading the entry, it is replaced in one rename
+            with replacing(path) as temp:
+                shutil.copyfile(source, temp)
+        else:
+            write_dataset(df, path)
+        evict(dataset_cache_max_bytes)
+        return path
+    except Exception:
+        print(tb.format_exc())
+    return None
+
+
+def evict(max_bytes):
+    """
+    Delete least recently used entries until the cache fits in max_bytes
+    """
+    entries = []
+    for path in _entry_files():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            # Evicted by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+            _count('evictions')
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,170 @@
+import traceback as tb
+
+import numpy as np
+import pandas as pd
+
+from src.normalise import concat_categorical
+from src.settings import cube_dimensions
+from src.store import cube_path, read_dataset, write_dataset
+
+"""Pre-aggregated Claims Cube"""
+
+COUNT_COL = 'ClaimCount'
+SUM_COL = 'IncurredAmountSum'
+MAX_COL = 'IncurredAmountMax'
+SUM_SQ_COL = 'IncurredAmountSumSq'
+
+# How each measure rolls up, also used to merge cubes built from separate chunks
+measure_aggregations = {
+    COUNT_COL: 'sum',
+    SUM_COL: 'sum',
+    MAX_COL: 'max',
+    SUM_SQ_COL: 'sum',
+}
+
+
+def build_cube(df):
+    """
+    Aggregate claims over every combination of the cube dimensions that occurs in the data
+    Args:
+        df: standardised claims data
+
+    Returns:
+        DataFrame with one row per dimension combination (missing values kept as their own member) and the
+        ClaimCount, IncurredAmountSum, IncurredAmountMax and IncurredAmountSumSq measures
+    """
+    amount = pd.to_numeric(df['IncurredAmount'], errors='coerce').astype('float64')
+    frame = df[cube_dimensions].assign(_amount=amount, _amount_sq=amount ** 2)
+    cube = frame.groupby(cube_dimensions, dropna=False, observed=True, sort=False).agg(
+        **{COUNT_COL: ('_amount', 'size'),
+           SUM_COL: ('_amount', 'sum'),
+           MAX_COL: ('_amount', 'max'),
+           SUM_SQ_COL: ('_amount_sq', 'sum')})
+    return cube.reset_index()
+
+
+def merge_cubes(cubes):
+    """
+    Args:
+        cubes: cubes built from disjoint sets of claims
+
+    Returns:
+        the cube of all those claims together
+    """
+    cubes = [cube for cube in cubes if cube is not None]
+    if len(cubes) == 1:
+        return cubes[0]
+    # Chunks carry different categories, unify them before grouping
+    combined = concat_categorical(cubes)
+    for col in cube_dimensions:
+        if combined[col].dtype == object and any(isinstance(cube[col].dtype, pd.CategoricalDtype) for cube in cubes):
+            combined[col] = combined[col].astype('category')
+    return combined.groupby(cube_dimensions, dropna=False, observed=True, sort=False) \
+        .agg(measure_aggregations).reset_index()
+
+
+def update_cube(cube, added, removed, claims_df):
+    """
+    Apply a change to the claims to their cube without rebuilding it. Counts and sums are adjusted by the cubes of the
+    added and removed claims. A maximum cannot be taken back, so the cells whose maximum a removed claim may have held
+    are recomputed from their own claims only.
+    Args:
+        cube: cube of the claims before the change
+        added: claims added
+        removed: claims removed, e.g. the earlier versions of updated claims
+        claims_df: the claims after the change
+
+    Returns:
+        the cube of claims_df
+    """
+    parts = [cube.assign(_removed_max=np.nan)]
+    if len(added):
+        parts.append(build_cube(added).assign(_removed_max=np.nan))
+    if len(removed):
+        removed_cube = build_cube(removed)
+        parts.append(removed_cube.assign(**{COUNT_COL: -removed_cube[COUNT_COL],
+                                            SUM_COL: -removed_cube[SUM_COL],
+                                            SUM_SQ_COL: -removed_cube[SUM_SQ_COL],
+                                            MAX_COL: np.nan,
+                                            '_removed_max': removed_cube[MAX_COL]}))
+    updated = concat_categorical(parts).groupby(cube_dimensions, dropna=False, observed=True, sort=False) \
+        .agg({**measure_aggregations, '_removed_max': 'max'}).reset_index()
+    updated = updated.loc[updated[COUNT_COL] > 0].reset_index(drop=True)
+    # Cells where a removed claim was as large as the largest claim left, their maximum may be gone
+    stale = (updated.pop('_removed_max') >= updated[MAX_COL]).to_numpy()
+    if stale.any():
+        cells = updated.loc[stale, cube_dimensions].astype({col: claims_df[col].dtype for col in cube_dimensions})
+        amounts = claims_df[cube_dimensions].assign(
+            _amount=pd.to_numeric(claims_df['IncurredAmount'], errors='coerce').astype('float64'))
+        maxima = cells.merge(amounts, on=cube_dimensions, how='left') \
+            .groupby(cube_dimensions, dropna=False, observed=True, sort=False)['_amount'].max()
+        updated.loc[stale, MAX_COL] = maxima.reindex(pd.MultiIndex.from_frame(cells)).to_numpy()
+    return updated.astype({col: 'category' for col in cube_dimensions})
+
+
+def rollup(cube, dims):
+    """
+    Args:
+        cube:
+        dims: dimensions to keep, claims with a missing value in any of them are left out like in a groupby
+
+    Returns:
+        measures aggregated over the remaining dimensions, indexed by dims
+    """
+    return cube.groupby(dims, observed=True).agg(measure_aggregations)
+
+
+def load_or_build_cube(file_location, claims_df):
+    """
+    Read the cube stored next to a dataset, or build and store it if the dataset was written without one
+    Args:
+        file_location: dataset file
+        claims_df: the dataset, only used when the cube has to be built
+
+    Returns:
+        cube
+    """
+    path = cube_path(file_location)
+    if path.is_file():
+        return read_dataset(path)
+    cube = build_cube(claims_df)
+    try:
+        write_dataset(cube.copy(), path)
+    except Exception:
+        print(tb.format_exc())
+    return cube
+
+
+"""Distributions and Concentration from the Cube"""
+
+
+def cube_distribution(cube, dim):
+    """
+    Same result as (df[dim].value_counts(normalize=True) * 100).round(2)
+    """
+    counts = rollup(cube, [dim])[COUNT_COL]
+    counts = counts[counts > 0].sort_values(ascending=False)
+    return (counts / counts.sum() * 100).round(2).rename('proportion')
+
+
+def cube_claim_type_pct_by_loc(cube):
+    """
+    Same result as src.questions.get_claim_type_pct_by_loc
+    """
+    claim_type_by_location = rollup(cube, ['ClaimType', 'Location'])[COUNT_COL].unstack().transpose()
+    total_claims_by_location = rollup(cube.loc[cube['ClaimType'].notna()], ['Location'])[COUNT_COL]
+    return claim_type_by_location.div(total_claims_by_location, axis=0) * 100
+
+
+def cube_top_by_count(cube, dim, n):
+    """
+    Same result as df[dim].value_counts().nlargest(n)
+    """
+    return rollup(cube, [dim])[COUNT_COL].nlargest(n).rename('count')
+
+
+def cube_top_by_max_value(cube, dim, n):
+    """
+    Same result as df.groupby(dim)['IncurredAmount'].max().nlargest(n)
+    """
+    return rollup(cube, [dim])[MAX_COL].nlargest(n).rename('IncurredAmount')
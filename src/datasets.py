@@ -0,0 +1,211 @@
+import argparse
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import appdirs
+import pandas as pd
+
+from src.settings import dataset_store_env, dataset_versions_kept
+from src.store import DATASET_SUFFIX, cube_path, file_lock, read_dataset, temp_path, write_dataset
+
+"""Versioned Dataset Store Shared Between Processes"""
+
+# Every version of a dataset is a new, immutable file. Sessions hold a dataset ref, <dataset id>@<version>, instead of
+# a path, so a ref always means the same data whichever worker process serves the session and whatever has been
+# written since.
+store_dir = Path(os.environ.get(dataset_store_env) or Path(appdirs.user_data_dir()) / 'claimsAnalysis' / 'datasets')
+
+_version_pattern = re.compile(rf'^v(\d+){re.escape(DATASET_SUFFIX)}$')
+# Temporary files of writers that died are removed once they are this old
+_stale_temp_seconds = 24 * 3600
+
+
+def new_dataset_id(file_name):
+    """
+    Returns:
+        id for a new dataset, readable from file_name and unique across processes
+    """
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', Path(str(file_name)).stem).strip('-')[:40] or 'dataset'
+    return f'{slug}-{uuid.uuid4().hex[:8]}'
+
+
+def dataset_ref(dataset_id, version):
+    return f'{dataset_id}@{version}'
+
+
+def parse_ref(ref):
+    """
+    Returns:
+        (dataset id, version or None for a ref without a version)
+    """
+    dataset_id, _, version = str(ref).partition('@')
+    return dataset_id, int(version) if version else None
+
+
+def _dataset_dir(dataset_id, root):
+    if not re.fullmatch(r'[A-Za-z0-9-]+', dataset_id):
+        raise ValueError(f"Invalid dataset id: {dataset_id!r}")
+    return Path(root) / dataset_id
+
+
+def _version_path(dataset_id, version, root):
+    return _dataset_dir(dataset_id, root) / f'v{version:06d}{DATASET_SUFFIX}'
+
+
+def versions(dataset_id, root=None):
+    """
+    Returns:
+        sorted list of the versions of a dataset on disk
+    """
+    directory = _dataset_dir(dataset_id, root or store_dir)
+    if not directory.is_dir():
+        return []
+    return sorted(int(match.group(1)) for match in map(_version_pattern.match, os.listdir(directory)) if match)
+
+
+def dataset_file(ref, root=None):
+    """
+    Args:
+        ref: dataset ref, the latest version when it has none
+        root: store directory, store_dir by default
+
+    Returns:
+        Path of the dataset file of the version
+
+    Raises:
+        FileNotFoundError if the version does not exist or has been pruned
+    """
+    dataset_id, version = parse_ref(ref)
+    if version is None:
+        existing = versions(dataset_id, root)
+        if not existing:
+            raise FileNotFoundError(f"No dataset {dataset_id}")
+        version = existing[-1]
+    path = _version_path(dataset_id, version, root or store_dir)
+    if not path.is_file():
+        raise FileNotFoundError(f"Dataset {dataset_ref(dataset_id, version)} no longer exists")
+    return path
+
+
+def publish(dataset_id, write, root=None, kept=dataset_versions_kept):
+    """
+    Write the next version of a dataset. Writers of the same dataset take turns on its lock, each writing from the
+    version the one before it published. The version is written to temporary files and renamed into place, cube
+    first, so readers only ever see complete versions.
+    Args:
+        dataset_id: from new_dataset_id for a new dataset
+        write: function of (path, path of the latest version or None) writing the dataset file and, optionally, its
+            cube (src.store.cube_path of path). Writing nothing publishes no version.
+        root: store directory, store_dir by default
+        kept: versions to keep, older ones are deleted
+
+    Returns:
+        ref of the new version, or of the latest one if write wrote nothing, None if there is none. The directory of a
+        new dataset is removed again when write writes nothing.
+    """
+    root = Path(root or store_dir)
+    directory = _dataset_dir(dataset_id, root)
+    created = not directory.is_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    try:
+        return _publish(dataset_id, write, root, kept)
+    finally:
+        if created and not versions(dataset_id, root):
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def _publish(dataset_id, write, root, kept):
+    directory = _dataset_dir(dataset_id, root)
+    with file_lock(directory / 'dataset'):
+        existing = versions(dataset_id, root)
+        previous = _version_path(dataset_id, existing[-1], root) if existing else None
+        version = existing[-1] + 1 if existing else 1
+        path = _version_path(dataset_id, version, root)
+        temp = temp_path(path)
+        try:
+            write(temp, previous)
+            if not temp.is_file():
+                return dataset_ref(dataset_id, existing[-1]) if existing else None
+            if cube_path(temp).is_file():
+                os.replace(cube_path(temp), cube_path(path))
+            os.replace(temp, path)
+        finally:
+            for leftover in (temp, cube_path(temp)):
+                if leftover.is_file():
+                    os.remove(leftover)
+        _prune(dataset_id, root, kept)
+    return dataset_ref(dataset_id, version)
+
+
+def _prune(dataset_id, root, kept):
+    directory = _dataset_dir(dataset_id, root)
+    for version in versions(dataset_id, root)[:-kept]:
+        for path in (_version_path(dataset_id, version, root), cube_path(_version_path(dataset_id, version, root))):
+            try:
+                # Processes that still map the file keep their copy until they let go of it. Windows refuses to
+                # delete a mapped file, it is retried on the next write.
+                path.unlink()
+            except OSError:
+                pass
+    now = time.time()
+    for path in directory.glob('.*.tmp*'):
+        try:
+            if now - path.stat().st_mtime > _stale_temp_seconds:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _check_writer(root, dataset_id, writer, rounds):
+    """Publish rounds versions, each adding one row to the latest, and read back the latest version each time"""
+    for i in range(rounds):
+        def write(path, previous):
+            rows = read_dataset(previous) if previous is not None else pd.DataFrame({'writer': [], 'round': []})
+            row = pd.DataFrame({'writer': [writer], 'round': [i]})
+            write_dataset(pd.concat([rows, row], ignore_index=True).astype('int64'), path)
+
+        publish(dataset_id, write, root, kept=rounds)
+        read_dataset(dataset_file(dataset_id, root))
+
+
+def check_store(processes=4, rounds=10):
+    """
+    Stress the store on this machine: several processes publish versions of one dataset at once, every version
+    adding a row to the one before it. Any lost update or torn file shows as missing rows or a failed read.
+    Returns:
+        True if the final version holds every row written
+    """
+    with tempfile.TemporaryDirectory() as root:
+        dataset_id = new_dataset_id('check')
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=_check_writer, args=(root, dataset_id, writer, rounds))
+                   for writer in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        final = read_dataset(dataset_file(dataset_id, root))
+        expected = processes * rounds
+        print(f"{len(final)} of {expected} rows in version {versions(dataset_id, root)[-1]}, "
+              f"{sum(worker.exitcode != 0 for worker in workers)} writers failed")
+        return len(final) == expected and not final.duplicated().any() and \
+            all(worker.exitcode == 0 for worker in workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the shared dataset store with concurrent writer processes")
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=10, help="versions published by each process")
+    args = parser.parse_args(argv)
+    return 0 if check_store(args.processes, args.rounds) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
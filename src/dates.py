@@ -0,0 +1,76 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from src.settings import date_format_candidates, dateparser_formats
+
+"""Date Standardisation Engine"""
+
+FORMAT_SAMPLE_SIZE = 500
+
+
+@lru_cache(maxsize=8192)
+def parse_with_dateparser(val):
+    """
+    Memoized fallback for date strings that do not match the inferred column format
+    Args:
+        val: date string
+
+    Returns:
+        datetime or None if dateparser could not make sense of it
+    """
+    # dateparser takes a while to import and is only needed for the odd value the vectorized parser rejects
+    from dateparser import parse
+    return parse(val, date_formats=dateparser_formats)
+
+
+def infer_date_format(values):
+    """
+    Pick the candidate format that parses the most values out of a sample of the distinct values of a column
+    Args:
+        values: Series of stripped date strings
+
+    Returns:
+        strftime format string, or None if no candidate matched anything
+    """
+    sample = pd.Series(values.dropna().unique()[:FORMAT_SAMPLE_SIZE])
+    best_format, best_hits = None, 0
+    for date_format in date_format_candidates:
+        hits = pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum()
+        if hits > best_hits:
+            best_format, best_hits = date_format, hits
+        if hits == len(sample):
+            break
+    return best_format
+
+
+def parse_date_column(series):
+    """
+    Convert a column to datetimes. The whole column is parsed with the inferred format and only the distinct values
+    that fail are sent to dateparser.
+    Args:
+        series: column as read from the claims dump
+
+    Returns:
+        (datetime64 Series, number of non-empty cells that could not be parsed)
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series, 0
+
+    values = series.astype(str).str.strip().where(series.notna())
+    values = values.replace('', np.nan)
+
+    date_format = infer_date_format(values)
+    if date_format:
+        parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    else:
+        parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+
+    unparsed = parsed.isna() & values.notna()
+    if unparsed.any():
+        fallback = {val: parse_with_dateparser(val) for val in values[unparsed].unique()}
+        parsed.loc[unparsed] = pd.to_datetime(values[unparsed].map(fallback), errors='coerce')
+
+    num_unparsed = int((parsed.isna() & values.notna()).sum())
+    return parsed, num_unparsed
@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.settings import distribution_bins, distribution_max_points, distribution_cache_max_entries
+
+"""Binned Distributions"""
+
+_cache_lock = threading.Lock()
+_distribution_cache = OrderedDict()
+
+
+def _binned_kde(values, grid, bandwidth, num_bins):
+    """
+    Gaussian kernel density estimate on grid from values pre-binned into num_bins bins, which costs
+    num_bins x len(grid) kernel evaluations whatever the number of values
+    """
+    counts, edges = np.histogram(values, bins=num_bins)
+    centres = (edges[:-1] + edges[1:]) / 2
+    z = (grid[:, None] - centres[None, :]) / bandwidth
+    return (np.exp(-0.5 * z ** 2) @ counts) / (len(values) * bandwidth * np.sqrt(2 * np.pi))
+
+
+def distribution_series(values, bins=distribution_bins, max_points=distribution_max_points):
+    """
+    Histogram, fitted normal curve and kernel density estimate of values, each with at most max_points points
+    Args:
+        values: numeric Series or array, missing values are ignored
+        bins: histogram bins
+        max_points: cap on the points of every series
+
+    Returns:
+        dict with the count, mean and std of the values, the histogram bin centres, widths and densities, and the x and
+        y of the normal fit and of the KDE. The fit and KDE are empty when the values do not vary.
+    """
+    values = values.to_numpy(dtype=np.float64, na_value=np.nan) if hasattr(values, 'to_numpy') \
+        else np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    series = {'count': len(values), 'mean': None, 'std': None,
+              'bin_centres': np.empty(0), 'bin_widths': np.empty(0), 'density': np.empty(0),
+              'fit_x': np.empty(0), 'fit_y': np.empty(0), 'kde_x': np.empty(0), 'kde_y': np.empty(0)}
+    if not len(values):
+        return series
+    mean = values.mean()
+    std = values.std(ddof=1) if len(values) > 1 else 0.0
+    series['mean'], series['std'] = float(mean), float(std)
+    series['density'], edges = np.histogram(values, bins=min(bins, max_points), density=True)
+    series['bin_centres'] = (edges[:-1] + edges[1:]) / 2
+    series['bin_widths'] = np.diff(edges)
+    if not std > 0:
+        return series
+
+    series['fit_x'] = np.linspace(mean - 3 * std, mean + 3 * std, max_points)
+    series['fit_y'] = np.exp(-0.5 * ((series['fit_x'] - mean) / std) ** 2) / (std * np.sqrt(2 * np.pi))
+    # Scott's rule of thumb
+    bandwidth = 1.06 * std * len(values) ** (-1 / 5)
+    series['kde_x'] = np.linspace(values.min() - 3 * bandwidth, values.max() + 3 * bandwidth, max_points)
+    series['kde_y'] = _binned_kde(values, series['kde_x'], bandwidth, 4 * max_points)
+    return series
+
+
+def cached_distribution(key, values):
+    """
+    distribution_series kept per key, least recently used series are evicted first
+    Args:
+        key: identifies the values, e.g. (dataset fingerprint, segment name, column), or None to compute without
+            caching
+        values:
+
+    Returns:
+        dict from distribution_series, shared between callers and so not to be modified in place
+    """
+    with _cache_lock:
+        if key in _distribution_cache:
+            _distribution_cache.move_to_end(key)
+            return _distribution_cache[key]
+    series = distribution_series(values)
+    if key is not None:
+        with _cache_lock:
+            _distribution_cache[key] = series
+            while len(_distribution_cache) > distribution_cache_max_entries:
+                _distribution_cache.popitem(last=False)
+    return series
@@ -0,0 +1,104 @@
+import argparse
+import ast
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from src.settings import import_time_budgets_ms, import_time_repeat
+
+"""Import Time Report"""
+
+repo_root = Path(__file__).parent.parent
+
+
+def entry_point_imports(entry_point):
+    """
+    Args:
+        entry_point: script path relative to the repository root, or a module name
+
+    Returns:
+        modules imported at the top level of the script, or [entry_point] for a module name
+    """
+    path = repo_root / entry_point
+    if not path.suffix == '.py':
+        return [entry_point]
+    modules = []
+    for node in ast.parse(path.read_text(encoding='utf-8')).body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def measure_imports(modules):
+    """
+    Import modules in a fresh interpreter with -X importtime
+    Args:
+        modules: module names
+
+    Returns:
+        list of (module, self microseconds, cumulative microseconds, nesting depth) in import order
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', '; '.join(f'import {m}' for m in modules)],
+                            cwd=repo_root, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        timings.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return timings
+
+
+def _total_ms(timings):
+    return sum(cumulative_us for _, _, cumulative_us, depth in timings if depth == 0) / 1000
+
+
+def import_report(entry_point, top=10, repeat=import_time_repeat):
+    """
+    Args:
+        entry_point: key of src.settings.import_time_budgets_ms
+        top: number of packages to list in the breakdown
+        repeat: cold imports measured, the fastest one is reported as the others only add noise from the machine
+
+    Returns:
+        dict with the total milliseconds, the budget and the slowest top level packages by self time
+    """
+    modules = entry_point_imports(entry_point)
+    timings = min((measure_imports(modules) for _ in range(max(1, repeat))), key=_total_ms)
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in timings:
+        by_package[name.split('.')[0]] += self_us
+    return {'entry_point': entry_point,
+            'total_ms': round(_total_ms(timings), 1),
+            'budget_ms': import_time_budgets_ms.get(entry_point),
+            'packages': [(package, round(us / 1000, 1))
+                         for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per module import time of the entry points against their budget")
+    parser.add_argument('entry_points', nargs='*', help="entry points to measure, all budgeted ones by default")
+    parser.add_argument('--top', type=int, default=10, help="packages to list per entry point")
+    parser.add_argument('--repeat', type=int, default=import_time_repeat, help="cold imports measured per entry point")
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    for entry_point in args.entry_points or import_time_budgets_ms:
+        report = import_report(entry_point, args.top, args.repeat)
+        budget = report['budget_ms']
+        status = 'no budget' if budget is None else ('OVER BUDGET' if report['total_ms'] > budget else 'ok')
+        over_budget |= status == 'OVER BUDGET'
+        print(f"{entry_point}: {report['total_ms']} ms (budget {budget} ms) {status}")
+        for package, ms in report['packages']:
+            print(f"    {package:<30}{ms:>10} ms")
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
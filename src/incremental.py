@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import pandas as pd
+
+from src.batch import merge_standardised
+from src.cube import load_or_build_cube, update_cube
+from src.instrument import stage
+from src.segments import SEGMENT_MASK_COL, segment_mask, segments_version, with_segment_mask
+from src.standardise import ROW_HASH_COL, ROW_KEY_COL, apply_dtype_plan, necessary_columns, standardise_data, \
+    with_row_keys
+from src.store import cube_path, dataset_columns, file_lock, read_dataset, write_dataset
+
+"""Incremental Append of Monthly Dumps"""
+
+
+def diff_rows(df, stored):
+    """
+    Args:
+        df: mapped claims of a new dump with RowKey and RowHash columns
+        stored: RowKey and RowHash columns of the stored claims
+
+    Returns:
+        (boolean numpy array of the claims of df that are not stored, boolean numpy array of the stored claims whose
+        mapped values changed)
+    """
+    stored = stored.drop_duplicates(ROW_KEY_COL, keep='last')
+    positions = pd.Index(stored[ROW_KEY_COL]).get_indexer(df[ROW_KEY_COL])
+    new = positions < 0
+    changed = ~new & (stored[ROW_HASH_COL].to_numpy()[positions] != df[ROW_HASH_COL].to_numpy())
+    return new, changed
+
+
+def append_dump(df, location, destination=None):
+    """
+    Merge a later, cumulative dump of the same policy into a stored dataset. Only the claims that are new or whose
+    mapped values changed are standardised, changed claims replace their stored version, claims missing from the
+    dump are kept. Claims standardisation would drop are neither new nor changed, their stored version, if any, is
+    kept. The stored cube and segment membership are updated with the changed claims only.
+    Args:
+        df: mapped claims of the dump, as returned by src.ingest.read_mapped_columns
+        location: dataset file written by an earlier upload
+        destination: file to write the merged dataset and its cube to, location by default. Appends in place hold
+            the lock of location, so concurrent appends to it do not lose each other's claims.
+
+    Returns:
+        dict with rows_read, the new, changed and unchanged claims, the new or changed claims dropped for missing
+        one of the necessary columns, rows_standardised (new and changed claims left
+        after standardisation), rows_written (claims in the dataset now) and the per column count of unparsed dates.
+        Nothing is written when no claim is new or changed.
+    """
+    location = Path(location)
+    if destination is None:
+        with file_lock(location):
+            return append_dump(df, location, location)
+    with stage('incremental_append', rows=len(df)):
+        if ROW_KEY_COL not in dataset_columns(location):
+            raise ValueError(f"{location.name} was written without row keys, standardise its dump again before "
+                             f"appending to it")
+        df = with_row_keys(df.copy(deep=False))
+        stored = read_dataset(location, columns=[ROW_KEY_COL, ROW_HASH_COL])
+        new, changed = diff_rows(df, stored)
+        unchanged = ~(new | changed)
+        dropped = ~df[[col for col in necessary_columns if col in df.columns]].notna().all(axis=1).to_numpy()
+        new, changed = new & ~dropped, changed & ~dropped
+        summary = {'rows_read': len(df),
+                   'new': int(new.sum()),
+                   'changed': int(changed.sum()),
+                   'unchanged': int(unchanged.sum()),
+                   'dropped': int((dropped & ~unchanged).sum()),
+                   'rows_standardised': 0,
+                   'rows_written': len(stored),
+                   'unparsed_dates': {}}
+        if not (new | changed).any():
+            return summary
+
+        delta = standardise_data(df.loc[new | changed])
+        if delta is None:
+            raise ValueError("Standardisation failed")
+        summary['rows_standardised'] = len(delta)
+        summary['unparsed_dates'] = delta.attrs.get('unparsed_dates', {})
+        delta[SEGMENT_MASK_COL] = segment_mask(delta)
+
+        claims_df = with_segment_mask(apply_dtype_plan(read_dataset(location)))
+        replaced = claims_df[ROW_KEY_COL].isin(df.loc[changed, ROW_KEY_COL]).to_numpy()
+        merged = merge_standardised([claims_df.loc[~replaced], delta])
+        merged.attrs = {'segments_version': segments_version}
+        cube = update_cube(load_or_build_cube(location, claims_df), delta, claims_df.loc[replaced], merged)
+
+        write_dataset(cube, cube_path(destination))
+        write_dataset(merged, destination)
+        summary['rows_written'] = len(merged)
+    return summary
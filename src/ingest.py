@@ -0,0 +1,192 @@
+from collections import Counter
+
+import pandas as pd
+import pyarrow as pa
+from pandas.io.parsers import TextParser
+
+from src.cube import build_cube, merge_cubes
+from src.instrument import stage
+from src.normalise import category_labels
+from src.settings import dtype_plan, stream_chunk_rows, std_date_cols
+from src.store import arrow_ready, cube_path, open_dataset_writer, replacing, write_dataset
+from src.standardise import ROW_HASH_COL, ROW_KEY_COL, standardise_data, text_values
+
+"""Streaming Ingestion"""
+
+
+def _header(row):
+    return [str(val) if val is not None else f'Unnamed: {i}' for i, val in enumerate(row)]
+
+
+def _to_frame(header, batch):
+    # Same parser pd.read_excel runs the cell values through, so numbers stored as text get converted alike
+    return TextParser([header] + batch, header=0).read()
+
+
+def _open_workbook(file):
+    """
+    Returns:
+        (read-only openpyxl workbook, whether the caller has to close it)
+    """
+    if isinstance(file, pd.ExcelFile):
+        return file.book, False
+    # openpyxl is only needed to stream a workbook, pandas imports it itself for pd.ExcelFile
+    from openpyxl import load_workbook
+    return load_workbook(file, read_only=True, data_only=True), True
+
+
+def read_mapped_columns(workbook, sheet_name, col_mapping, extra_cols=()):
+    """
+    Parse only the mapped columns of a sheet and rename them to the standard column names
+    Args:
+        workbook: pd.ExcelFile kept open since the upload
+        sheet_name:
+        col_mapping: file column -> standard column mapping
+        extra_cols: further file columns to read in the same pass, kept under their file names
+
+    Returns:
+        DataFrame with the standard columns followed by the extra columns
+    """
+    with stage('excel_read_mapped') as record:
+        df = workbook.parse(sheet_name, header=0, usecols=[*col_mapping.keys(), *extra_cols])
+        record['rows'] = len(df)
+    return df.rename(columns=col_mapping)[[*col_mapping.values(), *extra_cols]]
+
+
+def iter_excel_chunks(file, sheet_name, chunk_size=stream_chunk_rows):
+    """
+    Read a worksheet in row chunks without loading the workbook into memory
+    Args:
+        file: path or file-like object of an xlsx workbook, or an open pd.ExcelFile
+        sheet_name: worksheet to read, the first row holds the headers
+        chunk_size: rows per chunk
+
+    Yields:
+        DataFrame per chunk, with the worksheet headers as columns
+    """
+    workbook, owned = _open_workbook(file)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = _header(next(rows, ()))
+        num_cols = len(header)
+        batch = []
+        for row in rows:
+            if all(val is None for val in row):
+                continue
+            if len(row) != num_cols:
+                row = (tuple(row) + (None,) * num_cols)[:num_cols]
+            batch.append(list(row))
+            if len(batch) >= chunk_size:
+                yield _to_frame(header, batch)
+                batch = []
+        if batch:
+            yield _to_frame(header, batch)
+    finally:
+        if owned:
+            workbook.close()
+
+
+def excel_row_count(file, sheet_name):
+    """
+    Returns:
+        number of data rows recorded in the worksheet dimensions, None if the workbook does not record them
+    """
+    workbook, owned = _open_workbook(file)
+    try:
+        max_row = workbook[sheet_name].max_row
+        return max_row - 1 if max_row else None
+    finally:
+        if owned:
+            workbook.close()
+
+
+def stream_schema(df):
+    """
+    Arrow schema every chunk is written with, so a column never changes type between chunks. Types come from
+    src.settings.dtype_plan rather than from the values of the first chunk: numeric columns of the plan are float64,
+    read back in their planned dtype by src.standardise.apply_dtype_plan, and every other column is text.
+    """
+    fields = []
+    for col in df.columns:
+        kind = dtype_plan.get(col)
+        if col in category_labels:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        elif col in std_date_cols:
+            arrow_type = pa.timestamp('ns')
+        elif col in (ROW_KEY_COL, ROW_HASH_COL):
+            arrow_type = pa.uint64()
+        elif kind is not None and kind != 'category':
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(col, arrow_type))
+    return pa.schema(fields)
+
+
+def coerce_chunk(df, schema):
+    """
+    Convert a standardised chunk to the stream schema: every possible category, float numerics and string text.
+    Text is never converted to numbers.
+    """
+    for field in schema:
+        col = field.name
+        if col in category_labels:
+            df[col] = df[col].cat.set_categories(category_labels[col])
+        elif pa.types.is_floating(field.type):
+            df[col] = df[col].astype('float64')
+        elif pa.types.is_string(field.type):
+            df[col] = text_values(df[col])
+    return pa.Table.from_pandas(arrow_ready(df[schema.names]), schema=schema, preserve_index=False)
+
+
+def stream_standardise(file, sheet_name, col_mapping, destination, chunk_size=stream_chunk_rows, progress=None):
+    """
+    Read, standardise and append a worksheet to the columnar store one chunk at a time, so peak memory depends on
+    the chunk size rather than the size of the file
+    Args:
+        file: path or file-like object of an xlsx workbook, or an open pd.ExcelFile
+        sheet_name: worksheet to read
+        col_mapping: file column -> standard column mapping
+        destination: dataset file to write
+        chunk_size: rows per chunk
+        progress: optional callback(rows_read, total_rows), total_rows may be None
+
+    Returns:
+        dict with rows_read, rows_written and the per column count of unparsed dates. The claims cube is written
+        next to destination.
+    """
+    with stage('stream_standardise') as record:
+        total_rows = excel_row_count(file, sheet_name)
+        mapped_cols = list(col_mapping.values())
+        summary = {'rows_read': 0, 'rows_written': 0, 'unparsed_dates': Counter()}
+        writer, schema, cube = None, None, None
+        # Row keys of the claims already read, see src.standardise.with_row_keys
+        seen = Counter()
+        # Chunks are written to a temporary file renamed over destination at the end, readers never see a partial
+        # dataset
+        with replacing(destination) as temp:
+            try:
+                for chunk in iter_excel_chunks(file, sheet_name, chunk_size):
+                    summary['rows_read'] += len(chunk)
+                    chunk = chunk.rename(columns=col_mapping)[mapped_cols]
+                    std_chunk = standardise_data(chunk, seen)
+                    if std_chunk is None:
+                        raise ValueError(f"Standardisation failed after {summary['rows_read']} rows")
+                    summary['unparsed_dates'].update(std_chunk.attrs.get('unparsed_dates', {}))
+                    if not std_chunk.empty:
+                        if writer is None:
+                            schema = stream_schema(std_chunk)
+                            writer = open_dataset_writer(temp, schema)
+                        cube = merge_cubes([cube, build_cube(std_chunk)])
+                        writer.write_table(coerce_chunk(std_chunk, schema))
+                        summary['rows_written'] += len(std_chunk)
+                    if progress is not None:
+                        progress(summary['rows_read'], total_rows)
+            finally:
+                if writer is not None:
+                    writer.close()
+            if cube is not None:
+                write_dataset(cube, cube_path(destination))
+        record['rows'] = summary['rows_read']
+    summary['unparsed_dates'] = dict(summary['unparsed_dates'])
+    return summary
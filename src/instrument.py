@@ -0,0 +1,162 @@
+import argparse
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+import appdirs
+import pandas as pd
+
+from src.settings import stage_log_max_bytes, stage_log_backups
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is then not recorded
+    resource = None
+
+"""Stage Instrumentation"""
+
+stage_log_path = Path(appdirs.user_log_dir()) / 'claimsAnalysis' / 'stages.jsonl'
+stage_logger = logging.getLogger('claimsAnalysis.stages')
+
+# (records, session id) the stages run in the current thread are appended to, see bind_records
+_bound_records = contextvars.ContextVar('bound_records', default=(None, None))
+
+
+def _rss_mb():
+    """Resident memory of the process, only available on Linux"""
+    try:
+        with open('/proc/self/statm', 'r') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    """High-water mark of the resident memory of the process"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def configure_stage_log(path=stage_log_path):
+    """
+    Write stage records as JSON lines to a rotating log file, once per process
+    """
+    if stage_logger.handlers:
+        return
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=stage_log_max_bytes, backupCount=stage_log_backups)
+    except OSError:
+        return
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    stage_logger.addHandler(handler)
+    stage_logger.setLevel(logging.INFO)
+    stage_logger.propagate = False
+
+
+def bind_records(records, session_id=None):
+    """
+    Append the records of stages run from now on in this thread (a Streamlit script run) to records
+    Args:
+        records: list or deque kept by the caller, e.g. in the session state
+        session_id: identifies the session in the stage log
+    """
+    _bound_records.set((records, session_id))
+
+
+@contextmanager
+def recording(records, session_id=None):
+    """
+    bind_records for the duration of a block only
+    """
+    token = _bound_records.set((records, session_id))
+    try:
+        yield records
+    finally:
+        _bound_records.reset(token)
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Record the wall time, rows processed and memory of a block. Memory is that of the whole process: rss_growth_mb is
+    how much the resident memory grew from the start to the end of the block, which concurrent sessions of the server
+    also move. The process high-water mark is recorded as peak_rss_mb but only says how large the process ever got.
+    Args:
+        name: stage name, dotted for sub stages, e.g. 'standardise.std_dates'
+        rows: rows the stage processes, can also be set on the yielded record once known
+
+    Yields:
+        the record, a dict
+    """
+    records, session_id = _bound_records.get()
+    record = {'stage': name, 'session': session_id, 'started_at': datetime.now().isoformat(timespec='milliseconds'),
+              'rows': rows}
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = round(time.perf_counter() - started, 4)
+        rss = _rss_mb()
+        peak = _peak_rss_mb()
+        record['rss_mb'] = None if rss is None else round(rss, 1)
+        record['rss_growth_mb'] = None if rss is None or rss_before is None else round(rss - rss_before, 1)
+        record['peak_rss_mb'] = None if peak is None else round(peak, 1)
+        if records is not None:
+            records.append(record)
+        stage_logger.info(json.dumps(record, default=str))
+
+
+def read_stage_log(path=stage_log_path):
+    """
+    Returns:
+        DataFrame of the records in the stage log and its rotated backups
+    """
+    frames = []
+    for log_file in sorted(Path(path).parent.glob(f'{Path(path).name}*')):
+        frames.append(pd.read_json(log_file, lines=True))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def stage_summary(records):
+    """
+    Args:
+        records: DataFrame of stage records, e.g. from read_stage_log
+
+    Returns:
+        per stage count, sessions, median, 95th percentile and maximum seconds, median rows and the largest growth of
+        the resident memory
+    """
+    # Logs written before rss_growth_mb was recorded lack the column
+    records = records.reindex(columns=records.columns.union(['rss_growth_mb'], sort=False))
+    return records.groupby('stage').agg(runs=('seconds', 'size'),
+                                         sessions=('session', 'nunique'),
+                                         median_seconds=('seconds', 'median'),
+                                         p95_seconds=('seconds', lambda seconds: seconds.quantile(0.95)),
+                                         max_seconds=('seconds', 'max'),
+                                         median_rows=('rows', 'median'),
+                                         max_rss_growth_mb=('rss_growth_mb', 'max')) \
+        .sort_values('p95_seconds', ascending=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarise the stage log across sessions")
+    parser.add_argument('--log', default=stage_log_path, help="stage log file")
+    args = parser.parse_args()
+    stage_records = read_stage_log(args.log)
+    if stage_records.empty:
+        print(f"No stage records in {args.log}")
+    else:
+        print(stage_summary(stage_records).to_string())
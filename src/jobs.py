@@ -0,0 +1,175 @@
+import contextvars
+import io
+import threading
+import time
+import traceback as tb
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from src.datasets import publish
+from src.ingest import read_mapped_columns, stream_standardise
+from src.settings import job_workers, job_max_finished
+from src.standardise import standardise_data, write_standardised
+
+"""Background Standardisation Jobs"""
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+_lock = threading.Lock()
+# job id -> {'description', 'state', 'stage', 'fraction', 'message', 'submitted_at', 'finished_at', 'result',
+# 'error', 'cancel': threading.Event}
+_jobs = {}
+_executor = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Threads rather than processes: jobs report progress and read cancellation from shared memory, and
+            # pandas releases the GIL in most of the heavy lifting
+            _executor = ThreadPoolExecutor(max_workers=job_workers, thread_name_prefix='standardise')
+        return _executor
+
+
+def _update(job_id, **fields):
+    with _lock:
+        _jobs[job_id].update(fields)
+
+
+def _forget_finished():
+    finished = sorted((job['finished_at'], job_id) for job_id, job in _jobs.items() if job['state'] in FINISHED_STATES)
+    for _, job_id in finished[:max(0, len(finished) - job_max_finished)]:
+        del _jobs[job_id]
+
+
+def _run(job_id, func, args):
+    cancel = _jobs[job_id]['cancel']
+
+    def report(stage, fraction=None, message=None):
+        if cancel.is_set():
+            raise JobCancelled()
+        _update(job_id, stage=stage, fraction=fraction, message=message)
+
+    try:
+        report('starting', 0.0)
+        _update(job_id, state=RUNNING)
+        result = func(report, *args)
+        _update(job_id, state=DONE, stage='done', fraction=1.0, message=None, result=result)
+    except JobCancelled:
+        _update(job_id, state=CANCELLED, message="Cancelled")
+    except Exception as e:
+        print(tb.format_exc())
+        _update(job_id, state=FAILED, error=f"{type(e).__name__}: {e}")
+    finally:
+        with _lock:
+            _jobs[job_id]['finished_at'] = time.time()
+            _forget_finished()
+
+
+def submit_job(description, func, *args):
+    """
+    Run func in the background job pool. The stage records of the job are bound to the caller's session, as if it ran
+    in the script run that submitted it.
+    Args:
+        description: shown with the job's progress
+        func: function of a report(stage, fraction=None, message=None) callback and args. report raises JobCancelled
+            once the job is cancelled, so func stops at its next report.
+        *args: passed to func
+
+    Returns:
+        job id, for job_status and cancel_job
+    """
+    job_id = uuid.uuid4().hex[:12]
+    with _lock:
+        _jobs[job_id] = {'description': description, 'state': QUEUED, 'stage': 'queued', 'fraction': 0.0,
+                         'message': None, 'submitted_at': time.time(), 'finished_at': None, 'result': None,
+                         'error': None, 'cancel': threading.Event()}
+    _get_executor().submit(contextvars.copy_context().run, _run, job_id, func, args)
+    return job_id
+
+
+def job_status(job_id):
+    """
+    Returns:
+        dict with the description, state, stage, fraction done (None when unknown), message, submitted_at,
+        finished_at, result and error of the job, or None for an unknown or forgotten job
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        return None if job is None else {key: value for key, value in job.items() if key != 'cancel'}
+
+
+def cancel_job(job_id):
+    """
+    Ask a job to stop. A queued job never starts, a running one stops at its next progress report.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job['state'] in FINISHED_STATES:
+            return
+        job['cancel'].set()
+        if job['state'] == QUEUED:
+            job['message'] = "Cancelling..."
+
+
+def forget_job(job_id):
+    """
+    Drop a finished job once its result has been picked up. Running jobs are kept.
+    """
+    with _lock:
+        if job_id in _jobs and _jobs[job_id]['state'] in FINISHED_STATES:
+            del _jobs[job_id]
+
+
+def standardise_job(report, workbook, sheet_name, col_mapping, dataset_id, streaming=False):
+    """
+    Read, standardise and publish one worksheet, the job submitted from the Data Upload page
+    Args:
+        report: see submit_job
+        workbook: bytes of an xlsx workbook, the job opens its own handle on them
+        sheet_name:
+        col_mapping: file column -> standard column mapping
+        dataset_id: id to publish the dataset under, see src.datasets.new_dataset_id
+        streaming: standardise in chunks with src.ingest.stream_standardise, reporting progress after every chunk
+
+    Returns:
+        dict with the dataset ref (None if no row was kept), rows_read, rows_written and the per column count of
+        unparsed dates
+    """
+    with pd.ExcelFile(io.BytesIO(workbook)) as excel_file:
+        if streaming:
+            summary = {}
+
+            def chunk_progress(rows_read, total_rows):
+                report('standardising', min(rows_read / total_rows, 1.0) if total_rows else None,
+                       f"Standardised {rows_read:,} of {total_rows or '?'} rows")
+
+            def write(path, previous):
+                summary.update(stream_standardise(excel_file, sheet_name, col_mapping, path, progress=chunk_progress))
+
+            report('standardising', 0.0, "Counting rows...")
+            ref = publish(dataset_id, write)
+            return {'ref': ref, **summary}
+
+        report('reading', 0.0, "Reading the mapped columns...")
+        df = read_mapped_columns(excel_file, sheet_name, col_mapping)
+    rows_read = len(df)
+    report('standardising', 0.4, f"Standardising {rows_read:,} rows...")
+    claims_df = standardise_data(df)
+    del df
+    if claims_df is None:
+        raise ValueError("The data could not be standardised with this mapping")
+    report('saving', 0.8, f"Saving {len(claims_df):,} rows...")
+    ref = publish(dataset_id, lambda path, previous: write_standardised(claims_df, path))
+    return {'ref': ref,
+            'rows_read': rows_read,
+            'rows_written': len(claims_df),
+            'unparsed_dates': claims_df.attrs.get('unparsed_dates', {})}
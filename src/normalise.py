@@ -0,0 +1,106 @@
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from src.settings import mapping
+
+"""Categorical Normalisation"""
+
+
+def compile_lookup(table, readable=None):
+    """
+    Build a lookup from a normalised (lower-cased, stripped) raw value to its final label
+    Args:
+        table: raw value -> standard value section of mapping.json
+        readable: optional standard value -> readable label section, chained after `table`
+
+    Returns:
+        dict
+    """
+    lookup = {}
+    for raw_val, std_val in table.items():
+        if readable is not None:
+            std_val = readable.get(std_val, 'NA')
+        lookup[raw_val.lower().strip()] = std_val
+    return lookup
+
+
+gender_lookup = compile_lookup(mapping['gender'])
+relation_lookup = compile_lookup(mapping['relation'])
+claim_status_lookup = compile_lookup(mapping['claim_status'],
+                                     mapping['readable_str_mapping']['claim_status'])
+ailment_group_lookup = mapping['ailment_group']
+
+
+def lookup_resolver(lookup, default='NA'):
+    """
+    Args:
+        lookup: dict produced by compile_lookup
+        default: label for missing or unknown values
+
+    Returns:
+        function resolving a single raw value to its label
+    """
+    def resolve(val):
+        if not isinstance(val, str):
+            return default
+        return lookup.get(val.lower().strip(), default)
+    return resolve
+
+
+def normalise_categorical(series, resolve):
+    """
+    Resolve every distinct value of a column once and write the labels back as a Categorical. Rows only go through
+    integer code lookups.
+    Args:
+        series: column to normalise
+        resolve: function mapping a single raw value (None for missing) to its label
+
+    Returns:
+        Categorical Series with the same index
+    """
+    codes, uniques = pd.factorize(series)
+    # The extra label at the end is picked up by the -1 code factorize gives missing values
+    labels = [resolve(val) for val in uniques] + [resolve(None)]
+    # Sorted categories, as in category_labels, so data standardised at once or in chunks gets the same categories
+    label_codes, categories = pd.factorize(pd.Index(labels), sort=True)
+    categorical = pd.Categorical.from_codes(label_codes[codes], categories=categories)
+    return pd.Series(categorical, index=series.index, name=series.name).cat.remove_unused_categories()
+
+
+def _labels(values):
+    return sorted(set(values) | {'NA'})
+
+
+# Every label the normaliser can produce per column, used where chunks written separately must share categories
+category_labels = {
+    'Sex': _labels(gender_lookup.values()),
+    'Relation': _labels(relation_lookup.values()),
+    'ClaimStatus': _labels(claim_status_lookup.values()),
+    'AilmentICDCode': _labels(ailment_group_lookup.keys()),
+    'AilmentGroupDescription': _labels(ailment_group_lookup.values()),
+}
+
+
+def concat_categorical(frames):
+    """
+    pd.concat turns a categorical column into objects when the frames have different categories. Keep the columns
+    that are categorical in every frame categorical, with the union of their categories, without going through the
+    values as objects.
+    Args:
+        frames: DataFrames
+
+    Returns:
+        DataFrame of the frames one after the other, with a fresh index
+    """
+    columns = list(dict.fromkeys(col for frame in frames for col in frame.columns))
+    categorical_cols = [col for col in columns
+                        if all(col in frame.columns and isinstance(frame[col].dtype, pd.CategoricalDtype)
+                               for frame in frames)]
+    df = pd.concat([frame.drop(columns=categorical_cols) for frame in frames], ignore_index=True)
+    for col in categorical_cols:
+        try:
+            df[col] = union_categoricals([frame[col] for frame in frames], ignore_order=True)
+        except TypeError:
+            # Categories of different types, e.g. numbers in one frame and text in another
+            df[col] = pd.concat([frame[col].astype(object) for frame in frames], ignore_index=True).astype('category')
+    return df[columns]
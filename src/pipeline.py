@@ -0,0 +1,175 @@
+import argparse
+import json
+import sys
+import traceback as tb
+from datetime import datetime
+from pathlib import Path
+
+import appdirs
+import numpy as np
+import pandas as pd
+
+from src.aliases import suggest_mapping
+from src.analytics import run_analysis
+from src.cube import load_or_build_cube
+from src.incremental import append_dump
+from src.ingest import read_mapped_columns, stream_standardise
+from src.instrument import configure_stage_log, recording, stage
+from src.questions import women_who_delivered_in_age_band
+from src.settings import compulsory_cols_to_be_mapped, mapping_version
+from src.standardise import apply_dtype_plan, save_standardised, standardise_data
+from src.store import dataset_path, read_dataset
+
+"""Headless Pipeline"""
+
+METRICS_SUFFIX = '_metrics.json'
+
+
+def load_column_mapping(path):
+    """
+    Args:
+        path: JSON file of file column -> standard column, as saved from the Data Upload page
+
+    Returns:
+        dict
+    """
+    with open(path, 'r') as fp:
+        return json.load(fp)
+
+
+def resolve_column_mapping(workbook, sheet_name, col_mapping=None):
+    """
+    Args:
+        workbook: open pd.ExcelFile
+        sheet_name:
+        col_mapping: saved file column -> standard column mapping, suggested from the headers when not given
+
+    Returns:
+        file column -> standard column mapping covering every required column
+    """
+    headers = workbook.parse(sheet_name, header=0, nrows=0).columns.to_list()
+    if col_mapping is None:
+        col_mapping = {header: compulsory_cols_to_be_mapped[required]
+                       for required, header in suggest_mapping(headers).items()}
+    missing_headers = [header for header in col_mapping if header not in headers]
+    if missing_headers:
+        raise ValueError(f"Columns not found in sheet {sheet_name!r}: {missing_headers}")
+    missing_cols = set(compulsory_cols_to_be_mapped.values()) - set(col_mapping.values())
+    if missing_cols:
+        raise ValueError(f"Required columns not mapped: {sorted(missing_cols)}")
+    return col_mapping
+
+
+def _json_ready(value):
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return json.loads(value.to_json(orient='index', date_format='iso'))
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def analysis_metrics(analysis):
+    """
+    Args:
+        analysis: dict returned by src.analytics.run_analysis
+
+    Returns:
+        JSON ready dict of every figure shown on the Analysis page. Segments are summarised by their stats rather
+        than listed claim by claim, only the outlier claims are listed.
+    """
+    claims_df = analysis['claims_df']
+    metrics = {name: _json_ready(value) for name, value in analysis.items()
+               if not isinstance(value, pd.DataFrame)
+               or name in ('segment_stats', 'claim_type_pct_by_location', 'outlier_claims')}
+    metrics['women_who_delivered_in_age_band_pct'] = women_who_delivered_in_age_band(claims_df)
+    return metrics
+
+
+def run_pipeline(workbook_path, output_dir, col_mapping=None, sheet_name=None, streaming=False, append_to=None):
+    """
+    Standardise one worksheet, store it with its claims cube and write the analysis metrics next to it. Runs without
+    Streamlit.
+    Args:
+        workbook_path: xlsx workbook
+        output_dir: directory for the dataset, cube and metrics files
+        col_mapping: file column -> standard column mapping, suggested from the headers when not given
+        sheet_name: worksheet to read, the first one by default
+        streaming: standardise in chunks with src.ingest.stream_standardise to bound memory on large files
+        append_to: dataset written by an earlier run to merge this later dump of the same policy into with
+            src.incremental.append_dump, instead of writing a new dataset
+
+    Returns:
+        metrics dict, also written to <workbook>_metrics.json in output_dir next to <workbook>_Standardised.arrow,
+        <workbook> being the name of the workbook without its suffix as on the upload page. The time, rows and memory
+        of every stage are listed under run.stages.
+    """
+    workbook_path, output_dir = Path(workbook_path), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with recording([], workbook_path.stem) as records, pd.ExcelFile(workbook_path) as workbook:
+        sheet_name = workbook.sheet_names[0] if sheet_name is None else sheet_name
+        col_mapping = resolve_column_mapping(workbook, sheet_name, col_mapping)
+        if append_to is not None:
+            location = Path(append_to)
+            summary = append_dump(read_mapped_columns(workbook, sheet_name, col_mapping), location)
+            claims_df = apply_dtype_plan(read_dataset(location))
+        elif streaming:
+            location = dataset_path(output_dir, workbook_path.stem)
+            summary = stream_standardise(workbook, sheet_name, col_mapping, location)
+            claims_df = apply_dtype_plan(read_dataset(location))
+        else:
+            df = read_mapped_columns(workbook, sheet_name, col_mapping)
+            rows_read = len(df)
+            claims_df = standardise_data(df)
+            if claims_df is None:
+                raise ValueError("Standardisation failed")
+            location = save_standardised(claims_df, output_dir, workbook_path.stem)
+            summary = {'rows_read': rows_read,
+                       'rows_written': len(claims_df),
+                       'unparsed_dates': claims_df.attrs.get('unparsed_dates', {})}
+        with stage('pipeline.analysis', rows=len(claims_df)):
+            analysis = run_analysis(claims_df, load_or_build_cube(location, claims_df))
+    metrics = {'run': {'workbook': str(workbook_path),
+                       'sheet': sheet_name,
+                       'dataset': str(location),
+                       'column_mapping': col_mapping,
+                       'mapping_version': mapping_version,
+                       'finished_at': datetime.now().isoformat(timespec='seconds'),
+                       **summary,
+                       'stages': records},
+               **analysis_metrics(analysis)}
+    metrics_path = output_dir / f'{workbook_path.stem}{METRICS_SUFFIX}'
+    with open(metrics_path, 'w') as fp:
+        json.dump(metrics, fp, indent=2, default=str)
+    return metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Standardise and analyse claims MIS workbooks without the UI")
+    parser.add_argument('workbooks', nargs='+', help="xlsx workbooks to process")
+    parser.add_argument('--mapping', help="JSON file of file column -> standard column, suggested when omitted")
+    parser.add_argument('--sheet', help="worksheet to read, the first one by default")
+    parser.add_argument('--output-dir', default=appdirs.user_data_dir(),
+                        help="directory for the standardised data and metrics files")
+    parser.add_argument('--stream', action='store_true', help="standardise in chunks to bound memory")
+    parser.add_argument('--append', metavar='DATASET',
+                        help="merge the new and changed claims into this dataset instead of writing a new one")
+    args = parser.parse_args(argv)
+
+    configure_stage_log()
+    col_mapping = load_column_mapping(args.mapping) if args.mapping else None
+    failures = 0
+    for workbook_path in args.workbooks:
+        try:
+            metrics = run_pipeline(workbook_path, args.output_dir, col_mapping, args.sheet, args.stream,
+                                   args.append)
+            run = metrics['run']
+            print(f"{workbook_path}: {run['rows_written']} of {run['rows_read']} rows standardised into "
+                  f"{run['dataset']}")
+        except Exception:
+            print(tb.format_exc())
+            failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.segments import SEGMENT_MASK_COL, predicate_operators, segment_bit, segment_predicate
+from src.settings import query_cache_max_entries, sort_cache_max_entries
+from src.standardise import ROW_HASH_COL, ROW_KEY_COL, text_values
+
+"""Query Engine"""
+
+query_operators = ['==', '!=', '>', '>=', '<', '<=', 'in', 'not in', 'contains']
+aggregation_functions = ['count', 'sum', 'mean', 'median', 'min', 'max']
+# Bookkeeping columns of the stored claims, not offered for querying
+hidden_columns = [SEGMENT_MASK_COL, ROW_KEY_COL, ROW_HASH_COL]
+
+_cache_lock = threading.Lock()
+_query_cache = OrderedDict()
+_sort_orders = OrderedDict()
+
+
+def build_query(filters=(), segments=(), group_by=(), measure='IncurredAmount', aggregations=('count',),
+                sort_by=None, ascending=False, top_n=None):
+    """
+    Args:
+        filters: (column, operator, value) triples, all of which must hold. For 'in' and 'not in' value is a list.
+        segments: names of src.settings.segment_definitions the claims must belong to
+        group_by: columns to group by, no grouping returns the matching claims
+        measure: column aggregated when grouping
+        aggregations: functions from aggregation_functions applied to measure
+        sort_by: result column to sort by
+        ascending:
+        top_n: number of rows to keep after sorting
+
+    Returns:
+        query dict
+    """
+    return {'filters': [list(f) for f in filters],
+            'segments': list(segments),
+            'group_by': list(group_by),
+            'measure': measure,
+            'aggregations': list(aggregations),
+            'sort_by': sort_by,
+            'ascending': ascending,
+            'top_n': top_n}
+
+
+def query_key(query):
+    return json.dumps(query, sort_keys=True, default=str)
+
+
+def _coerce_value(series, value):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    if pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+        return float(value)
+    return value
+
+
+def filter_mask(df, column, op, value):
+    """
+    Args:
+        df:
+        column:
+        op: one of query_operators
+        value: value to compare with, a list for 'in' and 'not in'
+
+    Returns:
+        boolean numpy array
+    """
+    series = df[column]
+    negate = op in ('!=', 'not in')
+    if op in ('==', '!=', 'in', 'not in'):
+        values = value if op in ('in', 'not in') else [value]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Compare integer codes, not strings. Values are matched to the categories as text, the way they are typed
+            # in, so that numeric categories such as employee codes match too.
+            labels = pd.Index(text_values(pd.Series(series.cat.categories)).astype(str))
+            codes = labels.get_indexer(text_values(pd.Series(values, dtype=object)).astype(str).str.strip())
+            mask = np.isin(series.cat.codes.to_numpy(), codes[codes >= 0])
+        else:
+            mask = series.isin([_coerce_value(series, val) for val in values]).to_numpy()
+        return ~mask if negate else mask
+    if op == 'contains' and isinstance(series.dtype, pd.CategoricalDtype):
+        # Match the categories once instead of every row
+        matches = series.cat.categories.astype(str).str.contains(str(value), case=False, regex=False)
+        return np.isin(series.cat.codes.to_numpy(), np.flatnonzero(matches))
+    if op == 'contains':
+        return series.astype(str).str.contains(str(value), case=False, regex=False).fillna(False).to_numpy()
+    return predicate_operators[op](series, _coerce_value(series, value)).fillna(False).to_numpy(dtype=bool)
+
+
+def run_query(df, query):
+    """
+    Args:
+        df: standardised claims data
+        query: dict from build_query
+
+    Returns:
+        DataFrame with the matching claims, or the aggregated groups when the query groups
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in query['filters']:
+        mask &= filter_mask(df, column, op, value)
+    for name in query['segments']:
+        if SEGMENT_MASK_COL in df.columns:
+            mask &= (df[SEGMENT_MASK_COL].to_numpy() & segment_bit(name)) != 0
+        else:
+            mask &= segment_predicate(df, name).to_numpy()
+    result = df.loc[mask]
+
+    if query['group_by']:
+        aggregations = ['size' if func == 'count' else func for func in query['aggregations']] or ['size']
+        result = result.groupby(query['group_by'], observed=True, dropna=False)[query['measure']] \
+            .agg(aggregations) \
+            .rename(columns={'size': 'count'}) \
+            .reset_index()
+
+    if query['sort_by'] in result.columns:
+        result = result.sort_values(query['sort_by'], ascending=query['ascending'])
+    if query['top_n']:
+        result = result.head(query['top_n'])
+    return result
+
+
+def cached_query(fingerprint, df, query):
+    """
+    run_query with the results kept per (dataset, query), least recently used results are evicted first
+    Args:
+        fingerprint: src.datasets ref of the dataset df was read from
+        df:
+        query:
+
+    Returns:
+        result of run_query, shared between callers and so not to be modified in place
+    """
+    key = (fingerprint, query_key(query))
+    with _cache_lock:
+        if key in _query_cache:
+            _query_cache.move_to_end(key)
+            return _query_cache[key]
+    result = run_query(df, query)
+    with _cache_lock:
+        _query_cache[key] = result
+        while len(_query_cache) > query_cache_max_entries:
+            _query_cache.popitem(last=False)
+    return result
+
+
+def sort_order(key, df, sort_by, ascending=False):
+    """
+    Row positions of df in sorted order, kept per (key, sort_by, ascending) so that paging through a table or
+    filtering it does not sort it again. Least recently used orders are evicted first.
+    Args:
+        key: identifies df, e.g. (dataset fingerprint, segment name), or None to sort without caching
+        df:
+        sort_by: column to sort by, None for the order of df
+        ascending:
+
+    Returns:
+        numpy array of positions, missing values last. Categoricals are sorted by label.
+    """
+    if sort_by is None:
+        return np.arange(len(df))
+    cache_key = None if key is None else (key, sort_by, ascending)
+    with _cache_lock:
+        if cache_key in _sort_orders:
+            _sort_orders.move_to_end(cache_key)
+            return _sort_orders[cache_key]
+    values = df[sort_by].reset_index(drop=True)
+    if isinstance(values.dtype, pd.CategoricalDtype) and not values.cat.ordered:
+        # Unordered categoricals sort by their codes, whose order depends on how the data was put together
+        try:
+            values = values.cat.reorder_categories(values.cat.categories.sort_values())
+        except TypeError:
+            values = values.astype(str).where(values.notna())
+    order = values \
+        .sort_values(ascending=ascending, kind='stable', na_position='last') \
+        .index.to_numpy(dtype=np.int32 if len(df) < 2 ** 31 else np.int64)
+    if cache_key is not None:
+        with _cache_lock:
+            _sort_orders[cache_key] = order
+            while len(_sort_orders) > sort_cache_max_entries:
+                _sort_orders.popitem(last=False)
+    return order
+
+
+def table_page(df, order, page, page_rows, mask=None):
+    """
+    Args:
+        df:
+        order: row positions from sort_order
+        page: 1-based page number
+        page_rows: rows per page
+        mask: optional boolean numpy array of the rows to keep, e.g. from filter_mask
+
+    Returns:
+        (rows of the page in sorted order, number of rows left after the mask)
+    """
+    if mask is not None:
+        order = order[mask[order]]
+    start = (page - 1) * page_rows
+    return df.iloc[order[start:start + page_rows]], len(order)
+
+
+def get_page(result, page, page_rows):
+    """
+    Args:
+        result:
+        page: 1-based page number
+        page_rows: rows per page
+
+    Returns:
+        rows of the page
+    """
+    start = (page - 1) * page_rows
+    return result.iloc[start:start + page_rows]
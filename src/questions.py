@@ -1,24 +1,18 @@
-import re
-import traceback as tb
-import streamlit as st
-from dateparser import parse
-from tabulate import tabulate as tab
-from src.settings import mapping
-import seaborn as sns
+from src.segments import segment_predicate
 
 """Claim Segregation"""
 
 
 def get_high_value_claims(df):
-    return df.loc[df['PercentOfSumInsuredClaimed'] > 70]
+    return df.loc[segment_predicate(df, 'high_value_claims')]
 
 
 def get_injury_claims(df):
-    return df.loc[df['AilmentICDCode'].isin(["S", "T"])]
+    return df.loc[segment_predicate(df, 'injury_claims')]
 
 
 def get_si_exhausted_claims(df):
-    return df.loc[df['PercentOfSumInsuredClaimed'] >= 100]
+    return df.loc[segment_predicate(df, 'si_exhausted_claims')]
 
 
 def get_maternity_claims(df):
@@ -30,7 +24,7 @@ def get_maternity_claims(df):
     Returns:
 
     """
-    return df.loc[df['AilmentICDCode'].isin(['O', 'P'])]
+    return df.loc[segment_predicate(df, 'maternity_claims')]
 
 
 def get_parental_claims(df):
@@ -42,7 +36,7 @@ def get_parental_claims(df):
 
     """
     # Filter the DataFrame to include only claims from Parents
-    return df.loc[df['Relation'] == 'Parent']
+    return df.loc[segment_predicate(df, 'parental_claims')]
 
 
 def get_prolonged_hospitalisations(df):
@@ -54,7 +48,7 @@ def get_prolonged_hospitalisations(df):
     Returns:
 
     """
-    return df.loc[df['NoOfHospitalisedDays'] > 10]
+    return df.loc[segment_predicate(df, 'prolonged_hosp_claims')]
 
 
 
@@ -66,7 +60,7 @@ def get_claim_status_dist(df):
 
 
 def get_infectious_disease_claims(df):
-    return df.loc[df['AilmentICDCode'] == "A"]
+    return df.loc[segment_predicate(df, 'infectious_disease_claims')]
 
 
 def get_relation_distribution(df):
@@ -78,7 +72,32 @@ def get_claim_type_dist(df):
 
 
 def get_claim_type_dist_by_loc(df):
-    return df.groupby(['ClaimType', 'Location']).size().unstack().transpose()
+    return df.groupby(['ClaimType', 'Location'], observed=True).size().unstack().transpose()
+
+
+def get_claim_type_pct_by_loc(df):
+    claim_type_by_location = get_claim_type_dist_by_loc(df)
+    total_claims_by_location = df.groupby('Location', observed=True)['ClaimType'].count()
+    return claim_type_by_location.div(total_claims_by_location, axis=0) * 100
+
+
+"""Concentration"""
+
+
+def get_top_locations_by_count(df, n=10):
+    return df['Location'].value_counts().nlargest(n)
+
+
+def get_top_locations_by_max_value(df, n=10):
+    return df.groupby('Location', observed=True)['IncurredAmount'].max().nlargest(n)
+
+
+def get_top_hospitals_by_count(df, n=5):
+    return df['Hospital'].value_counts().nlargest(n)
+
+
+def get_top_hospitals_by_max_value(df, n=15):
+    return df.groupby('Hospital', observed=True)['IncurredAmount'].max().nlargest(n)
 
 
 """Get Specific Stats"""
@@ -0,0 +1,218 @@
+import io
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+import appdirs
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.query import hidden_columns
+from src.settings import report_cache_max_bytes, report_chunk_rows, segment_definitions
+from src.store import arrow_ready, file_lock, replacing
+
+"""Report Export"""
+
+# Format -> suffix of the report file
+report_formats = {'xlsx': '.xlsx', 'csv': '.csv.zip', 'parquet': '.parquet.zip'}
+report_dir = Path(appdirs.user_cache_dir()) / 'claimsAnalysis' / 'reports'
+
+# Rows of an xlsx worksheet, the header included. Longer tables continue on further sheets.
+excel_max_rows = 1048576
+excel_max_sheet_name = 31
+
+# Report tables in order, (analysis key, title). Segments follow the standardised data in the order they are defined.
+_tables = [('segment_stats', 'Segment stats'),
+           ('claims_df', 'Standardised data'),
+           *((name, name.replace('_', ' ').capitalize()) for name in segment_definitions),
+           ('outlier_claims', 'Outlier claims'),
+           ('claim_type_dist', 'Claim type distribution'),
+           ('claim_relation_dist', 'Relation distribution'),
+           ('claim_status_dist', 'Claim status distribution'),
+           ('claim_type_pct_by_location', 'Claim type % by location'),
+           ('top_locations_by_count', 'Top locations by count'),
+           ('top_locations_by_max_value', 'Top locations by max value'),
+           ('top_hospitals_by_count', 'Top hospitals by count'),
+           ('top_hospitals_by_max_value', 'Top hospitals by max value'),
+           ('cube', 'Claims cube')]
+
+
+def _table(value):
+    """Frame of a result as it is written: named or non-integer indexes become columns, claim indexes are dropped"""
+    df = value.to_frame() if isinstance(value, pd.Series) else value
+    index = df.index
+    if any(name is not None for name in index.names) or not pd.api.types.is_integer_dtype(index):
+        df = df.reset_index()
+    else:
+        df = df.reset_index(drop=True)
+    df.columns = [str(col) for col in df.columns]
+    return df.drop(columns=[col for col in hidden_columns if col in df.columns])
+
+
+def report_tables(analysis, title=None):
+    """
+    Args:
+        analysis: results of src.analytics.run_analysis, e.g. the cached mapping returned by
+            src.utilities.load_analysis. Nothing is recomputed.
+        title: name of the data, shown on the summary
+
+    Returns:
+        list of (title, DataFrame) in report order, a summary of the headline figures first
+    """
+    summary = pd.DataFrame({'figure': ['Data', 'Generated at', 'Number of claims', 'Total value of claims'],
+                            'value': [title or '', datetime.now().isoformat(timespec='seconds'),
+                                      analysis['total_claims'], float(analysis['total_incurred_amount'])]})
+    return [('Summary', summary),
+            *((name, _table(analysis[key])) for key, name in _tables if key in analysis)]
+
+
+def _chunks(df, chunk_rows):
+    """Rows of df as lists of plain Python values, chunk_rows at a time, with missing values as None"""
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object)
+        yield chunk.where(chunk.notna(), None).to_numpy().tolist()
+
+
+def _sheet_names(title, num_rows):
+    """Sheet names of a table, one per excel_max_rows - 1 rows"""
+    sheets = max(1, -(-num_rows // (excel_max_rows - 1)))
+    names = [title[:excel_max_sheet_name]]
+    for i in range(2, sheets + 1):
+        suffix = f' ({i})'
+        names.append(title[:excel_max_sheet_name - len(suffix)] + suffix)
+    return names
+
+
+def write_workbook(tables, path, chunk_rows=report_chunk_rows):
+    """
+    Write tables to one sheet each with openpyxl's write-only workbook, which streams rows to disk instead of keeping
+    every cell in memory
+    Args:
+        tables: list of (title, DataFrame)
+        path: xlsx file
+        chunk_rows: rows converted at a time
+    """
+    # openpyxl is only needed once a workbook is written, not to show the export options
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    for title, df in tables:
+        sheet_names = iter(_sheet_names(title, len(df)))
+        sheet, rows_left = None, 0
+        for rows in _chunks(df, chunk_rows):
+            for row in rows:
+                if not rows_left:
+                    sheet, rows_left = workbook.create_sheet(next(sheet_names)), excel_max_rows - 1
+                    sheet.append(list(df.columns))
+                sheet.append(row)
+                rows_left -= 1
+        if sheet is None:
+            workbook.create_sheet(next(sheet_names)).append(list(df.columns))
+    workbook.save(path)
+
+
+def _file_names(tables, suffix):
+    return [f'{i:02d}_{title.replace("%", "pct").replace(" ", "_")}{suffix}' for i, (title, _) in enumerate(tables)]
+
+
+def write_bundle(tables, path, fmt='csv', chunk_rows=report_chunk_rows):
+    """
+    Write tables to a zip of one CSV or Parquet file each, chunk by chunk
+    Args:
+        tables: list of (title, DataFrame)
+        path: zip file
+        fmt: 'csv' or 'parquet'
+        chunk_rows: rows written at a time, also the Parquet row group size
+    """
+    with zipfile.ZipFile(path, 'w') as bundle, tempfile.TemporaryDirectory() as temp_dir:
+        for (title, df), name in zip(tables, _file_names(tables, f'.{fmt}')):
+            if fmt == 'csv':
+                with bundle.open(name, 'w', force_zip64=True) as fp, \
+                        io.TextIOWrapper(fp, encoding='utf-8', newline='') as text:
+                    df.iloc[:0].to_csv(text, index=False)
+                    for start in range(0, len(df), chunk_rows):
+                        df.iloc[start:start + chunk_rows].to_csv(text, index=False, header=False)
+                continue
+            # Parquet is compressed already, it is stored as is
+            temp = Path(temp_dir) / name
+            df = arrow_ready(df.copy(deep=False))
+            # Text columns are inferred as null from no rows
+            schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+            schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                for field in schema], metadata=schema.metadata)
+            with pq.ParquetWriter(temp, schema) as writer:
+                for start in range(0, max(len(df), 1), chunk_rows):
+                    writer.write_table(pa.Table.from_pandas(df.iloc[start:start + chunk_rows], schema=schema,
+                                                            preserve_index=False))
+            bundle.write(temp, name, compress_type=zipfile.ZIP_STORED)
+            os.remove(temp)
+
+
+def write_report(analysis, path, fmt='xlsx', title=None):
+    """
+    Args:
+        analysis: see report_tables
+        path: report file, replaced atomically
+        fmt: a key of report_formats
+        title: see report_tables
+
+    Returns:
+        path
+    """
+    tables = report_tables(analysis, title)
+    with replacing(path) as temp:
+        if fmt == 'xlsx':
+            write_workbook(tables, temp)
+        else:
+            write_bundle(tables, temp, fmt)
+    return path
+
+
+def cached_report(key, analysis, fmt='xlsx', title=None):
+    """
+    Report of an analysis, written once per key and format and reused by every session and worker process
+    Args:
+        key: identifies the analysed data, e.g. its src.datasets ref
+        analysis: see report_tables
+        fmt: a key of report_formats
+        title: see report_tables
+
+    Returns:
+        Path of the report file
+    """
+    path = report_dir / f"{str(key).replace('@', '_v')}{report_formats[fmt]}"
+    report_dir.mkdir(parents=True, exist_ok=True)
+    # Sessions asking for the same report at once wait for the first one to write it
+    with file_lock(path):
+        if path.is_file():
+            os.utime(path)
+        else:
+            write_report(analysis, path, fmt, title)
+    evict(report_cache_max_bytes, keep=path)
+    return path
+
+
+def evict(max_bytes, keep=None):
+    """
+    Delete least recently used reports until the reports fit in max_bytes
+    """
+    entries = []
+    for path in report_dir.glob('*.*'):
+        if path.suffix == '.lock' or path.name.startswith('.') or path == keep:
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries) + (keep.stat().st_size if keep is not None and keep.is_file() else 0)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import operator
+
+import numpy as np
+import pandas as pd
+
+from src.settings import segment_definitions
+
+"""Segmentation Engine"""
+
+SEGMENT_MASK_COL = 'SegmentMask'
+# Changes whenever the segment definitions change, so a SegmentMask stored with a dataset is not reused across them
+segments_version = hashlib.sha256(json.dumps(segment_definitions, sort_keys=True).encode()).hexdigest()[:16]
+
+predicate_operators = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'isin': lambda col, values: col.isin(values),
+}
+
+
+def segment_bit(name):
+    """
+    Returns:
+        bit of the named segment in the SegmentMask column
+    """
+    return 1 << list(segment_definitions).index(name)
+
+
+def segment_predicate(df, name):
+    """
+    Args:
+        df: standardised claims data
+        name: key of src.settings.segment_definitions
+
+    Returns:
+        boolean Series, True for the claims in the segment
+    """
+    column, op, value = segment_definitions[name]
+    return predicate_operators[op](df[column], value).fillna(False).astype(bool)
+
+
+def mask_dtype():
+    num_segments = len(segment_definitions)
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if num_segments <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"Too many segments for a bitmask: {num_segments}")
+
+
+def segment_mask(df):
+    """
+    Evaluate every registered segment over the frame and pack membership into one integer per claim
+    Args:
+        df: standardised claims data
+
+    Returns:
+        unsigned integer Series, bit i set when the claim is in the i-th segment
+    """
+    dtype = mask_dtype()
+    mask = np.zeros(len(df), dtype=dtype)
+    for name in segment_definitions:
+        mask |= segment_predicate(df, name).to_numpy().astype(dtype) * dtype(segment_bit(name))
+    return pd.Series(mask, index=df.index, name=SEGMENT_MASK_COL)
+
+
+def with_segment_mask(df):
+    """
+    Add the SegmentMask column, keeping the one stored with the data when it was evaluated with the current segment
+    definitions
+    Args:
+        df: standardised claims data
+
+    Returns:
+        df, with the SegmentMask column set in place and the segments version recorded in df.attrs
+    """
+    if SEGMENT_MASK_COL not in df.columns or df.attrs.get('segments_version') != segments_version:
+        df[SEGMENT_MASK_COL] = segment_mask(df)
+        df.attrs['segments_version'] = segments_version
+    return df
+
+
+def get_segment(df, name):
+    """
+    Args:
+        df: claims data with a SegmentMask column
+        name: segment name
+
+    Returns:
+        claims in the segment
+    """
+    return df.loc[(df[SEGMENT_MASK_COL] & segment_bit(name)) != 0]
+
+
+def segment_stats(df):
+    """
+    Count, value and share of total for every segment from a single groupby over the distinct mask values
+    Args:
+        df: claims data with a SegmentMask column
+
+    Returns:
+        DataFrame indexed by segment name with count, value, percentage_by_count and percentage_by_value
+    """
+    by_mask = df.groupby(SEGMENT_MASK_COL)['IncurredAmount'].agg(['size', 'sum'])
+    total_count, total_value = by_mask['size'].sum(), by_mask['sum'].sum()
+    mask_values = by_mask.index.to_numpy()
+
+    rows = {}
+    for name in segment_definitions:
+        in_segment = (mask_values & segment_bit(name)) != 0
+        count = int(by_mask['size'].to_numpy()[in_segment].sum())
+        value = by_mask['sum'].to_numpy()[in_segment].sum()
+        rows[name] = {
+            'count': count,
+            'value': value,
+            'percentage_by_count': (count / total_count) * 100 if total_count else 0,
+            'percentage_by_value': (value / total_value) * 100 if total_value else 0,
+        }
+    return pd.DataFrame.from_dict(rows, orient='index')
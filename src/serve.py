@@ -0,0 +1,66 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from src.datasets import store_dir
+from src.settings import dataset_store_env, serve_base_port, serve_workers
+
+"""Multi-Process Deployment"""
+
+app_path = Path(__file__).resolve().parent.parent / '📑DataUpload.py'
+
+
+def worker_command(port):
+    return [sys.executable, '-m', 'streamlit', 'run', str(app_path),
+            '--server.port', str(port), '--server.headless', 'true']
+
+
+def serve(workers=serve_workers, base_port=serve_base_port, dataset_dir=None, poll_seconds=1):
+    """
+    Run several Streamlit worker processes of the app sharing one dataset directory, until one of them exits or the
+    launcher is interrupted. A session lives in the memory of the worker that serves it, so a load balancer in front of
+    the workers has to keep each browser on one worker, e.g. nginx with ip_hash.
+    Args:
+        workers: number of worker processes, up to the number of cores
+        base_port: port of the first worker, the others listen on the ports after it
+        dataset_dir: shared dataset directory, the store directory of this process by default
+        poll_seconds: how often the workers are checked
+
+    Returns:
+        exit code of the first worker to exit
+    """
+    env = {**os.environ, dataset_store_env: str(dataset_dir or store_dir)}
+    # Stop the workers too when the launcher is stopped by a process manager
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    processes = [subprocess.Popen(worker_command(base_port + i), env=env) for i in range(workers)]
+    print(f"{workers} workers sharing {env[dataset_store_env]} on "
+          f"{', '.join(f'http://localhost:{base_port + i}' for i in range(workers))}")
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(poll_seconds)
+        return next(process.returncode for process in processes if process.returncode is not None)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run several app worker processes sharing one dataset directory")
+    parser.add_argument('--workers', type=int, default=serve_workers)
+    parser.add_argument('--port', type=int, default=serve_base_port, help="port of the first worker")
+    parser.add_argument('--dataset-dir', help=f"shared dataset directory, ${dataset_store_env} by default")
+    args = parser.parse_args(argv)
+    return serve(args.workers, args.port, args.dataset_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import hashlib
 import json
 from pathlib import Path
 
@@ -14,6 +15,19 @@ std_date_cols = ['PolicyStartDate',
                  'PolicyEndDate',
                  'DateOfAdmission',
                  'DateOfDischarge']
+# Formats handed to dateparser for values the vectorized parser could not handle
+dateparser_formats = ['%m/%d%Y', '%d-%b-%Y', '%d-%B-%Y']
+# Candidate formats tried (in order) when inferring the format of a date column
+date_format_candidates = ['%d-%b-%Y',
+                          '%d-%B-%Y',
+                          '%d-%b-%y',
+                          '%m/%d/%Y',
+                          '%d/%m/%Y',
+                          '%d-%m-%Y',
+                          '%d.%m.%Y',
+                          '%Y-%m-%d',
+                          '%Y-%m-%d %H:%M:%S',
+                          '%Y-%m-%d %H:%M:%S.%f']
 str_cols = ["AilmentICDCode",
             "Insurer",
             "PolicyStartDate",
@@ -26,3 +40,137 @@ str_cols = ["AilmentICDCode",
             "DateOfAdmission",
             "DateOfDischarge",
             "Location"]
+
+# dtype of each standardised column, see src.standardise.apply_dtype_plan:
+# 'category': categorical, unless nearly every value is distinct (more than category_max_unique_ratio of the rows)
+# 'amount': smallest of int32/int64 when every value is present and whole, float64 otherwise
+# any other value is a pandas dtype, nullable integer columns are only cast when every value is whole
+dtype_plan = {
+    'Insurer': 'category',
+    'EmployeeCode': 'category',
+    'Sex': 'category',
+    'Relation': 'category',
+    'ClaimType': 'category',
+    'ClaimStatus': 'category',
+    'Location': 'category',
+    'Hospital': 'category',
+    'AilmentICDCode': 'category',
+    'AilmentGroupDescription': 'category',
+    'SumInsured': 'amount',
+    'BalanceSumInsured': 'amount',
+    'ClaimedAmount': 'amount',
+    'IncurredAmount': 'amount',
+    # Compared with the segment thresholds, float32 would shift values such as 87.06 to 87.059998
+    'PercentOfSumInsuredClaimed': 'float64',
+    'Age': 'Int16',
+    'NoOfHospitalisedDays': 'Int16',
+}
+category_max_unique_ratio = 0.5
+
+# Changes whenever mapping.json changes, so cached standardised data is not reused across mapping updates
+mapping_version = hashlib.sha256(mapping_file_path.read_bytes()).hexdigest()[:16]
+
+# Disk budget for cached standardised datasets, least recently used entries are evicted first
+dataset_cache_max_bytes = 2 * 1024 ** 3
+
+# Memory ceiling of the analysed datasets shared by all sessions of the server, datasets no session has used for
+# shared_store_idle_seconds are evicted first when it is exceeded
+shared_store_max_bytes = 2 * 1024 ** 3
+shared_store_idle_seconds = 30 * 60
+
+# Claim segments as (column, operator, value). Each segment gets one bit of the SegmentMask column, in this order.
+segment_definitions = {
+    'high_value_claims': ('PercentOfSumInsuredClaimed', '>', 70),
+    'injury_claims': ('AilmentICDCode', 'isin', ['S', 'T']),
+    'si_exhausted_claims': ('PercentOfSumInsuredClaimed', '>=', 100),
+    'maternity_claims': ('AilmentICDCode', 'isin', ['O', 'P']),
+    'parental_claims': ('Relation', '==', 'Parent'),
+    'prolonged_hosp_claims': ('NoOfHospitalisedDays', '>', 10),
+    'infectious_disease_claims': ('AilmentICDCode', '==', 'A'),
+}
+
+# Rows parsed for the upload preview and mapping form, and rows per chunk when streaming large workbooks
+stream_chunk_rows = 50000
+upload_preview_rows = 1000
+
+# Dimensions of the pre-aggregated claims cube, the measures are computed over IncurredAmount
+cube_dimensions = ['Location',
+                   'Hospital',
+                   'ClaimType',
+                   'Relation',
+                   'ClaimStatus',
+                   'AilmentGroupDescription']
+
+# Query results kept per (dataset, query) for the QueryData page, and rows shown per result page
+query_cache_max_entries = 32
+query_page_rows = 100
+
+# Rows shipped to the browser per page of the claim tables, and sort orders of tables kept for paging
+table_page_rows = 50
+sort_cache_max_entries = 64
+
+# Histogram bins and the cap on points per trace of the distribution plots, and the series kept per segment
+distribution_bins = 40
+distribution_max_points = 200
+distribution_cache_max_entries = 64
+
+# The standard columns carry no claim number, so a claim is identified across monthly dumps by these columns (and
+# the order of claims sharing them). A claim whose mapped values change in a later dump is updated, not duplicated.
+row_key_columns = ['EmployeeCode', 'Relation', 'Sex', 'DateOfAdmission', 'Hospital']
+
+# Claims are scored against the claims of the same ailment group, hospital and location. Claims of groups with fewer
+# than anomaly_min_group_claims claims are not scored; those scoring above anomaly_score_threshold are outliers.
+anomaly_group_columns = ['AilmentGroupDescription', 'Hospital', 'Location']
+anomaly_measure = 'IncurredAmount'
+anomaly_min_group_claims = 5
+anomaly_percentiles = [5, 95]
+anomaly_score_threshold = 3.5
+anomaly_top_n = 100
+
+# Headers recognised as the policy number when tagging claims ingested in a batch, compared case and punctuation blind
+policy_number_headers = ['Policy No', 'Policy Number', 'Policy_NO', 'PolicyNo', 'Policy']
+
+# Cold import time allowed per entry point, checked with python -m src.import_report. Scripts are measured by the
+# modules they import at the top level, the fastest of import_time_repeat runs counts. streamlit, pandas and pyarrow
+# alone take 700 ms to 1.2 s depending on the machine, the budgets leave room for that floor and little else: plotly
+# and openpyxl are imported where they are used.
+import_time_budgets_ms = {
+    '📑DataUpload.py': 1600,
+    'pages/1_📊Analysis.py': 1500,
+    'pages/2_❔QueryData.py': 1500,
+    'src.pipeline': 1000,
+}
+import_time_repeat = 5
+
+# Synthetic workbook sizes run by python -m src.benchmark, and the growth in time or peak memory of a stage flagged as
+# a regression. Stages faster or smaller than the minimums are too noisy to flag.
+benchmark_rows = [10000, 100000, 1000000]
+benchmark_regression_tolerance = 0.2
+benchmark_min_seconds = 0.05
+benchmark_min_mb = 1
+
+# Stage records kept per session for the diagnostics panel, and the size and number of rotated stage log files
+diagnostics_max_records = 200
+stage_log_max_bytes = 5 * 1024 ** 2
+stage_log_backups = 3
+
+# Standardisation jobs run at once in the background, finished jobs kept for their sessions to pick up, and how often
+# the Data Upload page refreshes the progress of a running job
+job_workers = 2
+job_max_finished = 32
+job_poll_seconds = 1
+
+# Environment variable naming the dataset directory shared by the worker processes of the app, a user data directory
+# on the local disk by default. Any directory every worker can reach stands in for shared storage.
+dataset_store_env = 'CLAIMS_DATASET_DIR'
+# Versions of a dataset kept on disk, older ones are deleted when a new version is written
+dataset_versions_kept = 3
+
+# Streamlit worker processes started by python -m src.serve, listening on consecutive ports from serve_base_port
+serve_workers = 2
+serve_base_port = 8501
+
+# Rows converted at a time when writing a report, so memory stays flat whatever the size of the tables, and the disk
+# budget of generated reports, least recently used reports are evicted first
+report_chunk_rows = 10000
+report_cache_max_bytes = 1024 ** 3
@@ -0,0 +1,183 @@
+import threading
+import time
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from src.settings import shared_store_max_bytes, shared_store_idle_seconds
+
+"""Process-wide Shared Dataset Store"""
+
+# Nullable integer, float and boolean columns. pandas hash tables reject a read-only mask, so these are stored as numpy
+# arrays instead, which can be frozen and shared like the other columns.
+_masked_arrays = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+_lock = threading.Lock()
+# key -> {'value': frozen dict, 'nbytes', 'last_used', 'sessions': {session id: last access}}
+_entries = {}
+# key -> lock held while the dataset is loaded, so concurrent sessions load it once
+_loading = {}
+_stats = {'hits': 0, 'loads': 0, 'evictions': 0}
+
+
+def _unmasked(values):
+    """
+    numpy array of a nullable column, its own numpy dtype when nothing is missing. Missing values become NaN, in a
+    float wide enough to hold every integer of the column exactly, or None for booleans.
+    """
+    if not values.isna().any():
+        return values.to_numpy(dtype=values.dtype.numpy_dtype)
+    if isinstance(values, pd.arrays.BooleanArray):
+        return values.to_numpy(dtype=object, na_value=None)
+    if isinstance(values, pd.arrays.IntegerArray):
+        return values.to_numpy(dtype=np.float32 if values.dtype.itemsize <= 2 else np.float64, na_value=np.nan)
+    return values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=np.nan)
+
+
+def _read_only(values):
+    if isinstance(values, pd.Categorical):
+        return pd.Categorical.from_codes(_read_only(values.codes), dtype=values.dtype)
+    if isinstance(values, _masked_arrays):
+        values = _unmasked(values)
+    array = np.asarray(values)
+    array.flags.writeable = False
+    return array
+
+
+def freeze(value):
+    """
+    Make the column buffers of a frame read-only without copying them, so in-place writes raise instead of changing
+    the data other sessions see. Nullable columns are converted to numpy arrays, see _unmasked.
+    Args:
+        value: DataFrame, Series or any other value, returned as is
+
+    Returns:
+        frozen DataFrame or Series
+    """
+    if isinstance(value, pd.DataFrame):
+        frozen = pd.DataFrame({col: _read_only(value[col].array) for col in value.columns}, index=value.index,
+                              copy=False)
+    elif isinstance(value, pd.Series):
+        frozen = pd.Series(_read_only(value.array), index=value.index, name=value.name, copy=False)
+    else:
+        return value
+    frozen.attrs = dict(value.attrs)
+    return frozen
+
+
+def _session_view(value):
+    """Shallow copy of a frozen value, columns added or dropped by a session stay in its own copy"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    return value
+
+
+def _nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    return 0
+
+
+def _release(session_id):
+    for entry in _entries.values():
+        entry['sessions'].pop(session_id, None)
+
+
+def acquire(key, session_id, load):
+    """
+    Hand a session a read-only reference to a dataset, loading it on first use. The session's reference to the dataset
+    it held before is released, a session holds one dataset at a time.
+    Args:
+        key: identifies the dataset, e.g. its src.datasets ref
+        session_id: identifies the session holding the reference
+        load: function of no arguments returning a dict of the dataset's frames and figures, called once per key
+
+    Returns:
+        read-only mapping with the values returned by load. Frames are frozen views shared with other sessions, they
+        can be filtered and extended but not modified in place.
+    """
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            loading = _loading.setdefault(key, threading.Lock())
+    if entry is None:
+        with loading:
+            with _lock:
+                entry = _entries.get(key)
+            if entry is None:
+                value = {name: freeze(item) for name, item in load().items()}
+                entry = {'value': value,
+                         'nbytes': sum(_nbytes(item) for item in value.values()),
+                         'last_used': time.monotonic(),
+                         'sessions': {}}
+                with _lock:
+                    _entries[key] = entry
+                    _loading.pop(key, None)
+                    _stats['loads'] += 1
+            else:
+                with _lock:
+                    _stats['hits'] += 1
+    else:
+        with _lock:
+            _stats['hits'] += 1
+    with _lock:
+        now = time.monotonic()
+        if session_id not in entry['sessions']:
+            _release(session_id)
+        entry['sessions'][session_id] = now
+        entry['last_used'] = now
+        _evict(shared_store_max_bytes, shared_store_idle_seconds)
+    return MappingProxyType({name: _session_view(item) for name, item in entry['value'].items()})
+
+
+def release(session_id):
+    """
+    Drop the reference of a session, e.g. when it uploads another file. The dataset stays in the store until it is
+    evicted.
+    """
+    with _lock:
+        _release(session_id)
+
+
+def _evict(max_bytes, idle_seconds):
+    now = time.monotonic()
+    for entry in _entries.values():
+        for session_id, last_access in list(entry['sessions'].items()):
+            # Sessions are not notified of when a browser tab closes, idle references are treated as released
+            if now - last_access > idle_seconds:
+                del entry['sessions'][session_id]
+    total = sum(entry['nbytes'] for entry in _entries.values())
+    idle = sorted((entry['last_used'], key) for key, entry in _entries.items() if not entry['sessions'])
+    for _, key in idle:
+        if total <= max_bytes:
+            break
+        total -= _entries.pop(key)['nbytes']
+        _stats['evictions'] += 1
+
+
+def evict(max_bytes=shared_store_max_bytes, idle_seconds=shared_store_idle_seconds):
+    """
+    Evict unreferenced datasets, least recently used first, until the store fits in max_bytes. Datasets still
+    referenced by a session are kept even above the ceiling.
+    Args:
+        max_bytes: memory ceiling of the store
+        idle_seconds: references not used for this long are released first
+    """
+    with _lock:
+        _evict(max_bytes, idle_seconds)
+
+
+def store_stats():
+    """
+    Returns:
+        dict with the datasets held, their size in bytes, the sessions referencing them and the hits, loads and
+        evictions counted by this process
+    """
+    with _lock:
+        return {'datasets': len(_entries),
+                'nbytes': sum(entry['nbytes'] for entry in _entries.values()),
+                'sessions': len({session_id for entry in _entries.values() for session_id in entry['sessions']}),
+                **_stats}
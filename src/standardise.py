@@ -0,0 +1,302 @@
+import re
+import traceback as tb
+
+import numpy as np
+import pandas as pd
+
+from src.cube import build_cube
+from src.dates import parse_date_column
+from src.instrument import stage
+from src.normalise import normalise_categorical, \
+    lookup_resolver, \
+    gender_lookup, \
+    relation_lookup, \
+    claim_status_lookup, \
+    ailment_group_lookup
+from src.settings import std_date_cols, \
+    dtype_plan, \
+    category_max_unique_ratio, \
+    compulsory_cols_to_be_mapped, \
+    row_key_columns
+from src.store import arrow_ready, cube_path, dataset_path, write_dataset
+
+"""Standardisation, free of any UI so it can run in worker processes and the command line"""
+
+ROW_KEY_COL = 'RowKey'
+ROW_HASH_COL = 'RowHash'
+
+# Claims missing any of these are dropped by standardisation
+necessary_columns = ['AilmentICDCode', 'ClaimStatus', 'SumInsured']
+
+numeric_columns = ['SumInsured',
+                   'BalanceSumInsured',
+                   'ClaimedAmount',
+                   'IncurredAmount',
+                   'PercentOfSumInsuredClaimed']
+
+
+def std_dates(df):
+    """
+    Parse the date columns in bulk, see src.dates.parse_date_column
+    Args:
+        df:
+
+    Returns:
+        df with the date columns converted. The number of cells that could not be parsed per column is recorded in
+        df.attrs['unparsed_dates'], which the upload page and the pipeline report
+    """
+    unparsed_dates = {}
+    for col in std_date_cols:
+        df[col], unparsed_dates[col] = parse_date_column(df[col])
+    df.attrs['unparsed_dates'] = unparsed_dates
+    return df
+
+
+def allot_ailment_group(val):
+    """
+
+    Args:
+        val:
+
+    Returns:
+
+    """
+    if not val or not isinstance(val, str):
+        return 'NA'
+    res = re.search(r'[A-Z]', val)
+    if not res:
+        return 'NA'
+    res = res.group()
+    return res
+
+
+def _whole(values):
+    values = values.dropna()
+    return bool((values == np.floor(values)).all())
+
+
+def text_values(series):
+    """
+    Text of a column read as numbers, e.g. employee or location codes, with whole numbers written without a decimal
+    point so that 14636417 reads the same whether its column came as int, float or mixed cells
+    Args:
+        series:
+
+    Returns:
+        object Series of strings, None where missing
+    """
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series.astype(object).where(series.notna(), None)
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    whole = np.isfinite(values) & (values == np.floor(values))
+    text = series.astype(str).to_numpy(dtype=object)
+    text[whole] = values[whole].astype(np.int64).astype(str)
+    return pd.Series(text, index=series.index, name=series.name).where(series.notna(), None)
+
+
+def _planned_column(series, kind):
+    if kind == 'category':
+        # Codes stay text, as they are when a column mixes numbers and letters
+        if pd.api.types.is_numeric_dtype(series):
+            series = text_values(series)
+        if isinstance(series.dtype, pd.CategoricalDtype) or \
+                series.nunique(dropna=True) > category_max_unique_ratio * len(series):
+            return series
+        return series.astype('category')
+    if series.dtype == kind or series.dtype == np.int32 and kind == 'amount':
+        return series
+    values = pd.to_numeric(series, errors='coerce')
+    if kind == 'amount':
+        if not pd.api.types.is_integer_dtype(values) and (values.isna().any() or not _whole(values)):
+            return values.astype('float64')
+        in_int32 = values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max
+        return values.astype(np.int32 if in_int32 else np.int64)
+    if pd.api.types.is_extension_array_dtype(kind) and pd.api.types.is_integer_dtype(kind):
+        info = np.iinfo(kind.lower())
+        if not _whole(values) or values.min() < info.min or values.max() > info.max:
+            return values
+    return values.astype(kind)
+
+
+def apply_dtype_plan(df):
+    """
+    Cast the standardised columns to the compact dtypes of src.settings.dtype_plan. Columns already in their planned
+    dtype are left alone, so it is cheap to apply again after reading a dataset.
+    Args:
+        df: standardised claims data
+
+    Returns:
+        df, converted in place
+    """
+    # Text columns mixing numbers and strings are turned into strings first, categories must have a single type
+    arrow_ready(df)
+    for col, kind in dtype_plan.items():
+        if col in df.columns:
+            df[col] = _planned_column(df[col], kind)
+    return df
+
+
+def canonical_values(series, col):
+    """
+    Values of a mapped column as text that does not depend on how the workbook typed its cells, so that the same claim
+    hashes alike whether e.g. its dates were date or text cells or its amounts int or float
+    Args:
+        series: mapped column, before standardisation
+        col: standard name of the column
+
+    Returns:
+        object Series of dates as ISO timestamps, numbers as float64 text and any other value as stripped text, with
+        blanks as None
+    """
+    text = series.astype(str).str.strip().where(series.notna())
+    text = text.where(text != '', None)
+    if col in std_date_cols:
+        parsed, _ = parse_date_column(series)
+        return text.where(parsed.isna(), parsed.dt.strftime('%Y-%m-%dT%H:%M:%S')).astype(object)
+    numbers = pd.Series(pd.to_numeric(series if pd.api.types.is_numeric_dtype(series) else text, errors='coerce')
+                        .to_numpy(dtype=np.float64, na_value=np.nan), index=series.index)
+    return text.where(numbers.isna(), numbers.astype(str)).astype(object)
+
+
+def _column_hashes(series, col):
+    """uint64 hash of the canonical value of every cell, each distinct value is canonicalised and hashed once"""
+    codes, uniques = pd.factorize(series)
+    hashes = pd.util.hash_pandas_object(canonical_values(pd.Series(uniques), col), index=False).to_numpy()
+    # Missing cells, coded -1, take the hash of a missing value appended last
+    missing = pd.util.hash_pandas_object(pd.Series([None], dtype=object), index=False).to_numpy()
+    return np.concatenate([hashes, missing])[codes]
+
+
+def with_row_keys(df, seen=None):
+    """
+    Add a RowKey identifying each claim and a RowHash of its mapped values, both computed from the canonical values of
+    the mapped columns (see canonical_values) so that a later dump can be compared with the stored claims before
+    standardising it
+    Args:
+        df: mapped claims data, before standardisation
+        seen: optional Counter of the row_key_columns hashes of earlier chunks of the same sheet, updated in place, so
+            that claims sharing the key columns are numbered across chunks
+
+    Returns:
+        df with the uint64 RowKey and RowHash columns
+    """
+    mapped_cols = [col for col in compulsory_cols_to_be_mapped.values() if col in df.columns]
+    # Every column is hashed once, the keys and row hashes then combine the uint64 column hashes
+    hashes = pd.DataFrame({col: _column_hashes(df[col], col) for col in mapped_cols})
+    base = pd.util.hash_pandas_object(hashes[row_key_columns], index=False).to_numpy()
+    # Claims sharing every key column are told apart by their order in the dump
+    occurrence = pd.Series(base).groupby(base).cumcount().to_numpy()
+    if seen is not None:
+        occurrence += pd.Series(base).map(seen).fillna(0).to_numpy(dtype=np.int64)
+        seen.update(pd.Series(base).value_counts().to_dict())
+    df[ROW_KEY_COL] = pd.util.hash_pandas_object(pd.DataFrame({'key': base, 'occurrence': occurrence}),
+                                                 index=False).to_numpy()
+    df[ROW_HASH_COL] = pd.util.hash_pandas_object(hashes, index=False).to_numpy()
+    return df
+
+
+def apply_column_mapping(df, col_mapping):
+    """
+    Args:
+        df: raw claims data
+        col_mapping: file column -> standard column mapping
+
+    Returns:
+        df with the mapped columns renamed and every other column dropped
+    """
+    df = df.rename(columns=col_mapping)
+    return df.drop(columns=[col for col in df.columns if col not in col_mapping.values()])
+
+
+def write_standardised(df, path):
+    """
+    Write a standardised frame and its claims cube, each replaced atomically. The cube is written first, so a dataset
+    is not seen without the cube that goes with it.
+    Args:
+        df: standardised claims data
+        path: dataset file
+
+    Returns:
+        path
+    """
+    with stage('save_file', rows=len(df)):
+        write_dataset(build_cube(df), cube_path(path))
+        write_dataset(df, path)
+    return path
+
+
+def save_standardised(df, data_dir, file_name):
+    """
+    Write a standardised frame and its claims cube
+    Args:
+        df: standardised claims data
+        data_dir: directory to write to, created if missing
+        file_name: name of the source workbook
+
+    Returns:
+        path of the dataset file
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return write_standardised(df, dataset_path(data_dir, file_name))
+
+
+"""Data Standardisation Function"""
+
+
+def standardise_data(df, seen=None):
+    """
+
+    Args:
+        df:
+        seen: see with_row_keys, for sheets standardised in chunks
+
+    Returns:
+
+    """
+    try:
+        with stage('standardise_data', rows=len(df)):
+            if ROW_KEY_COL not in df.columns:
+                df = with_row_keys(df.copy(deep=False), seen)
+            # df[str_cols] = df[str_cols].astype(str)
+            # if df.columns != compulsory_cols_to_be_mapped.keys():
+            #     pprint(df.columns)
+            #     raise Exception("Some columns missing")
+            # Drop rows with necessary columns missing
+            # A new frame, the shallow copy only tells pandas so and avoids SettingWithCopyWarning below
+            df = df.dropna(subset=necessary_columns).copy(deep=False)
+
+            # for col in numeric_columns:
+            #     df[col] = df[col].str.replace(',', '').astype(float)
+
+            # Standardise date columns specified earlier
+            with stage('standardise.std_dates', rows=len(df)):
+                df = std_dates(df)
+
+            with stage('standardise.categoricals', rows=len(df)):
+                # Standardise Sex
+                df['Sex'] = normalise_categorical(df['Sex'], lookup_resolver(gender_lookup))
+
+                # Standardise Ailment Codes
+                df['AilmentICDCode'] = normalise_categorical(df['AilmentICDCode'], allot_ailment_group)
+
+                # Add Ailment Group Description
+                df['AilmentGroupDescription'] = normalise_categorical(df['AilmentICDCode'],
+                                                                      lambda val: ailment_group_lookup.get(val, 'NA'))
+
+                # Standardise claim status as per mapping (raw status -> standard status -> readable label)
+                df['ClaimStatus'] = normalise_categorical(df['ClaimStatus'], lookup_resolver(claim_status_lookup))
+
+                # Standardise relation
+                df['Relation'] = normalise_categorical(df['Relation'], lookup_resolver(relation_lookup))
+
+            # Add additional info
+            with stage('standardise.derived_columns', rows=len(df)):
+                df['PercentOfSumInsuredClaimed'] = ((df['ClaimedAmount'] / df['SumInsured']) * 100).round(2)
+                df['NoOfHospitalisedDays'] = (df['DateOfDischarge'] - df['DateOfAdmission']).dt.days
+
+            with stage('standardise.dtypes', rows=len(df)):
+                df = apply_dtype_plan(df)
+
+        return df
+    except Exception:
+        print(tb.format_exc())
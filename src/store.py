@@ -0,0 +1,189 @@
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+"""Columnar Dataset Store"""
+
+DATASET_SUFFIX = '.arrow'
+# Schema metadata key holding the DataFrame.attrs of a dataset
+ATTRS_KEY = b'claims_analysis.attrs'
+
+
+def arrow_ready(df):
+    """
+    Text columns read from Excel can mix strings with numbers (e.g. employee codes), which Arrow cannot store in one
+    column. Convert the non-string values of such columns to strings.
+    Args:
+        df:
+
+    Returns:
+        df, with mixed object columns converted in place
+    """
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty'):
+            df[col] = df[col].astype(str).where(df[col].notna())
+    return df
+
+
+def temp_path(path):
+    """
+    Args:
+        path: file to be written
+
+    Returns:
+        unique hidden Path next to path, to write to before renaming it over path. Being in the same directory, the
+        rename is atomic.
+    """
+    path = Path(path)
+    return path.with_name(f'.{path.stem}.{uuid.uuid4().hex[:8]}.tmp{path.suffix}')
+
+
+@contextmanager
+def replacing(path):
+    """
+    Write a file atomically: the block writes to the temporary path yielded, which then replaces path in one rename.
+    Readers see either the old or the new file, never a partly written one. path is left as it is if the block
+    writes nothing, and the temporary file is removed if the block fails.
+    """
+    temp = temp_path(path)
+    try:
+        yield temp
+        if temp.is_file():
+            os.replace(temp, path)
+    finally:
+        if temp.is_file():
+            os.remove(temp)
+
+
+@contextmanager
+def file_lock(path, poll_seconds=0.05):
+    """
+    Exclusive lock shared by every process on the machine, held on a <path>.lock file. Not re-entrant.
+    Args:
+        path: file or directory to lock
+        poll_seconds: wait between attempts on Windows, where locks cannot be waited for
+    """
+    lock_path = Path(f'{path}.lock')
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a+b') as fp:
+        if fcntl is not None:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    fp.seek(0)
+                    msvcrt.locking(fp.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(poll_seconds)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fp, fcntl.LOCK_UN)
+            else:
+                fp.seek(0)
+                msvcrt.locking(fp.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_dataset(df, path):
+    """
+    Write a standardised frame as an uncompressed Arrow IPC (Feather v2) file. Uncompressed files can be memory-mapped
+    on read, and the pandas metadata keeps dtypes and categoricals intact. df.attrs are kept in the schema metadata.
+    The file is replaced atomically, see replacing.
+    Args:
+        df: standardised claims data
+        path: destination file
+
+    Returns:
+        path
+    """
+    table = pa.Table.from_pandas(arrow_ready(df), preserve_index=False)
+    if df.attrs:
+        table = table.replace_schema_metadata({**table.schema.metadata,
+                                               ATTRS_KEY: json.dumps(df.attrs, default=str).encode()})
+    with replacing(path) as temp:
+        feather.write_feather(table, temp, compression='uncompressed')
+    return path
+
+
+def read_dataset(path, columns=None):
+    """
+    Memory-map a dataset written by write_dataset and convert it back to pandas
+    Args:
+        path: dataset file
+        columns: optional list of columns to load, all columns by default
+
+    Returns:
+        DataFrame
+    """
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    df.attrs = json.loads((table.schema.metadata or {}).get(ATTRS_KEY, b'{}'))
+    # Datasets streamed in chunks carry every possible category, drop the ones that never occur
+    for col in df.select_dtypes('category').columns:
+        df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+
+def open_dataset_writer(path, schema):
+    """
+    Args:
+        path: destination file
+        schema: pyarrow schema shared by every chunk
+
+    Returns:
+        Arrow IPC file writer, chunks are appended with write_table and the file is finalised with close
+    """
+    return pa.ipc.new_file(str(path), schema)
+
+
+def dataset_columns(path):
+    """
+    Args:
+        path: dataset file
+
+    Returns:
+        list of column names, read from the file schema only
+    """
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def dataset_path(data_dir, file_name):
+    """
+    Args:
+        data_dir: directory holding the standardised datasets
+        file_name: stem of the uploaded file
+
+    Returns:
+        Path of the standardised dataset
+    """
+    return Path(data_dir) / f"{file_name}_Standardised{DATASET_SUFFIX}"
+
+
+def cube_path(path):
+    """
+    Args:
+        path: dataset file
+
+    Returns:
+        Path of the aggregate cube stored next to the dataset
+    """
+    path = Path(path)
+    return path.with_name(f'{path.stem}.cube{DATASET_SUFFIX}')
+
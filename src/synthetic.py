@@ -0,0 +1,220 @@
+import argparse
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.settings import mapping, compulsory_cols_to_be_mapped
+
+"""Synthetic Claims MIS Generator"""
+
+# Header spellings seen in insurer dumps besides the display name written in different styles
+header_aliases = {
+    'Ailment ICD Code': ['Ailment_code', 'ICD Code', 'ICD_CD'],
+    'Insurer': ['Insurance_Company', 'Insurance Company Name'],
+    'Sex': ['BenefSex', 'Gender', 'Patient Gender'],
+    'Relation': ['Relationship', 'Relation To Employee'],
+    'Claim Status': ['ClaimStatus', 'Status of Claim'],
+    'Location': ['City_Name', 'City', 'Hospital City'],
+    'Hospital': ['Hospital_Name', 'Name of Hospital'],
+    'Date of Admission': ['DOA', 'Admission Date'],
+    'Date of Discharge': ['DOD', 'Discharge Date'],
+}
+# Formats a dump may write its dates in, one per column per dump
+date_formats = ['%d-%b-%Y', '%d-%B-%Y', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d', '%d.%m.%Y', '%Y-%m-%d %H:%M:%S']
+# Formats mixed into a column at a low rate, left for the dateparser fallback
+odd_date_formats = ['%d %B %Y', '%B %d, %Y', '%d-%m-%y']
+sums_insured = [100000, 200000, 300000, 500000, 1000000]
+cities = ['Mumbai', 'Pune', 'Delhi', 'Bengaluru', 'Chennai', 'Hyderabad', 'Kolkata', 'Ahmedabad', 'Jaipur', 'Lucknow',
+          'Nagpur', 'Nashik', 'Surat', 'Indore', 'Bhopal', 'Patna', 'Kochi', 'Coimbatore', 'Vadodara', 'Ludhiana',
+          'Chandigarh', 'Mysuru', 'Visakhapatnam', 'Thane', 'Noida', 'Gurugram', 'Khed Shivapur', 'Aurangabad',
+          'Kolhapur', 'Madurai']
+hospital_prefixes = ['Sangam', 'Shreeyash', 'Apollo', 'Sahyadri', 'Ruby', 'Jupiter', 'Lotus', 'City', 'Lifeline',
+                     'Sunrise', 'Noble', 'Global', 'Care', 'Metro', 'Unity']
+hospital_suffixes = ['Hospital', 'Multispeciality Hospital', 'Nursing Home', 'Medical Centre', 'Clinic']
+
+
+def _zipf_choice(rng, options, size, skew=1.1):
+    """Draw options with a long tail, the first options being the most frequent"""
+    weights = 1 / np.arange(1, len(options) + 1) ** skew
+    return np.asarray(options, dtype=object)[rng.choice(len(options), size=size, p=weights / weights.sum())]
+
+
+def _messy_case(rng, values):
+    """Randomly upper-case, title-case or pad string values the way hand-kept MIS sheets do"""
+    values = pd.Series(values, dtype=object)
+    style = rng.integers(0, 4, size=len(values))
+    values = values.where(style != 1, values.str.upper())
+    values = values.where(style != 2, values.str.title())
+    return values.where(style != 3, values + ' ').to_numpy()
+
+
+def header_variants(rng):
+    """
+    Returns:
+        dict of required display name -> header, in one naming style with some insurer-specific aliases mixed in
+    """
+    style = str(rng.choice(['display', 'snake', 'upper', 'compact']))
+    headers = {}
+    for required in compulsory_cols_to_be_mapped:
+        if required in header_aliases and rng.random() < 0.4:
+            headers[required] = str(rng.choice(header_aliases[required]))
+        elif style == 'snake':
+            headers[required] = required.replace(' ', '_')
+        elif style == 'upper':
+            headers[required] = required.upper()
+        elif style == 'compact':
+            headers[required] = required.title().replace(' ', '')
+        else:
+            headers[required] = required
+    return headers
+
+
+def _format_dates(rng, dates, missing_rate=0.002, odd_rate=0.01):
+    fmt = str(rng.choice(date_formats))
+    values = pd.Series(dates).dt.strftime(fmt).to_numpy(dtype=object)
+    odd = rng.random(len(values)) < odd_rate
+    if odd.any():
+        values[odd] = pd.Series(dates[odd]).dt.strftime(str(rng.choice(odd_date_formats))).to_numpy(dtype=object)
+    values[rng.random(len(values)) < missing_rate] = None
+    return values
+
+
+def generate_claims(num_rows, seed=0):
+    """
+    Generate a claims MIS dump with the quirks of real ones: insurer-specific headers, per column date formats with a
+    few odd dates, status, relation and gender spellings in mixed case, ICD codes with sub codes, missing values and
+    unmapped extra columns. Categorical values are drawn from data/mapping.json.
+    Args:
+        num_rows:
+        seed: the same seed produces the same dump
+
+    Returns:
+        (DataFrame with the raw headers and dates as strings, the true file column -> standard column mapping)
+    """
+    rng = np.random.default_rng(seed)
+    headers = header_variants(rng)
+
+    relation = _zipf_choice(rng, list(mapping['relation']), num_rows, skew=0.6)
+    relation_std = pd.Series(relation).map(mapping['relation']).to_numpy()
+    age = np.select([relation_std == 'Children', relation_std == 'Parent'],
+                    [rng.integers(0, 26, num_rows), rng.integers(45, 86, num_rows)],
+                    rng.integers(21, 61, num_rows))
+    sex = rng.choice(list(mapping['gender']), size=num_rows)
+
+    icd_group = _zipf_choice(rng, list(mapping['ailment_group']), num_rows, skew=0.4)
+    icd_code = pd.Series(icd_group).str.cat(
+        [pd.Series(rng.integers(0, 100, num_rows)).astype(str).str.zfill(2),
+         np.where(rng.random(num_rows) < 0.5, '.' + pd.Series(rng.integers(0, 10, num_rows)).astype(str), '')]
+    ).to_numpy(dtype=object)
+    icd_code[rng.random(num_rows) < 0.003] = None
+
+    sum_insured = rng.choice(sums_insured, size=num_rows)
+    claimed = np.minimum(np.round(rng.lognormal(10.5, 0.9, num_rows)), sum_insured * 1.2)
+    incurred = np.round(claimed * rng.uniform(0.6, 1.0, num_rows))
+    incurred[rng.random(num_rows) < 0.1] = 0
+    balance = np.maximum(sum_insured - incurred, 0)
+
+    policy_start = pd.Timestamp('2022-04-01') + pd.to_timedelta(rng.integers(0, 365, num_rows), unit='D')
+    admission = policy_start + pd.to_timedelta(rng.integers(0, 365, num_rows), unit='D')
+    discharge = admission + pd.to_timedelta(rng.geometric(0.3, num_rows) - 1, unit='D')
+
+    city = _zipf_choice(rng, cities, num_rows)
+    hospital_names = [f'{prefix} {suffix}' for prefix in hospital_prefixes for suffix in hospital_suffixes]
+    hospital = _zipf_choice(rng, hospital_names, num_rows, skew=0.9)
+
+    claim_status = _zipf_choice(rng, list(mapping['claim_status']), num_rows, skew=0.8)
+    claim_status[rng.random(num_rows) < 0.001] = None
+
+    columns = {
+        'Ailment ICD Code': icd_code,
+        'Insurer': _zipf_choice(rng, ['SBI General Insurance Co. Ltd.', 'ICICI Lombard', 'Star Health',
+                                      'New India Assurance'], num_rows),
+        'Policy Start Date': _format_dates(rng, policy_start, missing_rate=0, odd_rate=0),
+        'Policy End Date': _format_dates(rng, policy_start + pd.DateOffset(years=1, days=-1),
+                                         missing_rate=0, odd_rate=0),
+        'Employee Code': np.char.add('IN', rng.integers(100, 99999, num_rows).astype(str)),
+        'Age': age,
+        'Sex': _messy_case(rng, sex),
+        'Relation': _messy_case(rng, relation),
+        'Sum Insured': sum_insured,
+        'Balance Sum Insured': balance,
+        'Claim Type': _messy_case(rng, _zipf_choice(rng, list(mapping['claim_type']), num_rows, skew=1.5)),
+        'Claim Status': _messy_case(rng, claim_status),
+        'Date of Admission': _format_dates(rng, admission),
+        'Date of Discharge': _format_dates(rng, discharge),
+        'Location': city,
+        'Claimed Amount': claimed,
+        'Incurred Amount': incurred,
+        'Hospital': hospital,
+    }
+    df = pd.DataFrame({headers[required]: values for required, values in columns.items()})
+    df['Policy_NO'] = '4101220600000073-00'
+    df['Claim_No'] = np.arange(29000000, 29000000 + num_rows)
+    df['Employee_Name'] = 'Employee ' + df['Claim_No'].astype(str)
+    df['Claiments_Name'] = df['Employee_Name']
+    df['Illness'] = 'Illness ' + pd.Series(icd_group).astype(str)
+    df['PaymentMode'] = rng.choice(['EFT', 'CHQ/DD'], size=num_rows)
+    col_mapping = {headers[required]: compulsory_cols_to_be_mapped[required] for required in columns}
+    # Columns in a random order, like no two insurers agree on one
+    return df[rng.permutation(df.columns)], col_mapping
+
+
+def write_workbook(df, path):
+    """
+    Write a dump as an xlsx workbook with openpyxl's write-only mode, which keeps memory flat for a million rows
+    Args:
+        df: raw dump
+        path:
+
+    Returns:
+        path
+    """
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(list(df.columns))
+    # object columns hold Python ints and floats, which openpyxl writes without a type lookup per cell
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def column_mapping_path(path):
+    """
+    Returns:
+        path of the JSON file holding the true column mapping of a synthetic workbook, usable with src.pipeline
+    """
+    return Path(path).with_suffix('.mapping.json')
+
+
+def synthetic_workbook(num_rows, directory, seed=0):
+    """
+    Returns:
+        path of the synthetic dump of num_rows rows in directory, generated once per (num_rows, seed) together with
+        its column mapping file
+    """
+    path = Path(directory) / f'synthetic_claims_{num_rows}_seed{seed}.xlsx'
+    if not path.is_file():
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        df, col_mapping = generate_claims(num_rows, seed)
+        with open(column_mapping_path(path), 'w') as fp:
+            json.dump(col_mapping, fp, indent=2)
+        temp_path = path.with_suffix('.tmp')
+        write_workbook(df, temp_path)
+        temp_path.replace(path)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write synthetic claims MIS workbooks")
+    parser.add_argument('rows', nargs='+', type=int, help="rows per workbook, e.g. 10000 100000 1000000")
+    parser.add_argument('--output-dir', default='.', help="directory to write the workbooks to")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for rows in args.rows:
+        started = datetime.now()
+        print(synthetic_workbook(rows, args.output_dir, args.seed), datetime.now() - started)
@@ -1,64 +1,45 @@
-import os
+import uuid
+from collections import deque
 from pathlib import Path
-from pprint import pprint
-
-import appdirs
-import numpy as np
-from dateparser import parse
 
+from src.aliases import suggest_mapping
+from src.analytics import run_analysis
+from src.cache import upload_key
+from src.cube import load_or_build_cube
+from src.datasets import dataset_file, new_dataset_id, publish
+from src.distributions import cached_distribution
+from src.instrument import bind_records, configure_stage_log, stage
+from src.query import filter_mask, sort_order, table_page
 from src.questions import women_who_delivered_in_age_band
-from src.settings import mapping, std_date_cols, compulsory_cols_to_be_mapped
+from src.shared import acquire
+from src.standardise import apply_column_mapping, \
+    apply_dtype_plan, \
+    write_standardised
+from src.store import read_dataset
+from src.settings import compulsory_cols_to_be_mapped, \
+    diagnostics_max_records, \
+    table_page_rows, \
+    upload_preview_rows
 import streamlit as st
 import traceback as tb
 import pandas as pd
-import plotly.express as px
-import plotly.figure_factory as ff
-
-from scipy.stats import norm
-import re
-import plotly.graph_objects as go
-
-from thefuzz import process
 
 """General Utility Functions"""
 
-numeric_columns = ['SumInsured',
-                   'BalanceSumInsured',
-                   'ClaimedAmount',
-                   'IncurredAmount',
-                   'PercentOfSumInsuredClaimed']
-
-
-def std_dates(df):
+def open_workbook(uploaded_file):
     """
+    Keep one workbook handle per uploaded file across reruns. pd.ExcelFile opens the workbook read-only, so listing
+    the sheets does not load any cell data.
     Args:
-        df:
+        uploaded_file:
 
     Returns:
-
+        pd.ExcelFile
     """
-    for col in std_date_cols:
-        df[col] = df[col].apply(lambda val: parse(val,
-                                                  date_formats=['%m/%d%Y', '%d-%b-%Y', '%d-%B-%Y']))
-    return df
-
-
-def allot_ailment_group(val):
-    """
-
-    Args:
-        val:
-
-    Returns:
-
-    """
-    if not val:
-        return 'NA'
-    res = re.search(r'[A-Z]', val)
-    if not res:
-        return 'NA'
-    res = res.group()
-    return res
+    if st.session_state.get('workbook_file_id') != uploaded_file.id:
+        st.session_state['workbook'] = pd.ExcelFile(uploaded_file)
+        st.session_state['workbook_file_id'] = uploaded_file.id
+    return st.session_state['workbook']
 
 
 def upload_file_form():
@@ -66,9 +47,10 @@ def upload_file_form():
         file_uploaded, select_sheet = False, False
         with st.form("Upload Data"):
             uploaded_file = st.file_uploader('Upload the claims dump file')
+            streaming = st.checkbox('Large file: standardise in chunks to keep memory usage flat')
             file_uploaded = st.form_submit_button("Upload")
             if uploaded_file is not None:
-                sheet_names = pd.ExcelFile(uploaded_file).sheet_names
+                sheet_names = open_workbook(uploaded_file).sheet_names
         if uploaded_file is not None:
             sheet = st.selectbox('Sheet name in the Excel file',
                                  options=sheet_names)
@@ -79,56 +61,76 @@ def upload_file_form():
                     st.success('File Uploaded Successfully!')
                     if sheet:
                         file_name = Path(f'{uploaded_file.name}').stem
-                        df = pd.read_excel(uploaded_file,
-                                           header=0,
-                                           sheet_name=sheet)
+                        # Background jobs read the workbook from these bytes, not from the handle this script uses
+                        st.session_state['upload_bytes'] = uploaded_file.getvalue()
+                        st.session_state['upload_key'] = upload_key(st.session_state['upload_bytes'], sheet)
+                        st.session_state['streaming'] = streaming
+                        st.session_state['sheet_name'] = sheet
+                        # Only a preview is parsed here, the headers are all the mapping form needs. The mapped
+                        # columns are read from the same workbook handle once the mapping is known.
+                        with stage('excel_read_preview') as record:
+                            df = open_workbook(uploaded_file).parse(sheet,
+                                                                    header=0,
+                                                                    nrows=upload_preview_rows)
+                            record['rows'] = len(df)
                         return df, file_name
     except Exception as e:
         tb.format_exc()
     return None, None
 
 def automated_mapping(df):
-    mappings = {}
-    compulsory_cols = compulsory_cols_to_be_mapped.keys()
-    for col_name in compulsory_cols:
-        matches = process.extract(col_name, df.columns, limit=5)
-        closest_match = matches[0][0]
-        if (closest_match in mappings.values()):
-            closest_match = matches[1][0]
-        mappings[col_name] = closest_match
-    return mappings
+    """
+    Suggest a file column for every required column, see src.aliases.suggest_mapping
+    Args:
+        df: uploaded data, only the headers are used
+
+    Returns:
+        dict of required column -> file column
+    """
+    with stage('automated_mapping'):
+        return suggest_mapping(df.columns)
+
 
 def submit_mapping(df):
-    col_mapping = automated_mapping(df)
+    """
+    Show the mapping form, pre-filled with the suggested mapping
+    Args:
+        df: uploaded data, only the headers are used
+
+    Returns:
+        file column -> standard column mapping once the form is submitted, otherwise an empty dict
+    """
+    # The suggestion only depends on the upload, so it is worked out once and not on every rerun
+    if st.session_state.get('suggested_mapping_key') != st.session_state.get('upload_key') \
+            or 'suggested_mapping' not in st.session_state:
+        st.session_state['suggested_mapping'] = automated_mapping(df)
+        st.session_state['suggested_mapping_key'] = st.session_state.get('upload_key')
+    col_mapping = st.session_state['suggested_mapping']
 
     print("Automated mapping", col_mapping)
     sorted_cols = sorted(df.columns.to_list())
-    st.session_state.column_mapping = {}
-    print("Session state before form", st.session_state.column_mapping)
-
-    # temp_columns = {col_name: col_name for col_name in compulsory_cols_to_be_mapped.keys()}
 
     temp_columns = {}
 
-    # print("Temp columns before form", temp_columns)
-
     with st.form("Submit Mapping", clear_on_submit=False):
         st.subheader('Mandatory Columns')
 
         # Create a list of columns to be mapped
         # Use key of columns as variable names to store the selected column name
 
-        for col_query, col_name in col_mapping.items():
-            print("Col query : Col Name", col_query, ":", col_name)
+        for col_query, std_col_name in compulsory_cols_to_be_mapped.items():
             default_index = sorted_cols.index(col_mapping.get(col_query, sorted_cols[0]))
             col_name_from_file = st.selectbox(label=f'{col_query}: ',
                                               options=(*sorted_cols,),
                                               index=default_index,)
-            temp_columns[col_name_from_file] = col_query
-    
-        submitted = st.form_submit_button("Submit", on_click=submit_mapping_set_state(temp_columns))
+            temp_columns[col_name_from_file] = std_col_name
+
+        submitted = st.form_submit_button("Submit")
+
+    if submitted:
+        return temp_columns
+    return {}
 
-    return temp_columns
 
 def update_col_mapping(col_query):
     print("on_change called")
@@ -138,31 +140,84 @@ def update_col_mapping(col_query):
 
 def rename_cols_using_map(df, col_mapping):
     if st.session_state["column_mapping"] is not None:
-        col_mapping = st.session_state["column_mapping"]
-        df.rename(columns=col_mapping,
-                  inplace=True)
-        cols_to_drop = [col for col in df.columns if col not in col_mapping.values()]
-        df.drop(cols_to_drop, axis=1, inplace=True)
-        return df
+        return apply_column_mapping(df, st.session_state["column_mapping"])
     else:
         raise Exception("Error in column name mapping.")
 
 
 def save_file(df, file_name):
-    save_standardised_data = False
+    """
+    Publish a standardised frame as a new dataset of the shared store and point the session at it
+    Args:
+        df: standardised claims data
+        file_name: name of the source workbook
+
+    Returns:
+        dataset ref, or False if it could not be written
+    """
     try:
-        data_dir = Path(appdirs.user_data_dir())
-        save_standardised_data = data_dir / f"{file_name}_Standardised.xlsx"
-        if save_standardised_data.is_file():
-            os.remove(save_standardised_data)
-        df.to_excel(save_standardised_data, index=False)
-        st.session_state['file_location'] = save_standardised_data
-        return save_standardised_data
+        ref = publish(new_dataset_id(file_name), lambda path, previous: write_standardised(df, path))
+        st.session_state['dataset_ref'] = ref
+        return ref
     except Exception as e:
         print(tb.format_exc())
     return False
 
 
+def load_analysis(ref):
+    """
+    Read and analyse a standardised dataset once per version. The results are held once in the process-wide
+    dataset store and shared by every session looking at the same version, read-only.
+    Args:
+        ref: src.datasets ref of the dataset version
+
+    Returns:
+        read-only mapping of the results of src.analytics.run_analysis. The script run stops with a warning if the
+        version has been pruned from the store.
+    """
+    def analyse():
+        file_location = dataset_file(ref)
+        with st.spinner("Analysing claims data..."), stage('analysis.load') as record:
+            # Streamed datasets are stored with plain text and float columns
+            claims_df = apply_dtype_plan(read_dataset(file_location))
+            record['rows'] = len(claims_df)
+            return run_analysis(claims_df, load_or_build_cube(file_location, claims_df))
+
+    try:
+        return acquire(ref, st.session_state['session_id'], analyse)
+    except FileNotFoundError:
+        print(tb.format_exc())
+        st.warning("This version of the data is no longer stored, later appends have replaced it. Upload the data "
+                   "again to analyse it.")
+        st.stop()
+
+
+def start_diagnostics():
+    """
+    Collect the stage records of this session for the diagnostics panel and log them, called at the top of every page
+    """
+    configure_stage_log()
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = uuid.uuid4().hex[:12]
+    if 'stage_records' not in st.session_state:
+        st.session_state['stage_records'] = deque(maxlen=diagnostics_max_records)
+    bind_records(st.session_state['stage_records'], st.session_state['session_id'])
+
+
+def show_diagnostics():
+    """
+    Optional sidebar panel with the time, rows and memory of the stages run in this session, latest first. Called at
+    the end of every page so that the stages of the current run are included.
+    """
+    if not st.sidebar.checkbox('Show diagnostics', key='show_diagnostics'):
+        return
+    records = pd.DataFrame(list(st.session_state.get('stage_records', [])),
+                           columns=['stage', 'seconds', 'rows', 'rss_growth_mb', 'rss_mb', 'started_at'])
+    st.sidebar.write('##### Diagnostics')
+    st.sidebar.dataframe(records.iloc[::-1], hide_index=True)
+    st.sidebar.caption('Dotted stages are part of the stage they run in. Memory is that of the whole server process.')
+
+
 def set_stage(i):
     st.session_state.stage = i
 
@@ -176,6 +231,10 @@ def submit_mapping_set_state(temp_columns):
     set_stage(2)
     st.session_state['mapping_submitted'] = True
     st.session_state['column_mapping'] = temp_columns
+    # The standardised data is on disk now, drop the handle on the raw upload
+    st.session_state['workbook'] = None
+    st.session_state['workbook_file_id'] = None
+    st.session_state['upload_bytes'] = None
     print("Column Mapping set in session state", st.session_state['column_mapping'])
 
 
@@ -192,98 +251,120 @@ def formatINR(number):
     return '₹' + value
 
 
-"""Data Standardisation Function"""
+"""Visualisation / Analysis Functions"""
 
 
-def standardise_data(df):
+def show_basic_stats(specific_claims, data_df, stats=None):
     """
-
+    Given a set of claims, evaluate and show the count and value against the entirety of the claims data
     Args:
-        df:
+        specific_claims:
+        data_df:
+        stats: row of src.segments.segment_stats for the segment, computed from the claims when not given
 
     Returns:
 
     """
-    try:
-        # df[str_cols] = df[str_cols].astype(str)
-        # if df.columns != compulsory_cols_to_be_mapped.keys():
-        #     pprint(df.columns)
-        #     raise Exception("Some columns missing")
-        # Drop rows with necessary columns missing
-        df = df.dropna(subset=['AilmentICDCode', 'ClaimStatus', 'SumInsured'])
-
-        # for col in numeric_columns:
-        #     df[col] = df[col].str.replace(',', '').astype(float)
-
-        # Standardise date columns specified earlier
-        df = std_dates(df)
-
-        # Standardise Sex
-        df['Sex'] = df['Sex'].apply(lambda val: mapping['gender'].get(val.lower().strip(),
-                                                                      'NA') if isinstance(val, str) else 'NA')
-
-        # Standardise Ailment Codes
-        df['AilmentICDCode'] = df['AilmentICDCode'].apply(allot_ailment_group)
-
-        # Add Ailment Group Description
-        df['AilmentGroupDescription'] = df['AilmentICDCode'].apply(lambda val: mapping['ailment_group'].get(val, 'NA'))
-
-        # Standardise claim status as per mapping
-        df['ClaimStatus'] = df['ClaimStatus'].apply(
-            lambda val: mapping['claim_status'].get(val.lower().strip(), 'NA') if isinstance(val, str) else 'NA')
-        df['ClaimStatus'] = df['ClaimStatus'].apply(
-            lambda val: mapping['readable_str_mapping']['claim_status'].get(val, 'NA') if isinstance(val,
-                                                                                                     str) else 'NA')
-
-        # Standardise relation
-        df['Relation'] = df['Relation'].apply(
-            lambda val: mapping['relation'].get(val.lower().strip(), 'NA') if isinstance(val, str) else 'NA')
-
-        # Add additional info
-        df['PercentOfSumInsuredClaimed'] = ((df['ClaimedAmount'] / df['SumInsured']) * 100).round(2)
-        df['NoOfHospitalisedDays'] = (df['DateOfDischarge'] - df['DateOfAdmission']).dt.days
-
-        return df
-    except Exception:
-        print(tb.format_exc())
-
-
-"""Visualisation / Analysis Functions"""
+    if stats is None:
+        # Calculate the number and value of claims from Parents
+        num_specific_claims = len(specific_claims)
+        total_value_specific_claims = specific_claims['IncurredAmount'].sum()
+        total_claims = len(data_df)
+        # Calculate the percentage of claims from Parents by count and value
+        stats = {'count': num_specific_claims,
+                 'value': total_value_specific_claims,
+                 'percentage_by_count': (num_specific_claims / total_claims) * 100,
+                 'percentage_by_value': (total_value_specific_claims / data_df['IncurredAmount'].sum()) * 100}
+
+    st.markdown(f'- Number of such claims: **{stats["count"]}**')
+    st.markdown(f"- Percentage of such claims by count: :blue[**{stats['percentage_by_count']:.2f}%**]")
+    st.markdown(f'- Total value of all such claims: '
+                f':green[**{formatINR(stats["value"])}**]')
+    st.markdown(f"- Percentage of such claims by value: :blue[**{stats['percentage_by_value']:.2f}%**]")
 
 
-def show_basic_stats(specific_claims, data_df):
+def show_table(df, name, fingerprint=None, sort_by=None, ascending=False):
     """
-    Given a set of claims, evaluate and show the count and value against the entirety of the claims data
+    Claim table sorted, filtered and paged on the server, only the rows of the visible page are sent to the browser.
+    Sort orders are cached per dataset and table, paging and filtering do not sort again.
     Args:
-        specific_claims:
-        data_df:
+        df: claims to show
+        name: unique name of the table on the page, keys its widgets
+        fingerprint: src.datasets ref of the dataset df comes from, sort orders are not cached without it
+        sort_by: column sorted by initially, the order of df by default
+        ascending:
 
     Returns:
 
     """
+    columns = df.columns.to_list()
+    col1, col2, col3, col4 = st.columns([2, 1, 2, 2])
+    with col1:
+        sort_options = ['', *columns]
+        sort_col = st.selectbox('Sort by', options=sort_options, key=f'{name}_sort_by',
+                                index=sort_options.index(sort_by) if sort_by in columns else 0)
+    with col2:
+        ascending = st.checkbox('Ascending', value=ascending, key=f'{name}_ascending')
+    with col3:
+        filter_col = st.selectbox('Filter column', options=['', *columns], key=f'{name}_filter_column')
+    with col4:
+        filter_text = st.text_input('Contains', key=f'{name}_filter_text')
+
+    order = sort_order(None if fingerprint is None else (fingerprint, name), df, sort_col or None, ascending)
+    mask = filter_mask(df, filter_col, 'contains', filter_text) if filter_col and filter_text else None
+    num_rows = len(order) if mask is None else int(mask.sum())
+    num_pages = max(1, -(-num_rows // table_page_rows))
+    page_key = f'{name}_page'
+    if st.session_state.get(page_key, 1) > num_pages:
+        st.session_state[page_key] = 1
+    page = st.number_input(f'Page (of {num_pages})', min_value=1, max_value=num_pages, step=1, key=page_key)
+    rows, num_rows = table_page(df, order, page, table_page_rows, mask)
+    st.dataframe(rows)
+    first_row = (page - 1) * table_page_rows
+    st.caption(f'Rows {min(first_row + 1, num_rows)} to {first_row + len(rows)} of {num_rows}')
+
+
+def show_distribution(values, title, fingerprint=None, name=None):
+    """
+    Plot the histogram of values with a fitted normal curve and a kernel density estimate, computed in bins so that
+    the number of points sent to the browser does not grow with the number of claims
+    Args:
+        values: Series, e.g. the IncurredAmount of a segment
+        title:
+        fingerprint: src.datasets ref of the dataset, the plotted series are not cached without it
+        name: name of the segment, the series are cached per (fingerprint, name, column)
 
-    # Calculate the number and value of claims from Parents
-    num_specific_claims = len(specific_claims)
-    total_value_specific_claims = specific_claims['IncurredAmount'].sum()
-    total_claims = len(data_df)
-    # Calculate the percentage of claims from Parents by count and value
-    percentage_by_count = (num_specific_claims / total_claims) * 100
-    percentage_by_value = (total_value_specific_claims / data_df['IncurredAmount'].sum()) * 100
-
-    st.markdown(f'- Number of such claims: **{(len(specific_claims))}**')
-    st.markdown(f"- Percentage of such claims by count: :blue[**{percentage_by_count:.2f}%**]")
-    total_value_of_specific_claims = specific_claims['IncurredAmount'].sum()
-    st.markdown(f'- Total value of all such claims: '
-                f':green[**{formatINR(total_value_of_specific_claims)}**]')
-    st.markdown(f"- Percentage of such claims by value: :blue[**{percentage_by_value:.2f}%**]")
-
+    Returns:
 
-def show_parental_claims(parental_claims, data_df):
+    """
+    series = cached_distribution(None if fingerprint is None else (fingerprint, name, values.name), values)
+    if not series['count']:
+        return
+    # plotly takes a while to import and is only needed once there is data to plot
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=series['bin_centres'], y=series['density'], width=series['bin_widths'],
+                         name=values.name, marker=dict(color='blue'),
+                         opacity=0.5))
+    fig.add_trace(go.Scatter(x=series['fit_x'], y=series['fit_y'], mode='lines', name='Normal Distribution',
+                             line=dict(color='red', width=2)))
+    fig.add_trace(go.Scatter(x=series['kde_x'], y=series['kde_y'], mode='lines', name='Kernel Density',
+                             line=dict(color='green', width=2, dash='dash')))
+    fig.update_layout(title_text=title,
+                      xaxis_title=values.name,
+                      yaxis_title="Density",
+                      bargap=0)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def show_parental_claims(parental_claims, data_df, stats=None, fingerprint=None):
     """
     Calculate and plot parental claims data
     Args:
         parental_claims:
         data_df:
+        stats: see show_basic_stats
+        fingerprint: see show_table
 
     Returns:
 
@@ -291,15 +372,14 @@ def show_parental_claims(parental_claims, data_df):
     total_claims = len(data_df)
     total_parental_claims = len(parental_claims)
     total_parental_claims_value = parental_claims['IncurredAmount'].sum()
-    show_basic_stats(parental_claims, data_df)
+    show_basic_stats(parental_claims, data_df, stats)
     st.write('#### Parental Claims Data')
-    st.dataframe(parental_claims.sort_values(by='IncurredAmount',
-                                             ascending=False))
+    show_table(parental_claims, 'parental_claims', fingerprint, sort_by='IncurredAmount')
     sub_col1, sub_col2 = st.columns(2)
     with sub_col1:
         st.write("##### Top 5 ailment categories, with avg. cost per ailment")
         # Group the parental claims by ailment category and calculate the average cost per ailment
-        ailment_avg_cost = parental_claims.groupby('AilmentGroupDescription')[
+        ailment_avg_cost = parental_claims.groupby('AilmentGroupDescription', observed=True)[
             'IncurredAmount'].mean().reset_index()
 
         # Sort the ailment_avg_cost DataFrame in descending order based on average cost
@@ -333,48 +413,9 @@ def show_parental_claims(parental_claims, data_df):
             st.markdown(f"- Average cost of an eye-related claim: "
                         f":green[**{formatINR(avg_eye_related_claims_amt)}**]")
 
-            # Extract IncurredAmount data
-            orthopedic_incurred_amount_data = eye_related_claims['IncurredAmount']
-
-            # Calculate mean and standard deviation of IncurredAmount
-            mean_incurred_amount = orthopedic_incurred_amount_data.mean()
-            std_incurred_amount = orthopedic_incurred_amount_data.std()
-
-            # Generate data points for the normal distribution curve
-            x_range = np.linspace(mean_incurred_amount - 3 * std_incurred_amount,
-                                  mean_incurred_amount + 3 * std_incurred_amount,
-                                  100)
-            y_values = norm.pdf(x_range,
-                                mean_incurred_amount,
-                                std_incurred_amount)
-
-            # Create the figure
-            fig = go.Figure()
-
-            # Add the smooth line plot of IncurredAmount to the figure
-            fig.add_trace(
-                go.Scatter(x=orthopedic_incurred_amount_data,
-                           y=norm.pdf(orthopedic_incurred_amount_data,
-                                      mean_incurred_amount,
-                                      std_incurred_amount),
-                           mode='markers',
-                           name='IncurredAmount',
-                           marker=dict(color='blue')))
-
-            # Add the normal distribution curve to the figure
-            fig.add_trace(
-                go.Scatter(x=x_range,
-                           y=y_values,
-                           mode='lines',
-                           name='Normal Distribution',
-                           line=dict(color='red', width=2)))
-
-            # Update the layout to add axis labels and title
-            fig.update_layout(
-                title_text="Normal Distribution of IncurredAmount in Eye Related Parental Claims",
-                xaxis_title="IncurredAmount",
-                yaxis_title="Density",
-            )
+            show_distribution(eye_related_claims['IncurredAmount'],
+                              "Distribution of IncurredAmount in Eye Related Parental Claims",
+                              fingerprint, 'parental_claims.eye')
 
         # Filter orthopedic claims based on the AilmentICDCode mapping
         orthopedic_claims = parental_claims[parental_claims["AilmentICDCode"] == "M"]
@@ -396,95 +437,30 @@ def show_parental_claims(parental_claims, data_df):
             st.markdown(f"- Average cost of an orthopedic claim: "
                         f":green[**{formatINR(avg_orthopedic_claims_amt)}**]")
 
-            # Extract IncurredAmount data
-            orthopedic_incurred_amount_data = orthopedic_claims['IncurredAmount']
-
-            # Calculate mean and standard deviation of IncurredAmount
-            mean_incurred_amount = orthopedic_incurred_amount_data.mean()
-            std_incurred_amount = orthopedic_incurred_amount_data.std()
-
-            # Generate data points for the normal distribution curve
-            x_range = np.linspace(mean_incurred_amount - 3 * std_incurred_amount,
-                                  mean_incurred_amount + 3 * std_incurred_amount,
-                                  100)
-            y_values = norm.pdf(x_range,
-                                mean_incurred_amount,
-                                std_incurred_amount)
-
-            # Create the figure
-            fig = go.Figure()
-
-            # Add the smooth line plot of IncurredAmount to the figure
-            fig.add_trace(
-                go.Scatter(x=orthopedic_incurred_amount_data,
-                           y=norm.pdf(orthopedic_incurred_amount_data,
-                                      mean_incurred_amount,
-                                      std_incurred_amount),
-                           mode='markers',
-                           name='IncurredAmount',
-                           marker=dict(color='blue')))
-
-            # Add the normal distribution curve to the figure
-            fig.add_trace(
-                go.Scatter(x=x_range,
-                           y=y_values,
-                           mode='lines',
-                           name='Normal Distribution',
-                           line=dict(color='red', width=2)))
-
-            # Update the layout to add axis labels and title
-            fig.update_layout(
-                title_text="Normal Distribution of IncurredAmount in Orthopaedic Parental Claims",
-                xaxis_title="IncurredAmount",
-                yaxis_title="Density",
-            )
-
-
-def show_maternity_claims(maternity_claims, data_df):
+            show_distribution(orthopedic_claims['IncurredAmount'],
+                              "Distribution of IncurredAmount in Orthopaedic Parental Claims",
+                              fingerprint, 'parental_claims.orthopedic')
+
+
+def show_maternity_claims(maternity_claims, data_df, stats=None, fingerprint=None):
     """
     Given the maternity claims data, show the visualisations and stats
     Args:
         maternity_claims:
         data_df:
+        stats: see show_basic_stats
+        fingerprint: see show_table
 
     Returns:
 
     """
-    show_basic_stats(maternity_claims, data_df)
+    show_basic_stats(maternity_claims, data_df, stats)
     perc_of_women_who_delivered = women_who_delivered_in_age_band(data_df)
     st.markdown(f'- Percentage of women (between 20-40) who delivered a child '
                 f'(includes employee + spouse)%: :blue[**{perc_of_women_who_delivered}%**]')
     st.markdown(f"- Average cost of a maternity claims: :green[**"
                 f"{formatINR(maternity_claims['IncurredAmount'].mean())}**]")
 
-    # Extract IncurredAmount data
-    incurred_amount_data = maternity_claims['IncurredAmount']
-
-    # Calculate mean and standard deviation of IncurredAmount
-    mean_incurred_amount = incurred_amount_data.mean()
-    std_incurred_amount = incurred_amount_data.std()
-
-    # Generate data points for the normal distribution curve
-    x_range = np.linspace(mean_incurred_amount - 3 * std_incurred_amount,
-                          mean_incurred_amount + 3 * std_incurred_amount, 100)
-    y_values = norm.pdf(x_range, mean_incurred_amount, std_incurred_amount)
-
-    # Create the figure
-    fig = go.Figure()
-
-    # Add the smooth line plot of IncurredAmount to the figure
-    fig.add_trace(
-        go.Scatter(x=incurred_amount_data, y=norm.pdf(incurred_amount_data, mean_incurred_amount, std_incurred_amount),
-                   mode='markers', name='IncurredAmount', marker=dict(color='blue')))
-
-    # Add the normal distribution curve to the figure
-    fig.add_trace(
-        go.Scatter(x=x_range, y=y_values, mode='lines', name='Normal Distribution', line=dict(color='red', width=2)))
-
-    # Update the layout to add axis labels and title
-    fig.update_layout(
-        title_text="Normal Distribution of IncurredAmount in Maternity Claims",
-        xaxis_title="IncurredAmount",
-        yaxis_title="Density",
-    )
-    st.plotly_chart(fig)
+    show_distribution(maternity_claims['IncurredAmount'],
+                      "Distribution of IncurredAmount in Maternity Claims",
+                      fingerprint, 'maternity_claims')
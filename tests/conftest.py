@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import src.aliases  # noqa: E402
+import src.cache  # noqa: E402
+import src.datasets  # noqa: E402
+import src.report  # noqa: E402
+from src.ingest import read_mapped_columns  # noqa: E402
+
+sample_workbook = Path(__file__).resolve().parents[1] / 'test_dataset' / 'GMC Policy Claims MIS Sample Data.xlsx'
+# Column mapping of the sample workbook, given explicitly so that no test depends on the mappings remembered on the
+# machine running it
+sample_column_mapping = {'Ailment_code': 'AilmentICDCode',
+                         'InsurerClaimNo': 'Insurer',
+                         'Policy_Start_Date': 'PolicyStartDate',
+                         'Policy_End_Date': 'PolicyEndDate',
+                         'Employee_Code': 'EmployeeCode',
+                         'Age': 'Age',
+                         'BenefSex': 'Sex',
+                         'Relation': 'Relation',
+                         'Sum_Insured': 'SumInsured',
+                         'Balance_Sum_Insured': 'BalanceSumInsured',
+                         'Claim_Type': 'ClaimType',
+                         'ClaimStatus': 'ClaimStatus',
+                         'Date_of_Admission': 'DateOfAdmission',
+                         'Date_of_Discharge': 'DateOfDischarge',
+                         'IntimationId': 'Location',
+                         'Claimed_Amount': 'ClaimedAmount',
+                         'Incurred_Amount': 'IncurredAmount',
+                         'Hospital_Name': 'Hospital'}
+
+
+@pytest.fixture(autouse=True)
+def user_dirs(tmp_path_factory, monkeypatch):
+    """Remembered header aliases, caches and the dataset store of every test live in a fresh directory"""
+    root = tmp_path_factory.mktemp('user_dirs')
+    monkeypatch.setattr(src.aliases, 'alias_index_path', root / 'header_aliases.json')
+    monkeypatch.setattr(src.cache, 'cache_dir', root / 'cache')
+    monkeypatch.setattr(src.report, 'report_dir', root / 'reports')
+    monkeypatch.setattr(src.datasets, 'store_dir', root / 'datasets')
+    return root
+
+
+@pytest.fixture(scope='session')
+def _sample_dump():
+    with pd.ExcelFile(sample_workbook) as workbook:
+        return read_mapped_columns(workbook, workbook.sheet_names[0], sample_column_mapping)
+
+
+@pytest.fixture
+def sample_dump(_sample_dump):
+    """Mapped claims of the sample workbook, as the upload page reads them"""
+    return _sample_dump.copy()
@@ -0,0 +1,24 @@
+from src import questions
+from src.analytics import run_analysis
+from src.settings import segment_definitions
+from src.standardise import standardise_data
+
+
+def test_analysis_agrees_with_the_questions(sample_dump):
+    claims_df = standardise_data(sample_dump)
+    expected = standardise_data(sample_dump.copy())
+    analysis = run_analysis(claims_df)
+
+    assert analysis['total_claims'] == len(expected)
+    assert set(segment_definitions) <= set(analysis)
+    for name, question in [('high_value_claims', questions.get_high_value_claims),
+                           ('injury_claims', questions.get_injury_claims),
+                           ('si_exhausted_claims', questions.get_si_exhausted_claims),
+                           ('infectious_disease_claims', questions.get_infectious_disease_claims)]:
+        assert sorted(analysis[name].index) == sorted(question(expected).index), name
+    for name, question in [('claim_type_dist', questions.get_claim_type_dist),
+                           ('claim_relation_dist', questions.get_relation_distribution),
+                           ('claim_status_dist', questions.get_claim_status_dist)]:
+        assert analysis[name].to_dict() == question(expected).to_dict(), name
+    # Hospitals tied on their count may come in either order
+    assert analysis['top_hospitals_by_count'].tolist() == questions.get_top_hospitals_by_count(expected).tolist()
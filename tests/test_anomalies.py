@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from src.anomalies import MAD_SCALE, MEAN_AD_SCALE, group_stats, outlier_claims, score_claims
+
+groups = ['AilmentGroupDescription', 'Hospital', 'Location']
+
+
+def _claims(amounts_by_group):
+    rows = [{'AilmentGroupDescription': group, 'Hospital': 'H', 'Location': 'L', 'IncurredAmount': amount}
+            for group, amounts in amounts_by_group.items() for amount in amounts]
+    return pd.DataFrame(rows)
+
+
+def test_robust_z_scores_against_the_peer_group():
+    df = _claims({'A': [100, 110, 90, 105, 95, 1000]})
+    scores, stats, codes = score_claims(df, groups, 'IncurredAmount', min_group_claims=5)
+    median = np.median(df['IncurredAmount'])
+    mad = np.median(np.abs(df['IncurredAmount'] - median))
+    expected = (df['IncurredAmount'] - median) / (MAD_SCALE * mad)
+    assert np.allclose(scores, expected, rtol=1e-6)
+    assert stats.loc[0, 'claims'] == 6 and stats.loc[0, 'median'] == median
+
+
+def test_zero_mad_falls_back_to_the_mean_absolute_deviation():
+    df = _claims({'A': [100, 100, 100, 100, 100, 400]})
+    scores, stats, _ = score_claims(df, groups, 'IncurredAmount', min_group_claims=5)
+    assert stats.loc[0, 'mad'] == 0
+    assert np.isclose(scores.iloc[-1], 300 / (MEAN_AD_SCALE * 50))
+
+
+def test_small_groups_and_claims_missing_a_group_are_not_scored():
+    df = _claims({'A': [100, 110, 90, 105, 95, 1000], 'B': [10, 20, 1000]})
+    df.loc[0, 'Hospital'] = None
+    scores, _, codes = score_claims(df, groups, 'IncurredAmount', min_group_claims=5)
+    assert codes[0] == -1 and np.isnan(scores.iloc[0])
+    assert scores.iloc[6:].isna().all()
+
+
+def test_outliers_are_ranked_with_their_group_figures():
+    df = _claims({'A': [100, 110, 90, 105, 95, 1000, 900], 'B': [50, 52, 48, 51, 49, 500]})
+    _, outliers = outlier_claims(df, top_n=2, threshold=3.5, groups=groups, measure='IncurredAmount')
+    assert outliers['IncurredAmount'].tolist() == [500, 1000]
+    assert outliers['AnomalyScore'].is_monotonic_decreasing
+    assert outliers['GroupClaims'].tolist() == [6, 7]
+    assert outliers['PercentileInGroup'].tolist() == [100.0, 100.0]
+
+
+def test_group_stats_percentiles():
+    df = _claims({'A': list(range(1, 101))})
+    _, stats = group_stats(df, groups, 'IncurredAmount', percentiles=[5, 95])
+    assert np.isclose(stats.loc[0, 'P5'], np.percentile(range(1, 101), 5))
+    assert np.isclose(stats.loc[0, 'P95'], np.percentile(range(1, 101), 95))
@@ -0,0 +1,40 @@
+import io
+
+import pandas as pd
+
+from src.batch import POLICY_COL, merge_standardised, standardise_sheet
+from tests.conftest import sample_workbook
+
+
+def _workbook_with_policies(policies):
+    df = pd.read_excel(sample_workbook, nrows=len(policies))
+    df['Policy_NO'] = policies
+    buffer = io.BytesIO()
+    df.to_excel(buffer, sheet_name='Claims', index=False)
+    return buffer.getvalue()
+
+
+def test_policy_numbers_are_read_with_the_mapped_columns(monkeypatch):
+    file_bytes = _workbook_with_policies([1001, None, 1002, 1001])
+    parsed = []
+    parse = pd.ExcelFile.parse
+
+    def counting_parse(self, sheet_name=0, **kwds):
+        if kwds.get('nrows') != 0:
+            parsed.append(kwds.get('usecols'))
+        return parse(self, sheet_name, **kwds)
+
+    monkeypatch.setattr(pd.ExcelFile, 'parse', counting_parse)
+    df, report = standardise_sheet('policies.xlsx', file_bytes, 'Claims')
+    assert report['error'] is None
+    # The sheet is parsed once, the policy column with the mapped ones
+    assert len(parsed) == 1 and 'Policy_NO' in parsed[0]
+    assert 'Policy_NO' not in df.columns
+
+
+def test_missing_policy_numbers_stay_missing():
+    df, report = standardise_sheet('policies.xlsx', _workbook_with_policies([1001, None, 1002, 1001]), 'Claims')
+    assert report['error'] is None
+    policies = merge_standardised([df])[POLICY_COL]
+    assert policies.isna().sum() == 1
+    assert set(policies.dropna()) == {'1001', '1002'}
@@ -0,0 +1,15 @@
+import pandas as pd
+
+import src.cache as cache
+from src.store import temp_path
+
+
+def test_eviction_leaves_files_being_written_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'cache_dir', tmp_path)
+    df = pd.DataFrame({'value': range(1000)})
+    entry = cache.put_cached_dataset('a' * 64, df)
+    writing = temp_path(tmp_path / f"{'b' * 64}{entry.suffix}")
+    writing.write_bytes(b'\0' * 10 ** 6)
+    assert cache.cache_stats()['size_bytes'] == entry.stat().st_size
+    cache.evict(0)
+    assert writing.is_file() and not entry.is_file()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.cube import COUNT_COL, MAX_COL, SUM_COL, SUM_SQ_COL, build_cube, cube_dimensions, merge_cubes, update_cube
+from src.normalise import concat_categorical
+from src.standardise import standardise_data
+
+
+@pytest.fixture(scope='module')
+def claims_df(_sample_dump):
+    return standardise_data(_sample_dump.copy())
+
+
+def _cells(cube):
+    cube = cube.copy()
+    for col in cube_dimensions:
+        cube[col] = cube[col].astype(object).where(cube[col].notna(), None).astype(str)
+    return cube.set_index(cube_dimensions)[[COUNT_COL, SUM_COL, MAX_COL, SUM_SQ_COL]].sort_index()
+
+
+def test_merged_cubes_equal_the_cube_of_all_claims(claims_df):
+    halves = [claims_df.iloc[:10], claims_df.iloc[10:]]
+    pd.testing.assert_frame_equal(_cells(merge_cubes([build_cube(half) for half in halves])),
+                                  _cells(build_cube(claims_df)), check_dtype=False)
+
+
+def test_updated_cube_equals_the_rebuilt_cube(claims_df):
+    # The largest claim is replaced by a smaller version of itself, so the maximum of its cell must be recomputed
+    largest = int(np.argmax(claims_df['IncurredAmount'].to_numpy()))
+    removed = claims_df.iloc[[largest]]
+    added = removed.assign(IncurredAmount=removed['IncurredAmount'] // 10)
+    updated = concat_categorical([claims_df.drop(index=removed.index), added])
+    pd.testing.assert_frame_equal(_cells(update_cube(build_cube(claims_df), added, removed, updated)),
+                                  _cells(build_cube(updated)), check_dtype=False)
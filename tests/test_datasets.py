@@ -0,0 +1,37 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.datasets import dataset_file, new_dataset_id, parse_ref, publish, versions
+from src.store import read_dataset, write_dataset
+
+
+def _append_row(value):
+    def write(path, previous):
+        rows = read_dataset(previous) if previous is not None else pd.DataFrame({'value': []})
+        write_dataset(pd.concat([rows, pd.DataFrame({'value': [value]})], ignore_index=True).astype('int64'), path)
+    return write
+
+
+def test_publish_new_dataset_with_a_no_op_writer(tmp_path):
+    assert publish(new_dataset_id('empty.xlsx'), lambda path, previous: None, tmp_path) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_publish_no_op_keeps_the_latest_version(tmp_path):
+    dataset_id = new_dataset_id('claims.xlsx')
+    ref = publish(dataset_id, _append_row(1), tmp_path)
+    assert publish(dataset_id, lambda path, previous: None, tmp_path) == ref
+    assert versions(dataset_id, tmp_path) == [1]
+    assert sorted(os.listdir(tmp_path / dataset_id)) == ['dataset.lock', 'v000001.arrow']
+
+
+def test_publish_builds_on_the_latest_version_and_prunes(tmp_path):
+    dataset_id = new_dataset_id('claims.xlsx')
+    refs = [publish(dataset_id, _append_row(i), tmp_path, kept=2) for i in range(4)]
+    assert [parse_ref(ref)[1] for ref in refs] == [1, 2, 3, 4]
+    assert versions(dataset_id, tmp_path) == [3, 4]
+    assert read_dataset(dataset_file(dataset_id, tmp_path))['value'].tolist() == [0, 1, 2, 3]
+    with pytest.raises(FileNotFoundError):
+        dataset_file(refs[0], tmp_path)
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from src.dates import infer_date_format, parse_date_column
+from src.standardise import std_dates
+
+
+def test_format_is_inferred_from_the_values():
+    assert infer_date_format(pd.Series(['14-Jul-2022', '03-Jan-2023'])) == '%d-%b-%Y'
+    assert infer_date_format(pd.Series(['07/14/2022', '01/31/2023'])) == '%m/%d/%Y'
+    assert infer_date_format(pd.Series(['not a date'])) is None
+
+
+def test_values_off_the_inferred_format_fall_back_to_dateparser():
+    parsed, unparsed = parse_date_column(pd.Series([' 14-Jul-2022', '03-Jan-2023', 'March 5, 2023', None, '']))
+    assert parsed.tolist()[:3] == [pd.Timestamp('2022-07-14'), pd.Timestamp('2023-01-03'), pd.Timestamp('2023-03-05')]
+    assert parsed.iloc[3:].isna().all()
+    assert unparsed == 0
+
+
+def test_cells_no_parser_understands_are_counted_and_left_empty():
+    parsed, unparsed = parse_date_column(pd.Series(['14-Jul-2022', 'pending', 'pending', '#VALUE!', None]))
+    assert parsed.isna().tolist() == [False, True, True, True, True]
+    assert unparsed == 3
+
+
+def test_date_cells_are_kept():
+    dates = pd.Series(pd.to_datetime(['2022-07-14', None]))
+    parsed, unparsed = parse_date_column(dates)
+    assert parsed.equals(dates) and unparsed == 0
+
+
+def test_unparsed_cells_are_recorded_per_column(sample_dump):
+    sample_dump.loc[0, 'DateOfAdmission'] = 'pending'
+    df = std_dates(sample_dump)
+    assert df.attrs['unparsed_dates'] == {'PolicyStartDate': 0, 'PolicyEndDate': 0, 'DateOfAdmission': 1,
+                                          'DateOfDischarge': 0}
+    assert pd.api.types.is_datetime64_any_dtype(df['DateOfAdmission'])
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+import src.distributions as distributions
+from src.distributions import cached_distribution, distribution_series
+
+
+def test_series_are_capped_and_integrate_to_one():
+    values = pd.Series(np.random.default_rng(0).normal(50000, 10000, 100000))
+    series = distribution_series(values, bins=500, max_points=100)
+    assert series['count'] == len(values)
+    for key in ('bin_centres', 'density', 'fit_x', 'fit_y', 'kde_x', 'kde_y'):
+        assert len(series[key]) <= 100, key
+    assert np.isclose((series['density'] * series['bin_widths']).sum(), 1)
+    assert np.isclose(np.trapz(series['kde_y'], series['kde_x']), 1, atol=0.01)
+
+
+def test_missing_and_constant_values():
+    series = distribution_series(pd.Series([5.0, None, 5.0]))
+    assert (series['count'], series['mean'], series['std']) == (2, 5.0, 0.0)
+    assert len(series['density']) and not len(series['kde_x']) and not len(series['fit_x'])
+    assert distribution_series(pd.Series([], dtype='float64'))['mean'] is None
+
+
+def test_series_are_cached_per_key(monkeypatch):
+    monkeypatch.setattr(distributions, '_distribution_cache', distributions.OrderedDict())
+    monkeypatch.setattr(distributions, 'distribution_cache_max_entries', 2)
+    values = pd.Series([1.0, 2.0, 4.0])
+    first = cached_distribution(('dataset@1', 'all', 'IncurredAmount'), values)
+    assert cached_distribution(('dataset@1', 'all', 'IncurredAmount'), values * 2) is first
+    cached_distribution(('dataset@1', 'a', 'IncurredAmount'), values)
+    cached_distribution(('dataset@1', 'b', 'IncurredAmount'), values)
+    assert list(distributions._distribution_cache) == [('dataset@1', 'a', 'IncurredAmount'),
+                                                       ('dataset@1', 'b', 'IncurredAmount')]
+    assert cached_distribution(None, values) is not cached_distribution(None, values)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.incremental import append_dump
+from src.standardise import ROW_HASH_COL, ROW_KEY_COL, standardise_data, with_row_keys, write_standardised
+from src.store import dataset_path, read_dataset
+
+
+@pytest.fixture
+def stored(tmp_path, sample_dump):
+    return write_standardised(standardise_data(sample_dump), dataset_path(tmp_path, 'sample'))
+
+
+def test_row_keys_do_not_depend_on_cell_types(sample_dump):
+    retyped = sample_dump.copy()
+    for col in ['PolicyStartDate', 'PolicyEndDate', 'DateOfAdmission', 'DateOfDischarge']:
+        retyped[col] = pd.to_datetime(retyped[col], format='%d-%b-%Y')
+    for col in ['Age', 'SumInsured', 'ClaimedAmount']:
+        retyped[col] = retyped[col].astype('float64')
+    retyped['Hospital'] = ' ' + retyped['Hospital'] + ' '
+    keys = with_row_keys(sample_dump.copy())
+    retyped_keys = with_row_keys(retyped)
+    assert (keys[ROW_KEY_COL] == retyped_keys[ROW_KEY_COL]).all()
+    assert (keys[ROW_HASH_COL] == retyped_keys[ROW_HASH_COL]).all()
+
+
+def test_append_of_the_same_dump_with_date_cells(stored, sample_dump):
+    stored_rows = len(read_dataset(stored))
+    for col in ['DateOfAdmission', 'DateOfDischarge']:
+        sample_dump[col] = pd.to_datetime(sample_dump[col], format='%d-%b-%Y')
+    summary = append_dump(sample_dump, stored)
+    assert (summary['new'], summary['changed'], summary['unchanged']) == (0, 0, len(sample_dump))
+    assert len(read_dataset(stored)) == stored_rows
+
+
+def test_blank_age_changes_one_claim(stored, sample_dump):
+    stored_rows = len(read_dataset(stored))
+    sample_dump['Age'] = sample_dump['Age'].astype('float64')
+    sample_dump.loc[0, 'Age'] = np.nan
+    summary = append_dump(sample_dump, stored)
+    assert (summary['new'], summary['changed']) == (0, 1)
+    claims_df = read_dataset(stored)
+    assert len(claims_df) == stored_rows
+    assert claims_df['Age'].isna().sum() == 1
+
+
+def test_claims_standardisation_drops_are_not_new(stored, sample_dump):
+    stored_rows = len(read_dataset(stored))
+    extra = sample_dump.iloc[:2].copy()
+    extra['EmployeeCode'] = ['NEW1', 'NEW2']
+    extra.loc[extra.index[1], 'ClaimStatus'] = None
+    summary = append_dump(pd.concat([sample_dump, extra], ignore_index=True), stored)
+    assert (summary['new'], summary['changed'], summary['dropped']) == (1, 0, 1)
+    assert len(read_dataset(stored)) == stored_rows + 1
+    # The dropped claim is not reported again as new on the next append
+    summary = append_dump(pd.concat([sample_dump, extra], ignore_index=True), stored)
+    assert (summary['new'], summary['dropped']) == (0, 1)
@@ -0,0 +1,37 @@
+import pandas as pd
+from openpyxl import Workbook
+
+from src.ingest import read_mapped_columns, stream_standardise
+from src.standardise import apply_dtype_plan, standardise_data
+from src.store import read_dataset
+
+
+def _workbook(df, path):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Claims')
+    sheet.append(list(df.columns))
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False):
+        sheet.append(list(row))
+    workbook.save(path)
+    return path
+
+
+def test_streamed_and_read_at_once_datasets_are_equal(tmp_path, sample_dump):
+    # Codes that look numeric in the first chunk only
+    sample_dump['EmployeeCode'] = [1000 + i if i < 10 else f'IN{i}' for i in range(len(sample_dump))]
+    path = _workbook(sample_dump, tmp_path / 'claims.xlsx')
+    col_mapping = {col: col for col in sample_dump.columns}
+
+    summary = stream_standardise(path, 'Claims', col_mapping, tmp_path / 'streamed.arrow', chunk_size=10)
+    streamed = apply_dtype_plan(read_dataset(tmp_path / 'streamed.arrow'))
+    with pd.ExcelFile(path) as workbook:
+        at_once = standardise_data(read_mapped_columns(workbook, 'Claims', col_mapping))
+
+    assert summary['rows_written'] == len(at_once)
+    assert streamed['EmployeeCode'].notna().all()
+    assert set(streamed['EmployeeCode'].astype(str)) == set(at_once['EmployeeCode'].astype(str))
+    assert {'1000', 'IN24'} <= set(streamed['EmployeeCode'].astype(str))
+    for col in at_once.columns:
+        assert streamed[col].astype(str).tolist() == at_once[col].astype(str).tolist(), col
+    assert str(streamed['Location'].dtype) == str(at_once['Location'].dtype) == 'category'
+    assert not streamed['Location'].astype(str).str.endswith('.0').any()
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.instrument import _rss_mb, recording, stage, stage_summary
+
+
+@pytest.mark.skipif(_rss_mb() is None, reason="resident memory is only read on Linux")
+def test_memory_growth_is_recorded_per_stage():
+    kept = []
+    with recording([]) as records:
+        for name in ['first', 'second']:
+            with stage(name):
+                # Touch every page so the allocation is resident
+                kept.append(np.ones(64 * 1024 ** 2 // 8))
+        with stage('idle'):
+            pass
+    growth = {record['stage']: record['rss_growth_mb'] for record in records}
+    # A later stage allocating as much reports as much growth, unlike a process high-water mark
+    assert growth['first'] > 48
+    assert growth['second'] > 48
+    assert abs(growth['idle']) < 16
+
+
+def test_stage_summary_of_logs_without_growth():
+    records = pd.DataFrame({'stage': ['load', 'load'], 'session': ['a', 'b'], 'seconds': [1.0, 2.0],
+                            'rows': [10, 10]})
+    summary = stage_summary(records)
+    assert summary.loc['load', 'runs'] == 2
+    assert pd.isna(summary.loc['load', 'max_rss_growth_mb'])
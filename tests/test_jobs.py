@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from src.jobs import CANCELLED, DONE, FAILED, FINISHED_STATES, cancel_job, forget_job, job_status, submit_job
+
+
+def _wait(job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job_status(job_id)['state'] not in FINISHED_STATES:
+        if time.monotonic() > deadline:
+            pytest.fail(f"job {job_id} did not finish")
+        time.sleep(0.01)
+    return job_status(job_id)
+
+
+def test_job_result():
+    job_id = submit_job('sum', lambda report, values: sum(values), [1, 2, 3])
+    status = _wait(job_id)
+    assert (status['state'], status['result'], status['fraction']) == (DONE, 6, 1.0)
+    forget_job(job_id)
+    assert job_status(job_id) is None
+
+
+def test_cancelled_job_stops_at_its_next_report():
+    started, reports = threading.Event(), []
+
+    def work(report):
+        started.set()
+        while True:
+            report('working', None)
+            reports.append(None)
+            time.sleep(0.01)
+
+    job_id = submit_job('forever', work)
+    assert started.wait(5)
+    cancel_job(job_id)
+    assert _wait(job_id)['state'] == CANCELLED
+    done = len(reports)
+    time.sleep(0.05)
+    assert len(reports) == done
+
+
+def test_failed_job_keeps_its_error():
+    def work(report):
+        raise ValueError("bad sheet")
+
+    status = _wait(submit_job('fails', work))
+    assert (status['state'], status['error']) == (FAILED, "ValueError: bad sheet")
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from src.normalise import category_labels, concat_categorical, lookup_resolver, normalise_categorical, \
+    relation_lookup
+from src.query import sort_order
+from src.standardise import standardise_data
+
+
+def test_categories_are_sorted_whatever_the_order_of_the_values():
+    relations = normalise_categorical(pd.Series(['wife', 'mother', 'son', 'self', None]),
+                                      lookup_resolver(relation_lookup))
+    assert list(relations.cat.categories) == sorted(relations.cat.categories)
+    assert set(relations.cat.categories) <= set(category_labels['Relation'])
+
+
+def test_sort_order_sorts_categoricals_by_label():
+    resolve = lookup_resolver(relation_lookup)
+    # Chunks concatenated with their categories in first-seen order
+    df = concat_categorical([pd.DataFrame({'Relation': normalise_categorical(pd.Series(values), resolve)})
+                             for values in (['wife', 'mother'], ['son', 'self', None])])
+    relations = df['Relation'].to_numpy()[sort_order(None, df, 'Relation', ascending=True)]
+    assert list(relations) == ['Children', 'NA', 'Parent', 'Self', 'Spouse']
+
+
+def test_sort_order_of_claims(sample_dump):
+    claims_df = standardise_data(sample_dump)
+    order = sort_order(None, claims_df, 'Relation', ascending=True)
+    labels = claims_df['Relation'].astype(str).to_numpy()[order]
+    assert list(labels) == sorted(labels)
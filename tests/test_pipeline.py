@@ -0,0 +1,16 @@
+import json
+
+from src.pipeline import run_pipeline
+from src.store import cube_path, dataset_path
+
+from conftest import sample_column_mapping, sample_workbook
+
+
+def test_outputs_are_named_after_the_workbook(tmp_path):
+    metrics = run_pipeline(sample_workbook, tmp_path, sample_column_mapping)
+    location = dataset_path(tmp_path, sample_workbook.stem)
+    assert metrics['run']['dataset'] == str(location)
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted([location.name, cube_path(location).name,
+                                                                       f'{sample_workbook.stem}_metrics.json'])
+    with open(tmp_path / f'{sample_workbook.stem}_metrics.json') as fp:
+        assert json.load(fp)['run']['rows_written'] == metrics['run']['rows_written']
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.query as query_module
+from src.query import build_query, filter_mask, run_query, sort_order, table_page
+from src.standardise import standardise_data
+
+
+@pytest.fixture
+def claims_df(sample_dump):
+    return standardise_data(sample_dump)
+
+
+def test_category_filters_match_the_text_typed_in(claims_df):
+    assert filter_mask(claims_df, 'Relation', '==', 'Spouse').tolist() == (claims_df['Relation'] == 'Spouse').tolist()
+    assert filter_mask(claims_df, 'Relation', 'not in', ['Spouse', 'Self']).tolist() == \
+        (~claims_df['Relation'].isin(['Spouse', 'Self'])).tolist()
+    assert not filter_mask(claims_df, 'Relation', '==', 'Nobody').any()
+
+
+def test_numeric_categories_match_their_text():
+    df = pd.DataFrame({'EmployeeCode': pd.Series([1001, 1002, 1001]).astype('category'),
+                       'Location': pd.Series([14636417.0, np.nan, 2.5]).astype('category')})
+    assert filter_mask(df, 'EmployeeCode', '==', '1001').tolist() == [True, False, True]
+    assert filter_mask(df, 'EmployeeCode', 'in', [' 1002', 1001]).tolist() == [True, True, True]
+    assert filter_mask(df, 'Location', '!=', '14636417').tolist() == [False, True, True]
+    assert filter_mask(df, 'Location', '==', '2.5').tolist() == [False, False, True]
+
+
+def test_numeric_and_date_filters(claims_df):
+    assert filter_mask(claims_df, 'IncurredAmount', '>', '30000').tolist() == \
+        (claims_df['IncurredAmount'] > 30000).tolist()
+    assert filter_mask(claims_df, 'DateOfAdmission', '>=', '2022-09-01').tolist() == \
+        (claims_df['DateOfAdmission'] >= pd.Timestamp('2022-09-01')).tolist()
+    assert filter_mask(claims_df, 'Hospital', 'contains', 'hospital').tolist() == \
+        claims_df['Hospital'].astype(str).str.lower().str.contains('hospital').tolist()
+
+
+def test_grouped_query(claims_df):
+    query = build_query(filters=[('ClaimStatus', '==', 'Settled')], group_by=['Relation'],
+                        aggregations=['count', 'sum'], sort_by='sum', ascending=False)
+    result = run_query(claims_df, query)
+    paid = claims_df.loc[claims_df['ClaimStatus'] == 'Settled']
+    assert len(paid)
+    expected = paid.groupby('Relation', observed=True)['IncurredAmount'].sum().sort_values(ascending=False)
+    assert result['Relation'].tolist() == expected.index.tolist()
+    assert result['sum'].tolist() == expected.tolist()
+    assert result['count'].sum() == len(paid)
+
+
+def test_sort_order_puts_missing_values_last_and_keeps_ties_in_order():
+    df = pd.DataFrame({'amount': [30.0, np.nan, 10.0, 30.0, 20.0]})
+    assert sort_order(None, df, 'amount').tolist() == [0, 3, 4, 2, 1]
+    assert sort_order(None, df, 'amount', ascending=True).tolist() == [2, 4, 0, 3, 1]
+    assert sort_order(None, df, None).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_sort_orders_are_cached_per_key(monkeypatch):
+    df = pd.DataFrame({'amount': [3, 1, 2]})
+    first = sort_order(('dataset@1', 'test'), df, 'amount')
+    assert sort_order(('dataset@1', 'test'), df.iloc[::-1], 'amount') is first
+    assert sort_order(('dataset@1', 'test'), df, 'amount', ascending=True) is not first
+    monkeypatch.setattr(query_module, 'sort_cache_max_entries', 1)
+    sort_order(('dataset@2', 'test'), df, 'amount')
+    assert len(query_module._sort_orders) == 1
+
+
+def test_pages_of_the_filtered_rows_in_sorted_order(claims_df):
+    order = sort_order(None, claims_df, 'IncurredAmount')
+    mask = filter_mask(claims_df, 'Relation', '!=', 'Self')
+    expected = claims_df.loc[mask].sort_values('IncurredAmount', ascending=False, kind='stable')
+    pages = []
+    page = 1
+    while True:
+        rows, num_rows = table_page(claims_df, order, page, 4, mask)
+        assert num_rows == len(expected)
+        if rows.empty:
+            break
+        pages.append(rows)
+        page += 1
+    assert len(pages) == -(-len(expected) // 4)
+    assert pd.concat(pages).index.tolist() == expected.index.tolist()
@@ -0,0 +1,58 @@
+import zipfile
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from openpyxl import load_workbook
+
+import src.report as report
+from src.analytics import run_analysis
+from src.cube import build_cube
+from src.standardise import standardise_data
+
+
+@pytest.fixture(scope='module')
+def analysis(_sample_dump):
+    claims_df = standardise_data(_sample_dump.copy())
+    return run_analysis(claims_df, build_cube(claims_df))
+
+
+def test_workbook_has_a_sheet_per_table(tmp_path, analysis):
+    tables = report.report_tables(analysis, 'sample')
+    workbook = load_workbook(report.write_report(analysis, tmp_path / 'report.xlsx', 'xlsx', 'sample'),
+                             read_only=True)
+    assert workbook.sheetnames == [title for title, _ in tables]
+    rows = list(workbook['Standardised data'].values)
+    assert len(rows) == len(analysis['claims_df']) + 1
+    assert not set(report.hidden_columns) & set(rows[0])
+
+
+def test_long_tables_continue_on_further_sheets(tmp_path, monkeypatch):
+    monkeypatch.setattr(report, 'excel_max_rows', 4)
+    path = tmp_path / 'report.xlsx'
+    report.write_workbook([('Claims', pd.DataFrame({'value': range(7)}))], path, chunk_rows=2)
+    workbook = load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ['Claims', 'Claims (2)', 'Claims (3)']
+    assert [row[0] for name in workbook.sheetnames for row in workbook[name].iter_rows(min_row=2, values_only=True)] \
+        == list(range(7))
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_bundle_has_a_file_per_table(tmp_path, analysis, fmt):
+    tables = report.report_tables(analysis, 'sample')
+    path = report.write_report(analysis, tmp_path / f'report{report.report_formats[fmt]}', fmt, 'sample')
+    with zipfile.ZipFile(path) as bundle:
+        names = bundle.namelist()
+        assert len(names) == len(tables)
+        with bundle.open(names[2]) as fp:
+            claims_df = pd.read_csv(fp) if fmt == 'csv' else pq.read_table(fp).to_pandas()
+    assert len(claims_df) == len(analysis['claims_df'])
+
+
+def test_cached_report_is_written_once(tmp_path, monkeypatch, analysis):
+    monkeypatch.setattr(report, 'report_dir', tmp_path)
+    path = report.cached_report('sample-1234@1', analysis, 'parquet')
+    written_at = path.stat().st_mtime_ns
+    monkeypatch.setattr(report, 'write_report', lambda *args: pytest.fail("report written again"))
+    assert report.cached_report('sample-1234@1', analysis, 'parquet') == path
+    assert path.stat().st_mtime_ns >= written_at
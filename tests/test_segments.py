@@ -0,0 +1,33 @@
+import pandas as pd
+
+from src.segments import SEGMENT_MASK_COL, get_segment, segment_bit, segment_mask, segment_predicate, \
+    segment_stats, segments_version, with_segment_mask
+from src.settings import segment_definitions
+from src.standardise import standardise_data
+
+
+def test_mask_bits_match_the_segment_predicates(sample_dump):
+    claims_df = standardise_data(sample_dump)
+    mask = segment_mask(claims_df).to_numpy()
+    for name in segment_definitions:
+        assert (((mask & segment_bit(name)) != 0) == segment_predicate(claims_df, name).to_numpy()).all(), name
+
+
+def test_segment_stats_from_the_mask(sample_dump):
+    claims_df = with_segment_mask(standardise_data(sample_dump))
+    stats = segment_stats(claims_df)
+    total = claims_df['IncurredAmount'].sum()
+    for name in segment_definitions:
+        segment = get_segment(claims_df, name)
+        assert stats.loc[name, 'count'] == len(segment)
+        assert stats.loc[name, 'value'] == segment['IncurredAmount'].sum()
+        assert stats.loc[name, 'percentage_by_value'] == segment['IncurredAmount'].sum() / total * 100
+
+
+def test_stored_mask_is_reevaluated_when_the_definitions_change(sample_dump):
+    claims_df = standardise_data(sample_dump)
+    claims_df[SEGMENT_MASK_COL] = segment_mask(claims_df) * 0
+    claims_df.attrs['segments_version'] = segments_version
+    assert (with_segment_mask(claims_df.copy())[SEGMENT_MASK_COL] == 0).all()
+    claims_df.attrs['segments_version'] = 'older definitions'
+    pd.testing.assert_series_equal(with_segment_mask(claims_df)[SEGMENT_MASK_COL], segment_mask(claims_df))
@@ -0,0 +1,67 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.shared import acquire, freeze, release, store_stats
+
+
+def _claims():
+    return pd.DataFrame({'Age': pd.array([34, None, 61], dtype='Int16'),
+                         'NoOfHospitalisedDays': pd.array([2, 5, 1], dtype='Int16'),
+                         'Hospital': pd.Categorical(['Apollo', 'Fortis', 'Apollo']),
+                         'IncurredAmount': [1200.0, 5300.0, 800.0]})
+
+
+def test_freeze_makes_every_column_read_only():
+    frozen = freeze(_claims())
+    for col in frozen.columns:
+        values = frozen[col].array
+        buffer = values.codes if isinstance(values, pd.Categorical) else np.asarray(values)
+        assert not buffer.flags.writeable, col
+    with pytest.raises(ValueError):
+        frozen.loc[0, 'IncurredAmount'] = 0.0
+    with pytest.raises(ValueError):
+        frozen.loc[0, 'Age'] = 40
+
+
+def test_freeze_stores_nullable_columns_as_numpy():
+    frozen = freeze(_claims())
+    # Integers with missing values become floats holding them exactly, complete ones keep their width
+    assert frozen['Age'].dtype == np.float32
+    assert frozen['Age'].isna().tolist() == [False, True, False]
+    assert frozen['NoOfHospitalisedDays'].dtype == np.int16
+    # Hash based operations work on the frozen buffers
+    assert frozen['Age'].nunique() == 2
+    assert frozen.groupby('NoOfHospitalisedDays').size().sum() == 3
+
+
+def test_sessions_share_the_frozen_columns_and_keep_their_own_additions():
+    key, loads = f'claims-{uuid.uuid4()}', []
+
+    def load():
+        loads.append(key)
+        return {'claims_df': _claims(), 'total': 3}
+
+    first = acquire(key, 'session-a', load)
+    second = acquire(key, 'session-b', load)
+    assert loads == [key]
+    assert second['total'] == 3
+    for col in ['Age', 'NoOfHospitalisedDays', 'IncurredAmount']:
+        assert np.shares_memory(np.asarray(first['claims_df'][col].array),
+                                np.asarray(second['claims_df'][col].array)), col
+
+    first_df = first['claims_df']
+    first_df['AgeBand'] = pd.cut(first_df['Age'], [0, 40, 100])
+    assert 'AgeBand' not in second['claims_df'].columns
+    assert 'AgeBand' not in acquire(key, 'session-c', load)['claims_df'].columns
+    with pytest.raises(ValueError):
+        first_df.loc[1, 'IncurredAmount'] = 0.0
+    assert second['claims_df']['IncurredAmount'].tolist() == [1200.0, 5300.0, 800.0]
+    with pytest.raises(TypeError):
+        first['claims_df'] = None
+
+    for session_id in ['session-a', 'session-b', 'session-c']:
+        release(session_id)
+    assert store_stats()['sessions'] == 0
@@ -0,0 +1,15 @@
+from src.segments import segment_bit, segment_mask
+from src.standardise import standardise_data
+
+
+def test_percent_of_sum_insured_keeps_its_decimals(sample_dump):
+    sample_dump['SumInsured'] = 100000
+    sample_dump.loc[0, 'ClaimedAmount'] = 87060
+    sample_dump.loc[1, 'ClaimedAmount'] = 70001
+    sample_dump.loc[2, 'ClaimedAmount'] = 100000
+    claims_df = standardise_data(sample_dump)
+    assert claims_df['PercentOfSumInsuredClaimed'].dtype == 'float64'
+    assert claims_df['PercentOfSumInsuredClaimed'].iloc[:3].tolist() == [87.06, 70.0, 100.0]
+    mask = segment_mask(claims_df).iloc[:3].to_numpy()
+    assert [bool(m & segment_bit('high_value_claims')) for m in mask] == [True, False, True]
+    assert [bool(m & segment_bit('si_exhausted_claims')) for m in mask] == [False, False, True]
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from src.standardise import standardise_data
+from src.store import dataset_columns, read_dataset, replacing, write_dataset
+
+
+def test_dataset_round_trip_keeps_dtypes_and_attrs(tmp_path, sample_dump):
+    claims_df = standardise_data(sample_dump)
+    claims_df.attrs['segments_version'] = 'abc'
+    path = write_dataset(claims_df, tmp_path / 'claims.arrow')
+    stored = read_dataset(path)
+    pd.testing.assert_frame_equal(stored, claims_df.reset_index(drop=True), check_categorical=False)
+    assert stored.dtypes.equals(claims_df.dtypes)
+    assert stored.attrs['segments_version'] == 'abc'
+    assert dataset_columns(path) == list(claims_df.columns)
+    assert list(read_dataset(path, columns=['Relation', 'Age']).columns) == ['Relation', 'Age']
+
+
+def test_mixed_text_columns_are_stored_as_text(tmp_path):
+    path = write_dataset(pd.DataFrame({'EmployeeCode': [1001, 'IN10', None]}), tmp_path / 'codes.arrow')
+    assert read_dataset(path)['EmployeeCode'].tolist() == ['1001', 'IN10', None]
+
+
+def test_failed_write_leaves_the_file_as_it_was(tmp_path):
+    path = write_dataset(pd.DataFrame({'value': [1]}), tmp_path / 'values.arrow')
+    with pytest.raises(RuntimeError):
+        with replacing(path) as temp:
+            temp.write_bytes(b'partial')
+            raise RuntimeError()
+    assert read_dataset(path)['value'].tolist() == [1]
+    assert [p.name for p in tmp_path.iterdir()] == ['values.arrow']
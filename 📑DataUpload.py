@@ -1,22 +1,51 @@
+import time
 import traceback as tb
 from pprint import pprint
 
 import pandas as pd
 import streamlit as st
 
-from src.settings import mapping, compulsory_cols_to_be_mapped
+from src.aliases import remember_layout
+from src.batch import batch_jobs, ingest_batch
+from src.cache import (
+    cache_stats,
+    dataset_key,
+    get_cached_dataset,
+    put_cached_dataset,
+    recall_mapping,
+    remember_mapping,
+    restore_cached_dataset,
+)
+from src.datasets import dataset_file, new_dataset_id, parse_ref, publish
+from src.shared import release, store_stats
+from src.settings import mapping, compulsory_cols_to_be_mapped, upload_preview_rows, job_poll_seconds
+from src.incremental import append_dump
+from src.ingest import read_mapped_columns
+from src.jobs import (
+    CANCELLED,
+    FAILED,
+    FINISHED_STATES,
+    cancel_job,
+    forget_job,
+    job_status,
+    standardise_job,
+    submit_job,
+)
+from src.pipeline import resolve_column_mapping
+from src.standardise import apply_column_mapping, standardise_data
 from src.utilities import (
     upload_file_form,
     submit_mapping,
-    rename_cols_using_map,
     save_file,
-    standardise_data,
     submit_mapping_set_state,
     upload_data_set_state,
+    start_diagnostics,
+    show_diagnostics,
 )
 
 st.set_page_config(page_title="Data Upload",
                    page_icon="📑")
+start_diagnostics()
 
 st.title("Automated Claims Analysis")
 st.sidebar.header("Data Upload")
@@ -24,6 +53,12 @@ col_mapping = {}
 st.sidebar.info(
     "Perform the given steps and then navigate through the pages in the sidebar."
 )
+dataset_cache_stats = cache_stats()
+st.sidebar.caption(f"Dataset cache: {dataset_cache_stats['hits']} hits, {dataset_cache_stats['misses']} misses, "
+                   f"{dataset_cache_stats['size_bytes'] / 1024 ** 2:.1f} MB")
+shared_store_stats = store_stats()
+st.sidebar.caption(f"Shared datasets: {shared_store_stats['datasets']} held for {shared_store_stats['sessions']} "
+                   f"sessions, {shared_store_stats['nbytes'] / 1024 ** 2:.1f} MB")
 
 if "stage" not in st.session_state:
     st.session_state.stage = 0
@@ -34,8 +69,8 @@ if "data_uploaded" not in st.session_state:
 if "mapping_submitted" not in st.session_state:
     st.session_state["mapping_submitted"] = False
 
-if "file_location" not in st.session_state:
-    st.session_state["file_location"] = ""
+if "dataset_ref" not in st.session_state:
+    st.session_state["dataset_ref"] = None
 
 if "uploaded_data" not in st.session_state:
     st.session_state["uploaded_data"] = pd.DataFrame()
@@ -46,6 +81,21 @@ if "file_name" not in st.session_state:
 if "column_mapping" not in st.session_state:
     st.session_state["column_mapping"] = {}
 
+if "upload_key" not in st.session_state:
+    st.session_state["upload_key"] = None
+
+if "streaming" not in st.session_state:
+    st.session_state["streaming"] = False
+
+if "workbook" not in st.session_state:
+    st.session_state["workbook"] = None
+
+if "sheet_name" not in st.session_state:
+    st.session_state["sheet_name"] = None
+
+if "job_id" not in st.session_state:
+    st.session_state["job_id"] = None
+
 
 def initialize_stage():
     """
@@ -56,13 +106,204 @@ def initialize_stage():
     st.session_state.stage = 0
     st.session_state["data_uploaded"] = False
     st.session_state["mapping_submitted"] = False
-    st.session_state["file_location"] = ""
+    st.session_state["dataset_ref"] = None
     st.session_state["uploaded_data"] = pd.DataFrame()
     st.session_state["file_name"] = None
     st.session_state["column_mapping"] = {}
+    st.session_state["upload_key"] = None
+    st.session_state["streaming"] = False
+    st.session_state["workbook"] = None
+    st.session_state["workbook_file_id"] = None
+    st.session_state["sheet_name"] = None
+    cancel_job(st.session_state["job_id"])
+    st.session_state["job_id"] = None
+    st.session_state["job_preview"] = None
+    st.session_state["upload_bytes"] = None
+    release(st.session_state.get("session_id"))
     st.experimental_rerun()
 
 
+def load_cached_standardised_data(file_name):
+    """
+    Skip mapping and standardisation when this sheet has already been standardised with the mapping used last time
+    Args:
+        file_name:
+
+    Returns:
+        True if the standardised data was restored from the cache
+    """
+    sheet_key = st.session_state["upload_key"]
+    # The cache is looked up once per uploaded sheet, not on every rerun of the page
+    if not sheet_key or st.session_state.get("cache_checked") == sheet_key:
+        return False
+    st.session_state["cache_checked"] = sheet_key
+    col_mapping = recall_mapping(sheet_key)
+    if not col_mapping:
+        return False
+    cached = get_cached_dataset(dataset_key(sheet_key, col_mapping))
+    if cached is None:
+        return False
+    ref = publish(new_dataset_id(file_name), lambda path, previous: restore_cached_dataset(cached, path))
+    if ref is None:
+        return False
+    submit_mapping_set_state(col_mapping)
+    st.session_state["dataset_ref"] = ref
+    st.success("This sheet has been standardised before, loaded the standardised data from the cache.")
+    return True
+
+
+def start_standardisation(df, col_mapping, file_name):
+    """
+    Submit the standardisation of the uploaded sheet as a background job, so reruns of this page do not restart it.
+    The preview rows are standardised right away to be looked at while the job runs.
+    Args:
+        df: preview rows of the uploaded sheet
+        col_mapping: confirmed file column -> standard column mapping
+        file_name:
+    """
+    cancel_job(st.session_state["job_id"])
+    st.session_state["job_preview"] = standardise_data(apply_column_mapping(df, col_mapping))
+    st.session_state["job_headers"] = list(df.columns)
+    st.session_state["job_id"] = submit_job(f"Standardising {file_name} ({st.session_state['sheet_name']})",
+                                            standardise_job,
+                                            st.session_state["upload_bytes"],
+                                            st.session_state["sheet_name"],
+                                            col_mapping,
+                                            new_dataset_id(file_name),
+                                            st.session_state["streaming"])
+
+
+def follow_standardisation_job():
+    """
+    Show the progress of the session's standardisation job with the standardised preview, and move on to the next
+    stage once it is done
+    Returns:
+        True while the job is still running
+    """
+    job_id = st.session_state["job_id"]
+    job = job_status(job_id) if job_id else None
+    if job is None:
+        st.session_state["job_id"] = None
+        return False
+    if job['state'] not in FINISHED_STATES:
+        st.write(f"#### {job['description']}")
+        st.progress(job['fraction'] or 0.0, text=job['message'] or job['stage'].capitalize())
+        if st.button("Cancel"):
+            cancel_job(job_id)
+        preview = st.session_state["job_preview"]
+        if preview is not None and not preview.empty:
+            st.caption(f"Preview of the first {len(preview):,} rows standardised, the full sheet is on its way")
+            st.dataframe(preview)
+        return True
+
+    st.session_state["job_id"] = None
+    forget_job(job_id)
+    if job['state'] == CANCELLED:
+        st.info("Standardisation cancelled, submit the mapping again to restart it.")
+        return False
+    if job['state'] == FAILED:
+        st.error(f"The data could not be standardised with this mapping: {job['error']}")
+        return False
+    result = job['result']
+    unparsed_dates = {col: count for col, count in result['unparsed_dates'].items() if count}
+    if unparsed_dates:
+        st.warning(f"Some dates could not be parsed and have been left empty: {unparsed_dates}")
+    if not result['rows_written']:
+        st.error("None of the rows could be standardised with this mapping.")
+        return False
+    st.success(f"Standardised {result['rows_read']:,} rows, kept {result['rows_written']:,}")
+    st.session_state["dataset_ref"] = result['ref']
+    record_standardised_data(st.session_state["job_headers"], st.session_state["column_mapping"], result['ref'])
+    return False
+
+
+def batch_upload():
+    """
+    Standardise several workbooks at once in parallel and merge them into one dataset tagged with the source file and
+    policy. Column mappings are taken from the header alias index without showing the mapping form.
+    Returns:
+        True if a merged dataset was saved
+    """
+    with st.expander("#### Batch upload: several claims dumps at once"):
+        with st.form("Batch Upload"):
+            uploaded_files = st.file_uploader('Upload the claims dump files', accept_multiple_files=True)
+            all_sheets = st.checkbox('Standardise every sheet of each workbook, not only the first')
+            submitted = st.form_submit_button("Standardise All")
+        if not submitted or not uploaded_files:
+            return False
+
+        jobs = batch_jobs([(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files],
+                          all_sheets)
+        progress_bar = st.progress(0.0, text=f"Standardising {len(jobs)} sheets...")
+
+        def show_progress(jobs_done, total_jobs, report):
+            status = f"failed: {report['error']}" if report['error'] else "done"
+            progress_bar.progress(jobs_done / total_jobs,
+                                  text=f"{jobs_done} of {total_jobs} sheets, {report['file']} ({report['sheet']}) "
+                                       f"{status}")
+
+        df, reports = ingest_batch(jobs, progress=show_progress)
+        st.dataframe(pd.DataFrame(reports))
+        if any(report['error'] for report in reports):
+            st.warning("Some sheets could not be standardised, see the error column above.")
+        if any(not report['known_layout'] and not report['error'] for report in reports):
+            st.info("Some sheets have a header layout that has not been confirmed before and were mapped "
+                    "automatically. Upload them individually to check their mapping.")
+        if df is None:
+            return False
+
+        file_name = f"Batch_{len(uploaded_files)}_files"
+        if not save_file(df, file_name):
+            return False
+        st.session_state["data_uploaded"] = True
+        st.session_state.file_name = file_name
+        st.session_state.uploaded_data = df.head(upload_preview_rows)
+        submit_mapping_set_state({})
+        return True
+
+
+def append_monthly_dump():
+    """
+    Merge a later dump of the same policy into the standardised dataset, standardising only its new and changed claims.
+    The columns are mapped like the first upload, or suggested from the headers after a batch upload. The merge
+    builds on the latest version of the dataset, which may include appends made from other sessions, and is published
+    as a new version.
+    Returns:
+        True if the dataset was updated
+    """
+    with st.expander("#### Append a later claims dump of the same policy"):
+        with st.form("Append Dump"):
+            uploaded_file = st.file_uploader('Upload the later claims dump file')
+            sheet_name = st.text_input('Worksheet, the first one when left empty')
+            submitted = st.form_submit_button("Append")
+        if not submitted or uploaded_file is None:
+            return False
+        try:
+            with pd.ExcelFile(uploaded_file) as workbook:
+                sheet_name = sheet_name or workbook.sheet_names[0]
+                col_mapping = resolve_column_mapping(workbook, sheet_name, st.session_state["column_mapping"] or None)
+                df = read_mapped_columns(workbook, sheet_name, col_mapping)
+                summary = {}
+                with st.spinner("Appending..."):
+                    dataset_id, _ = parse_ref(st.session_state["dataset_ref"])
+                    st.session_state["dataset_ref"] = publish(
+                        dataset_id, lambda path, previous: summary.update(append_dump(df, previous, path)))
+        except Exception as e:
+            print(tb.format_exc())
+            st.error(f"The dump could not be appended: {e}")
+            return False
+        st.success(f"{summary['new']:,} new and {summary['changed']:,} changed claims standardised, "
+                   f"{summary['unchanged']:,} unchanged claims skipped. The dataset now holds "
+                   f"{summary['rows_written']:,} claims.")
+        if summary['dropped']:
+            st.warning(f"{summary['dropped']:,} new or changed claims were left out for missing the ailment code, "
+                       f"claim status or sum insured.")
+        unparsed_dates = {col: count for col, count in summary['unparsed_dates'].items() if count}
+        if unparsed_dates:
+            st.warning(f"Some dates could not be parsed and have been left empty: {unparsed_dates}")
+        return True
+
+
 def upload_claims_data():
     """
 
@@ -77,9 +318,28 @@ def upload_claims_data():
                 st.session_state.uploaded_data = df
                 st.session_state.file_name = file_name
                 return df, file_name
+    # The sheet was submitted on an earlier run, e.g. this run is the submission of the mapping form
+    if st.session_state.stage >= 1 and not st.session_state.uploaded_data.empty:
+        return st.session_state.uploaded_data, st.session_state.file_name
     return pd.DataFrame(), None
 
 
+def record_standardised_data(headers, col_mapping, ref):
+    """
+    Remember the confirmed mapping for this layout and sheet, cache the standardised data and move to the next stage
+    Args:
+        headers: headers of the uploaded sheet
+        col_mapping: confirmed file column -> standard column mapping
+        ref: src.datasets ref of the standardised dataset
+    """
+    remember_layout(headers, col_mapping)
+    sheet_key = st.session_state["upload_key"]
+    if sheet_key:
+        remember_mapping(sheet_key, col_mapping)
+        put_cached_dataset(dataset_key(sheet_key, col_mapping), source=dataset_file(ref))
+    submit_mapping_set_state(col_mapping)
+
+
 def input_mapping(df, file_name):
     """
     Args:
@@ -91,30 +351,31 @@ def input_mapping(df, file_name):
     try:
         with st.expander("#### 2. Map corresponding relevant columns"):
             if not df.empty and file_name:
+                if load_cached_standardised_data(file_name):
+                    return True
                 col_mapping = submit_mapping(df)
                 if col_mapping:
                     print("Col_mapping returned from submit_mapping")
                     st.session_state["column_mapping"] = col_mapping
                     print("Col_mapping reset in session state")
-                    df = rename_cols_using_map(df, col_mapping)
-                    print("Columns renamed", df, "using", col_mapping)
-                    df = standardise_data(df)
-                    if df is not None and not df.empty:
-                        # print(df)
-                        save_file(df, file_name)
-                        return True
+                    start_standardisation(df, col_mapping, file_name)
             else:
                 st.warning(
                     "First upload the file above to get the inputs for columns to map"
                 )
     except Exception as e:
-        return False
+        print(tb.format_exc())
+        st.error(f"The data could not be standardised with this mapping: {e}")
+    return False
 
 
 if __name__ == "__main__":
+    job_running = False
     if st.session_state.stage < 2:
         df, file_name = upload_claims_data()
         input_mapping(df, file_name)
+        job_running = follow_standardisation_job()
+        batch_upload()
     if st.session_state.stage == 2:
         st.write(f"Renaming columns using this: {st.session_state['column_mapping']}")
         st.write(f"Name of File Uploaded: {st.session_state.file_name}")
@@ -123,5 +384,11 @@ if __name__ == "__main__":
             "The uploaded data has been processed and the insights are available "
             "to view in the Visualisations tab from the sidebar"
         )
+        append_monthly_dump()
         if st.button("Reset"):
             initialize_stage()
+    show_diagnostics()
+    if job_running:
+        # Poll the job, the page is rerun with its widgets as they are
+        time.sleep(job_poll_seconds)
+        st.experimental_rerun()